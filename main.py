@@ -1,5 +1,6 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 import importlib.util
@@ -13,10 +14,25 @@ sys.path.append(str(Path(__file__).parent))
 # We use dynamic import below because the folder name has hyphens
 # from md_to_docx import router as md_docs_router
 
+@asynccontextmanager
+async def lifespan(app):
+    # Style profiles are compiled into reference documents once, before any request
+    md_to_docx_module.compile_reference_docs()
+    # Background conversion jobs run on the md-to-docx worker pool for the app's lifetime
+    await md_to_docx_module.JOB_MANAGER.start()
+    # Sweeps stale outputs and workspaces, including any left by a previous run
+    await md_to_docx_module.OUTPUT_JANITOR.start()
+    yield
+    await md_to_docx_module.OUTPUT_JANITOR.stop()
+    await md_to_docx_module.JOB_MANAGER.stop()
+    md_to_docx_module.CONVERSION_POOL.shutdown(wait=False)
+
+
 app = FastAPI(
     title="Personnel Productivity Dashboard",
     description="A collection of personal productivity tools and services.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -40,5 +56,15 @@ app.include_router(md_to_docx_module.router)
 async def dashboard():
     return FileResponse("templates/index.html")
 
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus scrape target: per-stage timings, request latency, in-flight and queue gauges.
+    # A plain def, so FastAPI runs it in its threadpool: the cache and disk gauges scan directories
+    return Response(
+        content=md_to_docx_module.render_metrics(),
+        media_type=md_to_docx_module.METRICS_CONTENT_TYPE
+    )
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8989)
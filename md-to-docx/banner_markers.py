@@ -0,0 +1,34 @@
+"""
+The [[STATUS_BANNER:<TYPE>:<TEXT>]] marker format shared by the preprocessor, which
+writes the markers, and status_banners.py, which styles what pandoc leaves of them.
+Standard library only, so the command line tool can import it without python-docx.
+"""
+import re
+
+MARKER_PREFIX = '[[STATUS_BANNER:'
+
+
+def banner_style_key(banner_type):
+    """Maps a banner's CSS classes (e.g. 'status-high-risk') to a key of BANNER_STYLES."""
+    banner_type = banner_type.lower()
+    if 'high-risk' in banner_type:
+        return 'high-risk'
+    if 'medium-risk' in banner_type:
+        return 'medium-risk'
+    if 'low-risk' in banner_type or 'success' in banner_type:
+        return 'low-risk'
+    if 'info' in banner_type:
+        return 'info'
+    if 'warning' in banner_type:
+        return 'warning'
+    return 'default'
+
+
+def banner_marker(banner_type, text):
+    """
+    The marker for a banner, as its own paragraph. Line breaks in the text are
+    folded so the marker can't be split across paragraphs.
+    """
+    text = re.sub(r'\s*\n\s*', ' ', text.strip())
+    # Prefixed, as a bare ':warning:' would come out of gfm as an emoji
+    return f"\n\n{MARKER_PREFIX}status-{banner_style_key(banner_type)}:{text}]]\n\n"
@@ -0,0 +1,145 @@
+"""
+Benchmark: banners and header rows styled by the Lua filters inside pandoc vs.
+by the Python post-processing after it.
+
+Builds Markdown documents of N sections (prose, a status banner, a table), then
+times the conversion end to end both ways: pandoc, loading the DOCX, the banner
+and table stages, and saving. The "post" run uses the table filter as it was
+before it emphasized header rows and no banner filter, so every banner and
+header run is left to Python. Both outputs are checked to hold the same
+banners with the same look.
+
+    python md-to-docx/benchmarks/bench_filters.py --sections 50 200 800
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from docx import Document
+from docx.oxml.ns import qn
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from docx_package import save_docx  # noqa: E402
+from markdown_preprocessor import preprocess_markdown_text  # noqa: E402
+from status_banners import apply_status_banners  # noqa: E402
+from style_profiles import PROFILES, ReferenceDocCache  # noqa: E402
+from table_styling import style_tables  # noqa: E402
+
+BASE_REFERENCE = SCRIPT_DIR.parent / "reference.docx"
+FILTERS = [SCRIPT_DIR.parent / "filter_table_style.lua", SCRIPT_DIR.parent / "filter_status_banner.lua"]
+
+# filter_table_style.lua before header rows moved into it
+LEGACY_TABLE_FILTER = """
+function Table(el)
+  el.classes = pandoc.List({'MyCustomTable'})
+  el.attributes = {}
+  el.attributes['custom-style'] = 'MyCustomTable'
+  return el
+end
+"""
+
+SECTION = """
+## Section {index}
+
+Prose about component {index}, with **bold**, `code` and a [link](#x).
+
+<div class="status-banner status-{risk}">Review of component {index} is pending</div>
+
+| Field | Type | Notes |
+| :--- | :--- | :--- |
+{rows}
+"""
+RISKS = ("high-risk", "medium-risk", "low-risk", "info", "warning")
+
+
+def build_markdown(sections, rows=6):
+    table_rows = "\n".join(f"| field_{row} | string | note {row} |" for row in range(rows))
+    return preprocess_markdown_text("".join(
+        SECTION.format(index=index, risk=RISKS[index % len(RISKS)], rows=table_rows)
+        for index in range(sections)
+    ))
+
+
+def convert(markdown, output_path, reference_doc, filters):
+    """pandoc plus the banner and table stages; returns (pandoc seconds, post-processing seconds)."""
+    cmd = ["pandoc", "-f", "gfm+raw_html", "-o", str(output_path), "--reference-doc", str(reference_doc)]
+    for filter_path in filters:
+        cmd.extend(["--lua-filter", str(filter_path)])
+    started = time.perf_counter()
+    subprocess.run(cmd, input=markdown, encoding='utf-8', check=True)
+    pandoc_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    doc = Document(str(output_path))
+    apply_status_banners(doc)
+    style_tables(doc)
+    save_docx(doc, output_path)
+    return pandoc_time, time.perf_counter() - started
+
+
+def banner_looks(docx_path):
+    """(fill, text colour) of every banner paragraph, from direct formatting or its style."""
+    doc = Document(str(docx_path))
+    looks = []
+    for paragraph in doc.paragraphs:
+        style_name = paragraph.style.name
+        if style_name.startswith('Status Banner'):
+            shd = paragraph.style.element.pPr.find(qn('w:shd'))
+            looks.append((shd.get(qn('w:fill')), str(paragraph.style.font.color.rgb)))
+            continue
+        p_pr = paragraph._p.pPr
+        shd = p_pr.find(qn('w:shd')) if p_pr is not None else None
+        if shd is not None and paragraph.runs:
+            looks.append((shd.get(qn('w:fill')), str(paragraph.runs[0].font.color.rgb)))
+    return looks
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        timings.append(fn())
+    return min(timings, key=sum)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Lua-filter styling against Python post-processing.")
+    parser.add_argument('--sections', type=int, nargs='+', default=[50, 200, 800],
+                        help="Sections (banner plus table) per generated document.")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is reported).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        references = ReferenceDocCache(temp_dir / "references", PROFILES)
+        base = BASE_REFERENCE if BASE_REFERENCE.exists() else None
+        reference_doc = references.get("default", base, "benchmark")
+        legacy_filter = temp_dir / "legacy_table_style.lua"
+        legacy_filter.write_text(LEGACY_TABLE_FILTER, encoding='utf-8')
+        post_output = temp_dir / "post.docx"
+        filter_output = temp_dir / "filters.docx"
+
+        print(f"{'sections':>8} {'post: pandoc':>13} {'python':>9} {'total':>9} "
+              f"{'filters: pandoc':>16} {'python':>9} {'total':>9} {'speedup':>8}")
+        for sections in args.sections:
+            markdown = build_markdown(sections)
+            post = best_of(args.repeat, lambda: convert(markdown, post_output, reference_doc, [legacy_filter]))
+            filtered = best_of(args.repeat, lambda: convert(markdown, filter_output, reference_doc, FILTERS))
+
+            expected = banner_looks(post_output)
+            if len(expected) != sections or banner_looks(filter_output) != expected:
+                print(f"Banner mismatch at {sections} sections")
+                sys.exit(1)
+            print(
+                f"{sections:>8} {post[0] * 1000:>11.1f}ms {post[1] * 1000:>7.1f}ms {sum(post) * 1000:>7.1f}ms "
+                f"{filtered[0] * 1000:>14.1f}ms {filtered[1] * 1000:>7.1f}ms {sum(filtered) * 1000:>7.1f}ms "
+                f"{sum(post) / sum(filtered):>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
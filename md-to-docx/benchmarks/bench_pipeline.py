@@ -0,0 +1,276 @@
+"""
+Benchmark suite for the whole conversion pipeline, with a baseline to compare against.
+
+Generates synthetic documents per scenario (document length, table count and size,
+diagram count and resolution, status banners) and times:
+- every post-processing stage in isolation, each on a fresh copy of the pandoc output;
+- the conversion end to end through router._run_conversion, stage by stage.
+
+Diagrams always use the stub renderer. pandoc is replaced by fake_pandoc.py unless
+--pandoc real is given, so the suite runs offline; note the fake ignores Lua filters,
+so banners are left to the Python stage. Results can be written as JSON and compared
+with an earlier run; any timing slower than the baseline by more than --threshold
+(and --min-delta) is reported and the exit status is 1.
+
+    python md-to-docx/benchmarks/bench_pipeline.py --output results.json
+    python md-to-docx/benchmarks/bench_pipeline.py --baseline results.json --scenarios tables-large
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from docx import Document
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent.parent
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from docx_package import save_docx  # noqa: E402
+from markdown_preprocessor import preprocess_markdown_text  # noqa: E402
+
+# Sizes of the generated documents. diagram_scale is the renderer's device scale
+# factor (the service default is 4); diagram_nodes sets each diagram's height.
+SCENARIOS = {
+    'small': {'sections': 5, 'paragraphs': 3, 'banners': 1, 'tables': 1, 'table_rows': 5, 'table_columns': 3,
+              'diagrams': 1, 'diagram_nodes': 4, 'diagram_scale': 4},
+    'long': {'sections': 300, 'paragraphs': 8, 'banners': 40, 'tables': 0, 'table_rows': 0, 'table_columns': 0,
+             'diagrams': 0, 'diagram_nodes': 0, 'diagram_scale': 4},
+    'tables-many': {'sections': 40, 'paragraphs': 1, 'banners': 0, 'tables': 80, 'table_rows': 10,
+                    'table_columns': 4, 'diagrams': 0, 'diagram_nodes': 0, 'diagram_scale': 4},
+    'tables-large': {'sections': 2, 'paragraphs': 1, 'banners': 0, 'tables': 2, 'table_rows': 1500,
+                     'table_columns': 6, 'diagrams': 0, 'diagram_nodes': 0, 'diagram_scale': 4},
+    'diagrams-many': {'sections': 20, 'paragraphs': 1, 'banners': 0, 'tables': 0, 'table_rows': 0,
+                      'table_columns': 0, 'diagrams': 24, 'diagram_nodes': 4, 'diagram_scale': 4},
+    'diagrams-hires': {'sections': 4, 'paragraphs': 1, 'banners': 0, 'tables': 0, 'table_rows': 0,
+                       'table_columns': 0, 'diagrams': 4, 'diagram_nodes': 12, 'diagram_scale': 8},
+}
+RISKS = ("high-risk", "medium-risk", "low-risk", "info", "warning")
+PROSE = ("Component {section} handles request routing for the {index} service, with **bold** terms, "
+         "`inline code` and a [reference](#section-{section}) to keep the inline mix realistic.")
+
+
+def _spread(count, sections):
+    """How many of count items go into each section, front-loaded."""
+    return [count // sections + (1 if section < count % sections else 0) for section in range(sections)]
+
+
+def generate_markdown(spec, factor=1.0):
+    """Markdown for a scenario, already run through the preprocessor like an upload."""
+    sized = {name: max(1, round(value * factor)) if value and name != 'diagram_scale' else value
+             for name, value in spec.items()}
+    sections = sized['sections']
+    parts = []
+    for section, (tables, diagrams, banners) in enumerate(zip(
+            _spread(sized['tables'], sections), _spread(sized['diagrams'], sections),
+            _spread(sized['banners'], sections))):
+        parts.append(f"## Section {section}\n")
+        parts.extend(PROSE.format(section=section, index=index) + "\n" for index in range(sized['paragraphs']))
+        for banner in range(banners):
+            risk = RISKS[(section + banner) % len(RISKS)]
+            parts.append(f'<div class="status-banner status-{risk}">Review {section}.{banner} is pending</div>\n')
+        for table in range(tables):
+            columns = sized['table_columns']
+            parts.append("| " + " | ".join(f"Column {column}" for column in range(columns)) + " |")
+            parts.append("| " + " | ".join(":---" for _ in range(columns)) + " |")
+            parts.extend(
+                "| " + " | ".join(f"t{table} r{row} c{column}" for column in range(columns)) + " |"
+                for row in range(sized['table_rows'])
+            )
+            parts.append("")
+        for diagram in range(diagrams):
+            nodes = "\n".join(f"    S{section}D{diagram}N{node} --> S{section}D{diagram}N{node + 1}"
+                              for node in range(sized['diagram_nodes']))
+            parts.append(f"```mermaid\ngraph TD\n{nodes}\n```\n")
+    return preprocess_markdown_text("\n".join(parts))
+
+
+def load_router():
+    # Same dynamic import main.py uses, since the folder name has dashes
+    spec = importlib.util.spec_from_file_location("md_to_docx_router", SCRIPT_DIR.parent / "router.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["md_to_docx_router"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def install_fake_pandoc(bin_dir):
+    """Puts a pandoc on PATH that runs fake_pandoc.py with this interpreter."""
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    launcher = bin_dir / "pandoc"
+    launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{SCRIPT_DIR / "fake_pandoc.py"}" "$@"\n')
+    launcher.chmod(0o755)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+
+
+def use_diagram_scale(router, scale):
+    """Renders later diagrams at the given device scale factor."""
+    if router.MERMAID_FILTER_SCALE != str(scale):
+        router._close_mermaid_renderer()
+        router.MERMAID_FILTER_SCALE = str(scale)
+
+
+def pandoc_output(router, markdown, output_path, work_dir):
+    """The DOCX pandoc writes for a document, before any post-processing."""
+    render_dir = Path(tempfile.mkdtemp(prefix="diagrams_", dir=work_dir))
+    rendered = router._render_mermaid_blocks(markdown, render_dir)
+    cmd = ["pandoc", "-f", "gfm+raw_html", "-o", str(output_path.resolve())]
+    for filter_path in router._find_lua_filters():
+        cmd.extend(["--lua-filter", str(filter_path.resolve())])
+    cmd.extend(["--reference-doc", str(router._reference_doc_for(router.DEFAULT_STYLE_PROFILE).resolve())])
+    subprocess.run(cmd, input=rendered, encoding='utf-8', check=True, cwd=work_dir)
+    shutil.rmtree(render_dir, ignore_errors=True)
+
+
+def summarize(samples):
+    return {'best': min(samples), 'median': statistics.median(samples)}
+
+
+def time_isolated(router, fixture, copy_path, repeat):
+    """Each stage (plus loading and saving) against a freshly loaded copy of the pandoc output."""
+    samples = {}
+    for _ in range(repeat):
+        shutil.copyfile(fixture, copy_path)
+        started = time.perf_counter()
+        doc = Document(str(copy_path))
+        samples.setdefault('load', []).append(time.perf_counter() - started)
+        for stage_name, stage in router.POSTPROCESS_STAGES:
+            doc = Document(str(copy_path))
+            images = router._ImageIndex(doc)
+            started = time.perf_counter()
+            router._run_postprocess_stage(stage_name, stage, doc, images)
+            samples.setdefault(stage_name, []).append(time.perf_counter() - started)
+        doc = Document(str(copy_path))
+        started = time.perf_counter()
+        save_docx(doc, copy_path)
+        samples.setdefault('save', []).append(time.perf_counter() - started)
+    return {stage_name: summarize(stage_samples) for stage_name, stage_samples in samples.items()}
+
+
+def time_end_to_end(router, markdown, output_path, repeat):
+    """router._run_conversion as the service runs it, per stage and in total."""
+    samples = {}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        timings = router._run_conversion(markdown, output_path)
+        samples.setdefault('total', []).append(time.perf_counter() - started)
+        for stage_name, seconds in timings.items():
+            samples.setdefault(stage_name, []).append(seconds)
+    return {stage_name: summarize(stage_samples) for stage_name, stage_samples in samples.items()}
+
+
+def run_scenario(router, name, spec, args, temp_dir):
+    use_diagram_scale(router, spec['diagram_scale'])
+    markdown = generate_markdown(spec, args.factor)
+    fixture = temp_dir / f"{name}.pandoc.docx"
+    pandoc_output(router, markdown, fixture, temp_dir)
+    return {
+        'spec': spec,
+        'markdown_bytes': len(markdown.encode('utf-8')),
+        'pandoc_docx_bytes': fixture.stat().st_size,
+        'isolated': time_isolated(router, fixture, temp_dir / f"{name}.stage.docx", args.repeat),
+        'end_to_end': time_end_to_end(router, markdown, temp_dir / f"{name}.docx", args.repeat),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Prints current vs. baseline best times; returns the regressions found."""
+    regressions = []
+    print(f"\n{'scenario':<16} {'measure':<22} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, scenario in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for section in ('isolated', 'end_to_end'):
+            for stage_name, stats in scenario[section].items():
+                before = previous.get(section, {}).get(stage_name)
+                if before is None:
+                    continue
+                ratio = stats['best'] / before['best'] if before['best'] else 1.0
+                regressed = ratio > 1 + threshold and stats['best'] - before['best'] > min_delta
+                flag = "  REGRESSION" if regressed else ""
+                print(f"{name:<16} {section + '/' + stage_name:<22} {before['best'] * 1000:>8.1f}ms "
+                      f"{stats['best'] * 1000:>8.1f}ms {ratio:>6.2f}x{flag}")
+                if regressed:
+                    regressions.append((name, section, stage_name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage and full conversions.")
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS),
+                        help="Scenarios to run (default: all).")
+    parser.add_argument('--factor', type=float, default=1.0,
+                        help="Multiplies every count in the scenarios (e.g. 0.1 for a quick run).")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best and median are kept).")
+    parser.add_argument('--pandoc', choices=['stub', 'real'], default='stub',
+                        help="fake_pandoc.py (offline, no Lua filters) or the pandoc on PATH.")
+    parser.add_argument('--output', type=Path, help="Write the results to this JSON file.")
+    parser.add_argument('--baseline', type=Path, help="Earlier --output to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Slowdown ratio above which a timing counts as a regression.")
+    parser.add_argument('--min-delta', type=float, default=0.005,
+                        help="Seconds a timing must also have slowed by, so noise on tiny stages is ignored.")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8')) if args.baseline else None
+    # The router resolves its paths against the project root, so the run changes directory
+    output_path = args.output.resolve() if args.output else None
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        if args.pandoc == 'stub':
+            install_fake_pandoc(temp_dir / "bin")
+        os.chdir(PROJECT_ROOT)
+        os.environ["MD_TO_DOCX_MERMAID_RENDERER"] = "stub"
+        # Every run should pay for its diagrams and references; keep the shared caches out of it
+        os.environ["MD_TO_DOCX_DIAGRAM_CACHE_MAX_BYTES"] = "0"
+        os.environ["MD_TO_DOCX_CACHE_MAX_BYTES"] = "0"
+        os.environ["MD_TO_DOCX_REFERENCE_CACHE_DIR"] = str(temp_dir / "references")
+        router = load_router()
+
+        results = {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandoc': args.pandoc,
+            'factor': args.factor,
+            'repeat': args.repeat,
+            'scenarios': {},
+        }
+        for name in args.scenarios:
+            scenario = results['scenarios'][name] = run_scenario(router, name, SCENARIOS[name], args, temp_dir)
+            isolated = ", ".join(f"{stage}={stats['best'] * 1000:.1f}ms" for stage, stats in scenario['isolated'].items())
+            print(f"{name}: end to end {scenario['end_to_end']['total']['best'] * 1000:.1f}ms; isolated: {isolated}")
+
+    if output_path:
+        output_path.write_text(json.dumps(results, indent=2) + "\n", encoding='utf-8')
+        print(f"Results written to {output_path}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"{len(regressions)} timing(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: single-pass Markdown preprocessor vs. the old chained re.sub passes.
+
+Builds multi-megabyte documents (from the repo's spec plus synthetic diagram,
+banner and <details> blocks), checks both implementations produce identical
+output, then reports throughput for whole-document and chunked (upload-style) runs.
+
+    python md-to-docx/benchmarks/bench_preprocess.py --sizes 1 4 16
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent.parent
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from markdown_preprocessor import MarkdownPreprocessor, preprocess_markdown_text  # noqa: E402
+from banner_markers import banner_marker  # noqa: E402
+
+
+def legacy_preprocess(content):
+    # The four chained passes preprocess_markdown used to run (banners written with
+    # today's marker, so only the scanning differs)
+    content = re.sub(r'</?details\b[^>]*>', '', content, flags=re.IGNORECASE)
+    content = re.sub(r'</?summary\b[^>]*>', '', content, flags=re.IGNORECASE)
+    pattern = re.compile(r'<div class="mermaid">\s*(.*?)\s*</div>', re.DOTALL)
+    content = pattern.sub(lambda match: f"\n```mermaid\n{match.group(1).strip()}\n```\n", content)
+    banner_pattern = re.compile(r'<div class="status-banner (.*?)">(.*?)</div>', re.DOTALL)
+    return banner_pattern.sub(lambda match: banner_marker(match.group(1), match.group(2)), content)
+
+
+SYNTHETIC_SECTION = """
+## Section {index}
+
+Some prose describing component {index}, with `inline code` and a [link](#x).
+
+<div class="status-banner status-{risk}">Risk review pending for component {index}</div>
+
+<details>
+<summary>Implementation notes {index}</summary>
+
+- point one
+- point two
+
+</details>
+
+<div class="mermaid">
+graph LR
+    A{index}[Client] --> B{index}[Gateway]
+    B{index} --> C{index}[(Store)]
+</div>
+
+| Field | Type |
+| :--- | :--- |
+| id | int |
+"""
+
+
+def build_document(target_bytes):
+    spec_path = PROJECT_ROOT / "VFRS_Technical_Specification_v1.0.md"
+    base = spec_path.read_text(encoding='utf-8') if spec_path.exists() else ""
+    parts = []
+    size = 0
+    index = 0
+    risks = ("high-risk", "medium-risk", "low-risk", "info")
+    while size < target_bytes:
+        chunk = base if index % 4 == 0 and base else SYNTHETIC_SECTION.format(index=index, risk=risks[index % 4])
+        parts.append(chunk)
+        size += len(chunk)
+        index += 1
+    return "".join(parts)
+
+
+def best_of(repeat, fn):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def chunked(content, chunk_size):
+    preprocessor = MarkdownPreprocessor()
+    parts = [preprocessor.feed(content[i:i + chunk_size]) for i in range(0, len(content), chunk_size)]
+    parts.append(preprocessor.close())
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Markdown preprocessor.")
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16], help="Document sizes in MB.")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is reported).")
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'legacy':>10} {'single':>10} {'chunked':>10} {'speedup':>8}")
+    for size_mb in args.sizes:
+        content = build_document(int(size_mb * 1024 * 1024))
+        legacy_time, legacy_output = best_of(args.repeat, lambda: legacy_preprocess(content))
+        single_time, single_output = best_of(args.repeat, lambda: preprocess_markdown_text(content))
+        chunked_time, chunked_output = best_of(args.repeat, lambda: chunked(content, 64 * 1024))
+
+        if single_output != legacy_output or chunked_output != legacy_output:
+            print(f"Output mismatch at {size_mb} MB")
+            sys.exit(1)
+
+        print(
+            f"{size_mb:>6.1f}MB {legacy_time * 1000:>8.1f}ms {single_time * 1000:>8.1f}ms "
+            f"{chunked_time * 1000:>8.1f}ms {legacy_time / single_time:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmark: XPath/template table styling vs. the old python-docx proxy loop.
+
+Builds documents with one pandoc-shaped table of each size (header row plus body
+rows, a Compact-styled paragraph per cell), styles them with the old per-cell
+loop, with table_styling per cell, and with table_styling's default table-level
+borders, and checks all three give every cell the same effective formatting.
+
+    python md-to-docx/benchmarks/bench_tables.py --cells 1000 10000 40000
+"""
+import argparse
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+from docx import Document
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.shared import Pt, RGBColor
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from table_styling import style_tables  # noqa: E402
+
+REFERENCE_DOC = SCRIPT_DIR.parent / "reference.docx"
+COLUMNS = 8
+
+
+# --- The router's table pass before this change -------------------------------
+
+def _set_cell_borders(cell):
+    tc_pr = cell._tc.get_or_add_tcPr()
+    tc_mar = tc_pr.find(qn('w:tcMar'))
+    if tc_mar is None:
+        tc_mar = OxmlElement('w:tcMar')
+        tc_pr.append(tc_mar)
+    for side, width in [('top', 100), ('bottom', 100), ('left', 100), ('right', 100)]:
+        node = tc_mar.find(qn(f'w:{side}'))
+        if node is None:
+            node = OxmlElement(f'w:{side}')
+            tc_mar.append(node)
+        node.set(qn('w:w'), str(width))
+        node.set(qn('w:type'), 'dxa')
+    tc_borders = tc_pr.find(qn('w:tcBorders'))
+    if tc_borders is None:
+        tc_borders = OxmlElement('w:tcBorders')
+        tc_pr.append(tc_borders)
+    for edge in ('top', 'left', 'bottom', 'right'):
+        element = tc_borders.find(qn(f'w:{edge}'))
+        if element is None:
+            element = OxmlElement(f'w:{edge}')
+            tc_borders.append(element)
+        element.set(qn('w:val'), 'single')
+        element.set(qn('w:sz'), '4')
+        element.set(qn('w:space'), '0')
+        element.set(qn('w:color'), 'AAAAAA')
+
+
+def _set_cell_shading(cell, fill='D9E2F3'):
+    tc_pr = cell._tc.get_or_add_tcPr()
+    shd = tc_pr.find(qn('w:shd'))
+    if shd is None:
+        shd = OxmlElement('w:shd')
+        tc_pr.append(shd)
+    shd.set(qn('w:val'), 'clear')
+    shd.set(qn('w:color'), 'auto')
+    shd.set(qn('w:fill'), fill)
+
+
+def legacy_style_tables(doc):
+    for table in doc.tables:
+        for style_name in ['MyCustomTable', 'Table Grid', 'Normal Table']:
+            try:
+                table.style = style_name
+                break
+            except Exception:
+                continue
+        if table.rows:
+            for cell in table.rows[0].cells:
+                _set_cell_shading(cell)
+                for paragraph in cell.paragraphs:
+                    for run in paragraph.runs:
+                        run.bold = True
+                        run.font.name = 'Arial'
+                        run.font.size = Pt(11)
+                        run.font.color.rgb = RGBColor(0, 0, 0)
+        for row in table.rows:
+            for cell in row.cells:
+                _set_cell_borders(cell)
+                for paragraph in cell.paragraphs:
+                    paragraph.paragraph_format.space_after = Pt(0)
+                    if paragraph.style.name == 'Normal':
+                        paragraph.style = doc.styles['Normal']
+
+
+# --- Fixtures and comparison --------------------------------------------------
+
+def build_document(cells):
+    """A DOCX holding one table of about `cells` cells, laid out the way pandoc writes tables."""
+    doc = Document(str(REFERENCE_DOC)) if REFERENCE_DOC.exists() else Document()
+    rows = max(2, cells // COLUMNS)
+    width = 5000 // COLUMNS
+
+    def row_xml(index):
+        cells_xml = []
+        for column in range(COLUMNS):
+            # Every third cell asks for Normal explicitly, the rest use pandoc's Compact
+            style = 'Normal' if (index + column) % 3 == 0 else 'Compact'
+            cells_xml.append(
+                f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="pct"/></w:tcPr>'
+                f'<w:p><w:pPr><w:pStyle w:val="{style}"/></w:pPr>'
+                f'<w:r><w:t>r{index}c{column}</w:t></w:r></w:p></w:tc>'
+            )
+        return f'<w:tr>{"".join(cells_xml)}</w:tr>'
+
+    table_xml = (
+        f'<w:tbl {nsdecls("w")}><w:tblPr><w:tblStyle w:val="Table"/>'
+        f'<w:tblW w:w="5000" w:type="pct"/><w:tblLook w:firstRow="1"/></w:tblPr>'
+        f'<w:tblGrid>{"<w:gridCol/>" * COLUMNS}</w:tblGrid>'
+        f'{"".join(row_xml(index) for index in range(rows))}</w:tbl>'
+    )
+    doc.add_paragraph("Before the table")
+    doc.element.body.sectPr.addprevious(parse_xml(table_xml))
+    output = BytesIO()
+    doc.save(output)
+    return output.getvalue(), rows * COLUMNS
+
+
+def _attributes(element):
+    if element is None:
+        return None
+    return tuple(sorted((key.split('}')[-1], value) for key, value in element.attrib.items()))
+
+
+def _side(cell_group, table_group, side, inside):
+    node = cell_group.find(qn(f'w:{side}')) if cell_group is not None else None
+    if node is None and table_group is not None:
+        node = table_group.find(qn(f'w:{inside or side}'))
+    return _attributes(node)
+
+
+def effective_formatting(doc):
+    """Per cell: the borders and margins it ends up with (own or table-level), shading, paragraphs, header runs."""
+    result = []
+    for tbl in doc.element.body.tbl_lst:
+        tbl_borders = tbl.tblPr.find(qn('w:tblBorders'))
+        tbl_margins = tbl.tblPr.find(qn('w:tblCellMar'))
+        rows = tbl.tr_lst
+        result.append(('style', tbl.tblStyle_val))
+        for row_index, tr in enumerate(rows):
+            cells = tr.tc_lst
+            for column, tc in enumerate(cells):
+                tc_pr = tc.tcPr
+                borders = tc_pr.find(qn('w:tcBorders')) if tc_pr is not None else None
+                margins = tc_pr.find(qn('w:tcMar')) if tc_pr is not None else None
+                inside = {
+                    'top': 'insideH' if row_index else None,
+                    'bottom': 'insideH' if row_index < len(rows) - 1 else None,
+                    'left': 'insideV' if column else None,
+                    'right': 'insideV' if column < len(cells) - 1 else None,
+                }
+                result.append((
+                    tuple(_side(borders, tbl_borders, side, inside[side]) for side in inside),
+                    tuple(_side(margins, tbl_margins, side, None) for side in inside),
+                    _attributes(tc_pr.find(qn('w:shd')) if tc_pr is not None else None),
+                    tuple(
+                        (p.style, p.pPr.spacing_after if p.pPr is not None else None,
+                         tuple((child.tag, _attributes(child)) for r in p.r_lst if r.rPr is not None for child in r.rPr))
+                        for p in tc.p_lst
+                    ),
+                ))
+    return result
+
+
+def best_of(repeat, blob, fn):
+    """Fastest of `repeat` runs of fn on a freshly loaded copy of blob; returns (seconds, document)."""
+    timings = []
+    doc = None
+    for _ in range(repeat):
+        doc = Document(BytesIO(blob))
+        started = time.perf_counter()
+        fn(doc)
+        timings.append(time.perf_counter() - started)
+    return min(timings), doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark table post-processing on large tables.")
+    parser.add_argument('--cells', type=int, nargs='+', default=[1000, 10000, 40000],
+                        help="Approximate cell counts of the generated tables.")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is reported).")
+    args = parser.parse_args()
+
+    print(f"{'cells':>7} {'old loop':>10} {'per cell':>10} {'table-lvl':>10} {'speedup':>8}")
+    for cells in args.cells:
+        blob, cell_count = build_document(cells)
+        old_time, old_doc = best_of(args.repeat, blob, legacy_style_tables)
+        cell_time, cell_doc = best_of(args.repeat, blob, lambda doc: style_tables(doc, table_level=False))
+        table_time, table_doc = best_of(args.repeat, blob, style_tables)
+
+        expected = effective_formatting(old_doc)
+        for name, doc in (("per cell", cell_doc), ("table-level", table_doc)):
+            if effective_formatting(doc) != expected:
+                print(f"Formatting mismatch ({name}) at {cell_count} cells")
+                sys.exit(1)
+        print(
+            f"{cell_count:>7} {old_time * 1000:>8.1f}ms {cell_time * 1000:>8.1f}ms "
+            f"{table_time * 1000:>8.1f}ms {old_time / table_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
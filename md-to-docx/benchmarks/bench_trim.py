@@ -0,0 +1,120 @@
+"""
+Benchmark: NumPy edge-scanning whitespace trim vs. the old ImageChops comparison.
+
+Draws diagram-like PNGs at mermaid-filter's deviceScaleFactor of 8, checks both
+implementations find the same content box, then times the bounding-box search on
+its own and the whole trim (decode, crop, re-encode). The "tight" case has too
+little margin to be worth cropping: the new trim skips the re-encode there.
+
+    python md-to-docx/benchmarks/bench_trim.py --scale 8 --repeat 3
+"""
+import argparse
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageDraw
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+from image_processing import content_bounds, trim_image_blob  # noqa: E402
+
+
+def legacy_bounds(img):
+    rgb = img.convert('RGB') if img.mode != 'RGB' else img
+    white_bg = Image.new('RGB', rgb.size, 'white')
+    return ImageChops.difference(rgb, white_bg).getbbox()
+
+
+def legacy_trim(blob):
+    # The router's trim before this change: full-size comparison image, 0.98 ratio cut-off
+    with Image.open(BytesIO(blob)) as img:
+        original_width, original_height = img.size
+        bbox = legacy_bounds(img)
+        if bbox is None:
+            return None
+        left, top, right, bottom = bbox
+        padding = 4
+        left = max(0, left - padding)
+        top = max(0, top - padding)
+        right = min(original_width, right + padding)
+        bottom = min(original_height, bottom + padding)
+        if (right - left) / original_width > 0.98 and (bottom - top) / original_height > 0.98:
+            return None
+        cropped = img.crop((left, top, right, bottom))
+        output = BytesIO()
+        cropped.save(output, format=img.format)
+        return output.getvalue()
+
+
+def build_diagram(css_width, css_height, scale, margin_x, margin_y):
+    """A flowchart-ish PNG: rows of outlined boxes with connectors, inside a white margin."""
+    width, height = css_width * scale, css_height * scale
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    inner = (int(width * margin_x), int(height * margin_y), int(width * (1 - margin_x)), int(height * (1 - margin_y)))
+    # Subgraph frame, so the content box is exactly the area inside the margins
+    draw.rectangle(inner, outline=(51, 51, 51), width=scale)
+    rows, columns = 4, 3
+    cell_width = (inner[2] - inner[0]) // columns
+    cell_height = (inner[3] - inner[1]) // rows
+    for row in range(rows):
+        for column in range(columns):
+            left = inner[0] + column * cell_width + cell_width // 6
+            top = inner[1] + row * cell_height + cell_height // 4
+            box = (left, top, left + cell_width * 2 // 3, top + cell_height // 2)
+            draw.rectangle(box, outline=(51, 51, 51), fill=(236, 236, 255), width=scale)
+            if column:
+                draw.line((box[0] - cell_width // 3, (box[1] + box[3]) // 2, box[0], (box[1] + box[3]) // 2),
+                          fill=(51, 51, 51), width=scale)
+    output = BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def best_of(repeat, fn):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark diagram whitespace trimming.")
+    parser.add_argument('--scale', type=int, default=8, help="Device scale factor of the rendered diagrams.")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is reported).")
+    args = parser.parse_args()
+
+    # (name, CSS width, CSS height, horizontal margin, vertical margin)
+    cases = [
+        ("wide margin", 800, 600, 0.25, 0.25),
+        ("some margin", 1100, 700, 0.08, 0.05),
+        ("tight", 800, 600, 0.0, 0.015),
+    ]
+    print(f"{'case':>12} {'pixels':>8} {'bounds old':>11} {'bounds new':>11} {'trim old':>10} {'trim new':>10} {'speedup':>8}")
+    for name, css_width, css_height, margin_x, margin_y in cases:
+        blob = build_diagram(css_width, css_height, args.scale, margin_x, margin_y)
+        with Image.open(BytesIO(blob)) as img:
+            img.load()
+            old_bounds_time, old_bounds = best_of(args.repeat, lambda: legacy_bounds(img))
+            new_bounds_time, new_bounds = best_of(args.repeat, lambda: content_bounds(img))
+            megapixels = img.width * img.height / 1e6
+        if old_bounds != new_bounds:
+            print(f"Bounding box mismatch for {name}: {old_bounds} != {new_bounds}")
+            sys.exit(1)
+
+        old_trim_time, _ = best_of(args.repeat, lambda: legacy_trim(blob))
+        new_trim_time, _ = best_of(args.repeat, lambda: trim_image_blob(blob))
+        print(
+            f"{name:>12} {megapixels:>6.1f}MP {old_bounds_time * 1000:>9.1f}ms {new_bounds_time * 1000:>9.1f}ms "
+            f"{old_trim_time * 1000:>8.1f}ms {new_trim_time * 1000:>8.1f}ms {old_trim_time / new_trim_time:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
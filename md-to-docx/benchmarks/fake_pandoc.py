@@ -0,0 +1,169 @@
+"""
+Offline stand-in for the pandoc binary, for benchmarks.
+
+Understands the Markdown subset bench_pipeline.py generates (headings, paragraphs,
+pipe tables, image references, fenced code) and writes a DOCX shaped like pandoc's:
+the reference document's styles, Heading N / First Paragraph / Body Text paragraphs,
+tables with a "Table" style and Compact cell paragraphs, pictures in their own
+paragraph. Lua filters are ignored, so banner markers reach post-processing as text.
+
+    fake_pandoc.py -f gfm -o out.docx --reference-doc ref.docx < in.md
+"""
+import os
+import re
+import sys
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.shared import Inches
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+_IMAGE = re.compile(r'^!\[[^\]]*\]\(<?([^)>]+)>?\)$')
+# Options followed by a value; everything else is a flag
+_VALUE_OPTIONS = {'-f', '--from', '-t', '--to', '-o', '--output', '-F', '--filter', '-L', '--lua-filter',
+                  '--reference-doc', '--resource-path', '--data-dir', '-M', '--metadata',
+                  '--print-default-data-file'}
+# pandoc sizes pictures from their DPI, capped to the text width
+_PIXELS_PER_INCH = 96
+_MAX_WIDTH = Inches(6)
+
+
+def parse_args(argv):
+    options = {}
+    inputs = []
+    index = 0
+    while index < len(argv):
+        arg = argv[index]
+        if arg in _VALUE_OPTIONS:
+            options[arg] = argv[index + 1]
+            index += 2
+            continue
+        if not arg.startswith('-'):
+            inputs.append(arg)
+        index += 1
+    return options, inputs
+
+
+def _add_table(doc, rows):
+    columns = max(len(row) for row in rows)
+    width = 5000 // columns
+
+    def row_xml(cells, header):
+        cells_xml = "".join(
+            f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="pct"/></w:tcPr>'
+            f'<w:p><w:pPr><w:pStyle w:val="Compact"/></w:pPr>'
+            f'<w:r><w:t xml:space="preserve">{escape(cell)}</w:t></w:r></w:p></w:tc>'
+            for cell in cells + [""] * (columns - len(cells))
+        )
+        properties = '<w:trPr><w:tblHeader w:val="on"/></w:trPr>' if header else ''
+        return f'<w:tr>{properties}{cells_xml}</w:tr>'
+
+    table_xml = (
+        f'<w:tbl {nsdecls("w")}><w:tblPr><w:tblStyle w:val="Table"/>'
+        f'<w:tblW w:w="5000" w:type="pct"/><w:tblLook w:firstRow="1"/></w:tblPr>'
+        f'<w:tblGrid>{"<w:gridCol/>" * columns}</w:tblGrid>'
+        f'{"".join(row_xml(row, index == 0) for index, row in enumerate(rows))}</w:tbl>'
+    )
+    doc.element.body.sectPr.addprevious(parse_xml(table_xml))
+
+
+def _find_resource(path, resource_path):
+    # Like pandoc, relative image links are tried in each --resource-path directory in turn
+    if os.path.isabs(path):
+        return path
+    for directory in resource_path:
+        candidate = os.path.join(directory, path)
+        if os.path.exists(candidate):
+            return candidate
+    return path
+
+
+def _add_picture(doc, path):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        width = Inches(image.width / _PIXELS_PER_INCH)
+    doc.add_picture(path, width=min(width, _MAX_WIDTH))
+
+
+def convert(markdown, doc, resource_path=('.',)):
+    style_names = {style.name for style in doc.styles}
+    body_style = 'Body Text' if 'Body Text' in style_names else None
+    first_style = 'First Paragraph' if 'First Paragraph' in style_names else body_style
+    paragraph_lines = []
+    table_rows = []
+    after_heading = False
+
+    def flush_paragraph():
+        nonlocal after_heading
+        if paragraph_lines:
+            doc.add_paragraph(" ".join(paragraph_lines), style=first_style if after_heading else body_style)
+            paragraph_lines.clear()
+            after_heading = False
+
+    def flush_table():
+        if table_rows:
+            _add_table(doc, table_rows)
+            table_rows.clear()
+
+    lines = iter(markdown.splitlines())
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('|'):
+            flush_paragraph()
+            cells = [cell.strip() for cell in stripped.strip('|').split('|')]
+            # The alignment row under the header
+            if not all(set(cell) <= set(':-') and cell for cell in cells):
+                table_rows.append(cells)
+            continue
+        flush_table()
+        if not stripped:
+            flush_paragraph()
+            continue
+        if stripped.startswith('```'):
+            flush_paragraph()
+            code = []
+            for code_line in lines:
+                if code_line.strip().startswith('```'):
+                    break
+                code.append(code_line)
+            doc.add_paragraph("\n".join(code), style='Source Code' if 'Source Code' in style_names else None)
+            continue
+        heading = _HEADING.match(stripped)
+        if heading:
+            flush_paragraph()
+            doc.add_heading(heading.group(2), level=len(heading.group(1)))
+            after_heading = True
+            continue
+        image = _IMAGE.match(stripped)
+        if image:
+            flush_paragraph()
+            _add_picture(doc, _find_resource(image.group(1), resource_path))
+            continue
+        paragraph_lines.append(stripped)
+    flush_paragraph()
+    flush_table()
+
+
+def main(argv):
+    options, inputs = parse_args(argv)
+    output = options.get('-o') or options.get('--output')
+    if '--print-default-data-file' in options:
+        Document().save(output)
+        return
+    markdown = "".join(open(path, encoding='utf-8').read() for path in inputs) if inputs else sys.stdin.read()
+    reference = options.get('--reference-doc')
+    doc = Document(reference) if reference else Document()
+    # Keep the reference document's styles and section, drop its sample content
+    body = doc.element.body
+    for child in list(body):
+        if child is not body.sectPr:
+            body.remove(child)
+    convert(markdown, doc, options.get('--resource-path', '.').split(os.pathsep))
+    doc.save(output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
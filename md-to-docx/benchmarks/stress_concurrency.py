@@ -0,0 +1,125 @@
+"""
+Concurrency stress check for the conversion pipeline.
+
+Runs many conversions at once through router._run_conversion, each with its own
+marker text, table size and diagram, then verifies that every DOCX contains
+exactly its own content and that no workspace or CWD config file is left behind.
+Diagrams use the stub renderer, so only pandoc is required.
+
+    python md-to-docx/benchmarks/stress_concurrency.py --documents 32 --workers 8
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent.parent
+
+
+def load_router():
+    # Same dynamic import main.py uses, since the folder name has dashes
+    spec = importlib.util.spec_from_file_location("md_to_docx_router", SCRIPT_DIR.parent / "router.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["md_to_docx_router"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_document(index, marker):
+    rows = "\n".join(f"| {index}-{row} | value {row} |" for row in range(index % 5 + 1))
+    return f"""# Document {index}
+
+{marker}
+
+| Key | Value |
+| :--- | :--- |
+{rows}
+
+<div class="mermaid">
+graph LR
+    N{index}A[Start {index}] --> N{index}B[End {index}]
+</div>
+"""
+
+
+def convert_one(router, work_root, index):
+    marker = f"marker-{uuid.uuid4().hex}"
+    output_path = work_root / f"doc_{index}.docx"
+    markdown_text = router.preprocess_markdown_text(build_document(index, marker))
+    router._run_conversion(markdown_text, output_path)
+    return index, marker, output_path
+
+
+def verify(index, marker, output_path, all_markers):
+    from docx import Document
+
+    problems = []
+    doc = Document(str(output_path))
+    text = "\n".join(paragraph.text for paragraph in doc.paragraphs)
+    if marker not in text:
+        problems.append("own marker missing")
+    foreign = [other for other in all_markers if other != marker and other in text]
+    if foreign:
+        problems.append(f"{len(foreign)} foreign marker(s) present")
+    if f"Document {index}" not in text:
+        problems.append("heading missing")
+    expected_rows = index % 5 + 2
+    if not doc.tables or len(doc.tables[0].rows) != expected_rows:
+        problems.append(f"expected a table with {expected_rows} rows")
+    if len(doc.inline_shapes) < 1:
+        problems.append("diagram missing")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many conversions concurrently and check the outputs.")
+    parser.add_argument('--documents', type=int, default=32, help="Number of documents to convert.")
+    parser.add_argument('--workers', type=int, default=8, help="Conversions running at once.")
+    args = parser.parse_args()
+
+    os.chdir(PROJECT_ROOT)
+    os.environ["MD_TO_DOCX_MERMAID_RENDERER"] = "stub"
+    # Every document has a unique diagram anyway; keep the shared caches out of it
+    os.environ["MD_TO_DOCX_DIAGRAM_CACHE_MAX_BYTES"] = "0"
+    os.environ["MD_TO_DOCX_CACHE_MAX_BYTES"] = "0"
+    router = load_router()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_root = Path(temp_dir)
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = [
+                executor.submit(convert_one, router, work_root, index)
+                for index in range(args.documents)
+            ]
+            results = [future.result() for future in futures]
+
+        all_markers = [marker for _index, marker, _path in results]
+        failures = 0
+        for index, marker, output_path in results:
+            problems = verify(index, marker, output_path, all_markers)
+            if problems:
+                failures += 1
+                print(f"❌ Document {index}: {', '.join(problems)}")
+
+    leftovers = list(router.WORK_DIR.iterdir())
+    if leftovers:
+        failures += 1
+        print(f"❌ {len(leftovers)} workspace(s) left in {router.WORK_DIR}")
+    for config_name in (".puppeteer.json", ".mermaid-config.json"):
+        if Path(config_name).exists():
+            failures += 1
+            print(f"❌ {config_name} was written to the shared CWD")
+
+    if failures:
+        print(f"{failures} problem(s) across {args.documents} concurrent conversions")
+        sys.exit(1)
+    print(f"✅ {args.documents} concurrent conversions on {args.workers} workers, all outputs intact")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+
+class JobQueueFullError(Exception):
+    """Raised when max_pending jobs are already waiting to run."""
+
+    def __init__(self, retry_after):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class JobManager:
+    """
+    Accepts conversions as background jobs and runs them on a ConversionPool.
+    Jobs wait in an in-process queue (up to max_pending) rather than in the pool's
+    own short queue, so a burst is absorbed instead of rejected with 503.
+    Finished jobs are kept for ttl seconds so clients can poll and download them.
+    """
+
+    def __init__(self, pool, max_pending=100, ttl=3600, retry_delay=1.0, on_expire=None, on_done=None):
+        self.pool = pool
+        self.max_pending = max(1, max_pending)
+        self.ttl = ttl
+        # How long a worker waits before retrying when synchronous requests fill the pool
+        self.retry_delay = retry_delay
+        # Called with each job record dropped after its ttl (e.g. to delete the output)
+        self.on_expire = on_expire
+        # Called on the event loop with a snapshot of each job that ran, once it's done or failed
+        self.on_done = on_done
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._workers = []
+
+    async def start(self):
+        """Starts one worker task per pool slot on the running event loop."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"md-to-docx-job-{index}")
+            for index in range(self.pool.max_workers)
+        ]
+
+    async def stop(self):
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def create(self, **fields):
+        """Registers a new queued job and returns its record."""
+        self.prune()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "stages": {},
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        job.update(fields)
+        with self._lock:
+            self._jobs[job["id"]] = job
+        return job
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def finish(self, job_id, **fields):
+        """Marks a job done without running anything (e.g. served from a cache)."""
+        self.update(job_id, status="done", finished_at=time.time(), **fields)
+
+    async def submit(self, job_id, fn, *args):
+        """Queues fn(*args) to run on the pool for an already created job."""
+        # Started lazily too, for apps that don't wire up start() at startup
+        await self.start()
+        try:
+            self._queue.put_nowait((job_id, fn, args))
+        except asyncio.QueueFull:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            raise JobQueueFullError(self.pool.retry_after)
+
+    def stage_done(self, job_id, stage, seconds):
+        """Progress callback: records a finished stage. Safe to call from worker threads."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["stages"][stage] = seconds
+
+    def get(self, job_id):
+        """Returns a snapshot of the job record, or None if unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+            snapshot["stages"] = dict(job["stages"])
+        return snapshot
+
+    async def _work(self):
+        while True:
+            job_id, fn, args = await self._queue.get()
+            try:
+                with self._lock:
+                    job = self._jobs.get(job_id)
+                    if job is not None:
+                        job["status"] = "running"
+                        job["started_at"] = time.time()
+                try:
+                    # Synchronous requests may hold every slot; the job simply waits its turn
+                    timings = await self.pool.run_waiting(fn, *args, retry_delay=self.retry_delay)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as error:
+                    print(f"Job {job_id} failed: {error}")
+                    with self._lock:
+                        if job is not None:
+                            job["status"] = "failed"
+                            job["error"] = str(error)
+                            job["finished_at"] = time.time()
+                else:
+                    with self._lock:
+                        if job is not None:
+                            # Replaces the streamed progress with the authoritative timings
+                            job["stages"] = dict(timings or {})
+                            job["status"] = "done"
+                            job["finished_at"] = time.time()
+                if job is not None and self.on_done is not None:
+                    try:
+                        self.on_done(self.get(job_id) or dict(job))
+                    except Exception as error:
+                        print(f"Job {job_id} completion hook failed: {error}")
+            finally:
+                self._queue.task_done()
+
+    def prune(self):
+        """Drops jobs finished more than ttl seconds ago, handing each to on_expire."""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job["finished_at"] is not None and job["finished_at"] < cutoff
+            ]
+            for job in expired:
+                del self._jobs[job["id"]]
+        if self.on_expire is not None:
+            for job in expired:
+                self.on_expire(job)
+
+    def output_paths(self):
+        """Output paths of every job still held, finished or not."""
+        with self._lock:
+            return [job["output_path"] for job in self._jobs.values() if job.get("output_path")]
+
+    def stats(self):
+        with self._lock:
+            statuses = [job["status"] for job in self._jobs.values()]
+        return {
+            "max_pending": self.max_pending,
+            **{status: statuses.count(status) for status in ("queued", "running", "done", "failed")},
+        }
+
+
+def job_manager_from_env(pool, on_expire=None, on_done=None):
+    return JobManager(
+        pool,
+        max_pending=int(os.environ.get("MD_TO_DOCX_JOB_QUEUE", "100")),
+        ttl=int(os.environ.get("MD_TO_DOCX_JOB_TTL", "3600")),
+        on_expire=on_expire,
+        on_done=on_done,
+    )
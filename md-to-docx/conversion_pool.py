@@ -0,0 +1,130 @@
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class PoolSaturatedError(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("Conversion pool is saturated")
+        self.retry_after = retry_after
+
+
+def _call_by_name(module_name, module_path, function_name, args):
+    """
+    Process pool entry point. The router is loaded with importlib under a synthetic
+    module name, so a worker imports it from its file (once) and looks the job up there.
+    """
+    module = sys.modules.get(module_name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(module_name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return getattr(module, function_name)(*args)
+
+
+class ConversionPool:
+    """
+    Runs blocking conversion work off the event loop on a thread or process pool.
+    At most max_workers jobs run at once and at most max_queue more wait for a slot;
+    anything beyond that is rejected straight away with PoolSaturatedError.
+    """
+
+    def __init__(self, kind="thread", max_workers=2, max_queue=8, retry_after=15):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown pool kind: {kind}")
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created lazily so importing the router doesn't fork or spawn anything
+        if self._executor is None:
+            if self.kind == "process":
+                # Never forked: requests arrive on threads of a threaded server, and a fork
+                # would copy locks other threads hold and inherit their open pipes
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(method)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="md-to-docx"
+                )
+        return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) on the pool and waits for its result without blocking the loop."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise PoolSaturatedError(self.retry_after)
+            self._pending += 1
+
+        try:
+            if self.kind == "process":
+                module = sys.modules[fn.__module__]
+                future = self._get_executor().submit(
+                    _call_by_name, fn.__module__, module.__file__, fn.__name__, args
+                )
+            else:
+                future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+
+        # The slot is released when the job really finishes, not when the caller stops
+        # waiting, so a dropped client can't let more jobs run than the pool allows.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def run_waiting(self, fn, *args, retry_delay=1.0):
+        """
+        Like run(), but waits for a free slot instead of raising PoolSaturatedError.
+        For work that was already accepted (background jobs, batch members).
+        """
+        while True:
+            try:
+                return await self.run(fn, *args)
+            except PoolSaturatedError:
+                await asyncio.sleep(retry_delay)
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(pending, self.max_workers),
+            "queued": max(0, pending - self.max_workers),
+        }
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def pool_from_env():
+    return ConversionPool(
+        kind=os.environ.get("MD_TO_DOCX_POOL_KIND", "thread"),
+        max_workers=int(os.environ.get("MD_TO_DOCX_MAX_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        max_queue=int(os.environ.get("MD_TO_DOCX_MAX_QUEUE", "8")),
+        retry_after=int(os.environ.get("MD_TO_DOCX_RETRY_AFTER", "15")),
+    )
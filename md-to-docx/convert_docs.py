@@ -1,8 +1,12 @@
+import hashlib
+import json
 import os
 import subprocess
 import sys
-import re
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from markdown_preprocessor import preprocess_markdown_text
 
 # Configuration
 DOCKER_IMAGE_NAME = "covpay-docs-builder"
@@ -10,6 +14,15 @@ DOCKER_IMAGE_NAME = "covpay-docs-builder"
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
 DOCKERFILE_PATH = os.path.join(PROJECT_ROOT, "Dockerfile")
+CLI_REWRITES = ("details", "summary", "mermaid")
+PREPROCESSOR_PATH = os.path.join(SCRIPT_DIR, "markdown_preprocessor.py")
+# Hashes of each file's inputs at its last successful conversion, for --changed-only
+MANIFEST_NAME = ".convert_docs_manifest.json"
+PANDOC_FILTER_ARGS = ["-F", "mermaid-filter"]
+PUPPETEER_CONFIG = {
+    "executablePath": "/usr/bin/google-chrome",
+    "args": ["--no-sandbox", "--disable-setuid-sandbox"]
+}
 
 def run_command(command, cwd=None):
     """Running a shell command and printing output."""
@@ -67,21 +80,10 @@ def preprocess_markdown(file_path):
     with open(file_path, 'r', encoding='utf-8') as f:
         content = f.read()
     
-    # Strip <details> and <summary> tags (keep content) for DOCX compatibility
-    # These HTML tags are often ignored or dropped by Pandoc when converting to DOCX
-    content = re.sub(r'</?details\b[^>]*>', '', content, flags=re.IGNORECASE)
-    content = re.sub(r'</?summary\b[^>]*>', '', content, flags=re.IGNORECASE)
-
-    # Regex to transform <div class="mermaid">...</div> into ```mermaid...```
-    # The flag re.DOTALL is essential so . matches newlines
-    pattern = re.compile(r'<div class="mermaid">\s*(.*?)\s*</div>', re.DOTALL)
-    
-    def replacement(match):
-        code = match.group(1).strip()
-        return f"\n```mermaid\n{code}\n```\n"
-    
-    new_content = pattern.sub(replacement, content)
-    
+    # Same single-pass rewrites the API uses, minus status banners: the CLI has no
+    # post-processing step to turn banner markers back into styled paragraphs
+    new_content = preprocess_markdown_text(content, rewrites=CLI_REWRITES)
+
     base, ext = os.path.splitext(file_path)
     temp_path = f"{base}_temp{ext}"
     
@@ -90,104 +92,164 @@ def preprocess_markdown(file_path):
     
     return temp_path
 
-def convert_file(input_file):
+def file_digest(path):
+    """SHA-256 of a file's contents, or None if it doesn't exist."""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def filter_fingerprint():
+    """
+    Hash of everything besides the Markdown and reference doc that shapes the output:
+    the pandoc filter options, the Puppeteer config mermaid-filter reads, and the
+    preprocessing rewrites applied before pandoc sees the file.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(PANDOC_FILTER_ARGS).encode('utf-8'))
+    digest.update(json.dumps(PUPPETEER_CONFIG, sort_keys=True).encode('utf-8'))
+    digest.update(json.dumps(CLI_REWRITES).encode('utf-8'))
+    digest.update((file_digest(PREPROCESSOR_PATH) or "").encode('utf-8'))
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"Ignoring unreadable manifest: {manifest_path}")
+        return {}
+
+def save_manifest(manifest_path, manifest):
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+def build_hashes(input_file, reference_doc, fingerprint):
+    return {
+        "markdown": file_digest(input_file),
+        "reference": file_digest(reference_doc),
+        "filter": fingerprint,
+    }
+
+def is_unchanged(manifest, input_file, hashes):
+    """True when the last successful build used identical inputs and its output still exists."""
+    entry = manifest.get(manifest_key(input_file))
+    if not entry:
+        return False
+    output_file = os.path.splitext(input_file)[0] + ".docx"
+    return all(entry.get(name) == value for name, value in hashes.items()) and os.path.exists(output_file)
+
+def manifest_key(input_file):
+    return os.path.relpath(os.path.abspath(input_file)).replace(os.sep, "/")
+
+def start_docs_container(current_dir):
     """
-    Converts a single markdown file to docx using the docker container.
+    Starts one long-lived container with the working directory mounted, so every
+    conversion is a cheap `docker exec` instead of a fresh `docker run --rm`.
+    Returns the container name, or None if it couldn't be started.
     """
-    if not os.path.exists(input_file):
-        print(f"File not found: {input_file}")
-        return
+    container_name = f"{DOCKER_IMAGE_NAME}-{os.getpid()}"
+    docker_cmd = (
+        f'docker run -d --rm --name {container_name} '
+        f'-v "{current_dir}:/data" '
+        f'-w /data '
+        f'--entrypoint sleep '
+        f'{DOCKER_IMAGE_NAME} infinity'
+    )
+    if not run_command(docker_cmd):
+        return None
+    return container_name
+
+def stop_docs_container(container_name):
+    run_command(f"docker stop {container_name}")
+
+def write_puppeteer_config(current_dir):
+    """
+    mermaid-filter supports a .puppeteer.json file in the current working directory.
+    Written once per run into the directory that pandoc runs in (mounted as /data).
+    """
+    puppeteer_config_path = os.path.join(current_dir, ".puppeteer.json")
+    with open(puppeteer_config_path, 'w') as f:
+        json.dump(PUPPETEER_CONFIG, f)
+    return puppeteer_config_path
 
+def convert_file(input_file, pandoc_cmd, current_dir, reference_arg=""):
+    """
+    Converts a single markdown file to docx.
+    pandoc_cmd is the pandoc invocation prefix: `pandoc` for local runs, or a
+    `docker exec` into the shared container. Returns True on success.
+    """
     print(f"\nProcessing {input_file}...")
     
     # 1. Preprocess (handle custom mermaid divs)
     temp_file = preprocess_markdown(input_file)
     output_file = os.path.splitext(input_file)[0] + ".docx"
     
-    # Get absolute paths for Docker volume mounting
-    current_dir = os.getcwd()
-    temp_filename = os.path.basename(temp_file)
-    output_filename = os.path.basename(output_file)
-    
-    # 2. Run Docker Container
-    # We pass the puppeteer config via -p. We must ensure the file exists or construct one.
-    # But wait, pandoc filter arguments are passed differently. 
-    # mermaid-filter supports a .puppeteer.json file in the current working directory.
-    # We will write a temporary .puppeteer.json to the current directory (which is mounted)
-    
-    puppeteer_config = {
-        "executablePath": "/usr/bin/google-chrome",
-        "args": ["--no-sandbox", "--disable-setuid-sandbox"]
-    }
-    
-    # Write puppeteer config to cwd so mermaid-filter picks it up
-    puppeteer_config_path = os.path.join(current_dir, ".puppeteer.json")
-    with open(puppeteer_config_path, 'w') as f:
-        import json
-        json.dump(puppeteer_config, f)
-        
-    # Check for reference doc
-    reference_doc = "reference.docx"
-    reference_arg = ""
-    if os.path.exists(os.path.join(current_dir, reference_doc)):
-        print(f"Using style reference: {reference_doc}")
-        reference_arg = f'--reference-doc="{reference_doc}"'
-        
-    docker_cmd = (
-        f'docker run --rm '
-        f'-v "{current_dir}:/data" '
-        f'-w /data '
-        f'{DOCKER_IMAGE_NAME} '
-        f'pandoc '
-        f'"{temp_filename}" -o "{output_filename}" '
-        f'-F mermaid-filter {reference_arg}'
-    )
+    # Paths relative to the working directory, which is what the container sees as /data
+    temp_rel = os.path.relpath(os.path.abspath(temp_file), current_dir).replace(os.sep, "/")
+    output_rel = os.path.relpath(os.path.abspath(output_file), current_dir).replace(os.sep, "/")
+
+    # 2. Run pandoc
+    filter_args = " ".join(PANDOC_FILTER_ARGS)
+    command = f'{pandoc_cmd} "{temp_rel}" -o "{output_rel}" {filter_args} {reference_arg}'
     
     try:
-        success = run_command(docker_cmd)
+        success = run_command(command, cwd=current_dir)
     finally:
-        # Cleanup config
-        if os.path.exists(puppeteer_config_path):
-            os.remove(puppeteer_config_path)
-    
-    # 3. Cleanup
-    if os.path.exists(temp_file):
-        os.remove(temp_file)
+        # 3. Cleanup
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
         
     if success:
         print(f"✅ Successfully converted: {output_file}")
     else:
         print(f"❌ Failed to convert: {input_file}")
+    return success
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Convert Markdown to DOCX with Mermaid support.")
     parser.add_argument('files', nargs='*', help="Markdown files to convert.")
     parser.add_argument('--generate-reference', action='store_true', help="Generate a default reference.docx for styling.")
+    parser.add_argument('--jobs', '-j', type=int, default=1, help="Number of files to convert concurrently.")
+    parser.add_argument('--local', action='store_true', help="Run pandoc and mermaid-filter installed on this machine instead of Docker.")
+    parser.add_argument('--changed-only', action='store_true', help=f"Skip files whose inputs match the last successful build recorded in {MANIFEST_NAME}.")
     args = parser.parse_args()
 
+    current_dir = os.getcwd()
+
     # 1. Check/Build Docker Image
-    is_image_present = check_docker_image_exists(DOCKER_IMAGE_NAME)
-    if not is_image_present:
-        build_docker_image()
-    else:
-        # Re-build if Dockerfile changed? For now, assume manual rebuild if needed or enforce build
-        # To be safe for multi-tool env, maybe just verify existence
-        print(f"Docker image '{DOCKER_IMAGE_NAME}' found.")
+    if not args.local:
+        is_image_present = check_docker_image_exists(DOCKER_IMAGE_NAME)
+        if not is_image_present:
+            build_docker_image()
+        else:
+            # Re-build if Dockerfile changed? For now, assume manual rebuild if needed or enforce build
+            # To be safe for multi-tool env, maybe just verify existence
+            print(f"Docker image '{DOCKER_IMAGE_NAME}' found.")
 
     # Feature: Generate default reference doc if requested
     if args.generate_reference:
         print("Generating 'reference.docx' template from Pandoc default...")
-        current_dir = os.getcwd()
-        docker_cmd = (
-            f'docker run --rm '
-            f'-v "{current_dir}:/data" '
-            f'-w /data '
-            f'{DOCKER_IMAGE_NAME} '
-            f'pandoc '
-            f'-o "reference.docx" --print-default-data-file reference.docx'
-        )
-        run_command(docker_cmd)
+        if args.local:
+            docker_cmd = 'pandoc -o "reference.docx" --print-default-data-file reference.docx'
+        else:
+            docker_cmd = (
+                f'docker run --rm '
+                f'-v "{current_dir}:/data" '
+                f'-w /data '
+                f'{DOCKER_IMAGE_NAME} '
+                f'pandoc '
+                f'-o "reference.docx" --print-default-data-file reference.docx'
+            )
+        run_command(docker_cmd, cwd=current_dir)
         print("Created 'reference.docx'. Open this file in Word, modify the Styles (Normal, Heading 1, etc.), save it, and run the conversion again.")
         sys.exit(0)
 
@@ -196,10 +258,69 @@ if __name__ == "__main__":
         "CoVPay_Strategic_Analysis.md",
         "CoVPay_technical_spec.md"
     ]
-
-    # 3. Process files
+    pending = []
     for file in files_to_convert:
         if os.path.exists(file):
-            convert_file(file)
+            pending.append(file)
         else:
             print(f"Skipping missing file: {file}")
+
+    # Check for reference doc
+    reference_doc = os.path.join(current_dir, "reference.docx")
+    reference_arg = ""
+    if os.path.exists(reference_doc):
+        print("Using style reference: reference.docx")
+        reference_arg = '--reference-doc="reference.docx"'
+    else:
+        reference_doc = None
+
+    # 3. Skip files whose inputs match the last successful build
+    manifest_path = os.path.join(current_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    fingerprint = filter_fingerprint()
+    hashes = {file: build_hashes(file, reference_doc, fingerprint) for file in pending}
+    if args.changed_only:
+        unchanged = [file for file in pending if is_unchanged(manifest, file, hashes[file])]
+        for file in unchanged:
+            print(f"Unchanged, skipping: {file}")
+        pending = [file for file in pending if file not in unchanged]
+
+    if not pending:
+        print("Nothing to convert.")
+        sys.exit(0)
+
+    # 4. Process files
+    puppeteer_config_path = write_puppeteer_config(current_dir)
+    container_name = None
+    failures = []
+    try:
+        if args.local:
+            pandoc_cmd = "pandoc"
+        else:
+            container_name = start_docs_container(current_dir)
+            if container_name is None:
+                print("Failed to start the Docker container.")
+                sys.exit(1)
+            pandoc_cmd = f"docker exec -w /data {container_name} pandoc"
+
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+            futures = {
+                file: executor.submit(convert_file, file, pandoc_cmd, current_dir, reference_arg)
+                for file in pending
+            }
+            for file, future in futures.items():
+                if future.result():
+                    manifest[manifest_key(file)] = hashes[file]
+                else:
+                    failures.append(file)
+    finally:
+        # Cleanup config
+        if os.path.exists(puppeteer_config_path):
+            os.remove(puppeteer_config_path)
+        if container_name is not None:
+            stop_docs_container(container_name)
+        save_manifest(manifest_path, manifest)
+
+    print(f"\nConverted {len(pending) - len(failures)} of {len(pending)} file(s).")
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,38 @@
+import threading
+
+from result_cache import ResultCache, hash_parts
+
+
+class DiagramCache(ResultCache):
+    """
+    Rendered (and already trimmed) Mermaid PNGs, keyed by the diagram source plus
+    every setting that affects how it is drawn. Shared by all documents, so an
+    unchanged diagram never goes back through Chrome. In SVG mode the entries are
+    the PNG fallbacks with their SVG attached.
+    """
+
+    def __init__(self, root, max_bytes, render_settings):
+        super().__init__(root, max_bytes, suffix=".png")
+        # Serialized renderer settings (mermaid config, viewport, scale...) folded into every key
+        self.render_settings = render_settings
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def key_for(self, source):
+        return hash_parts(self.render_settings, source.strip())
+
+    def fetch(self, key, target_path):
+        path = super().fetch(key, target_path)
+        with self._counter_lock:
+            if path is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return path
+
+    def stats(self):
+        stats = super().stats()
+        with self._counter_lock:
+            stats.update({"hits": self.hits, "misses": self.misses})
+        return stats
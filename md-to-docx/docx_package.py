@@ -0,0 +1,122 @@
+"""
+Saving a python-docx Document back over the pandoc output it was loaded from, or
+into a buffer that is streamed to the client.
+
+python-docx's own save() inflates nothing but deflates everything again, including
+media that post-processing never touched and that already makes up most of a
+diagram-heavy package. Here every part whose bytes are unchanged is copied from
+the source zip as its raw compressed bytes. Only changed or new parts are
+compressed, and already-compressed images are stored rather than deflated.
+"""
+import copy
+import os
+import struct
+import tempfile
+import zipfile
+import zlib
+from pathlib import Path
+
+from docx.opc.pkgwriter import PackageWriter
+
+# Formats that are compressed already; deflating them again costs CPU and saves nothing
+STORED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+# Local file header: signature, versions, flags, method, time, date, crc, sizes, name/extra lengths
+_LOCAL_HEADER = struct.Struct('<4s5HL2L2H')
+# General purpose flag: CRC and sizes follow the data instead of sitting in the header
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+
+class RawCopyZipWriter:
+    """
+    Stand-in for python-docx's PhysPkgWriter that copies entries unchanged since
+    the source package without recompressing them.
+    """
+
+    def __init__(self, target, source_path: Path):
+        self._source_fp = open(source_path, 'rb')
+        with zipfile.ZipFile(self._source_fp) as source:
+            self._source_entries = {info.filename: info for info in source.infolist()}
+        self._zip = zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.copied = 0
+        self.compressed = 0
+
+    def write(self, pack_uri, blob):
+        name = pack_uri.membername
+        info = self._source_entries.get(name)
+        if info is not None and info.file_size == len(blob) and info.CRC == zlib.crc32(blob):
+            self._copy_raw(info)
+            self.copied += 1
+            return
+        extension = name.rsplit('.', 1)[-1].lower()
+        compression = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+        self._zip.writestr(name, blob, compress_type=compression)
+        self.compressed += 1
+
+    def _copy_raw(self, info):
+        self._source_fp.seek(info.header_offset)
+        header = _LOCAL_HEADER.unpack(self._source_fp.read(_LOCAL_HEADER.size))
+        name_length, extra_length = header[-2], header[-1]
+        self._source_fp.seek(name_length + extra_length, os.SEEK_CUR)
+        data = self._source_fp.read(info.compress_size)
+
+        # zipfile has no public raw-copy API: write the header and data the way its own
+        # writer does, then register the entry so close() puts it in the central directory
+        target = self._zip
+        copied = copy.copy(info)
+        copied.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+        target.fp.seek(target.start_dir)
+        copied.header_offset = target.fp.tell()
+        target.fp.write(copied.FileHeader())
+        target.fp.write(data)
+        target.start_dir = target.fp.tell()
+        target.filelist.append(copied)
+        target.NameToInfo[copied.filename] = copied
+        target._didModify = True
+
+    def close(self):
+        try:
+            self._zip.close()
+        finally:
+            self._source_fp.close()
+
+
+def write_docx(doc, source_path: Path, target):
+    """
+    Writes doc as a DOCX package into target, a writable and seekable binary file
+    (e.g. a spooled buffer), reusing the raw compressed bytes of every part unchanged
+    since source_path, the package it was loaded from. Returns (copied, compressed)
+    entry counts.
+    """
+    package = doc.part.package
+    parts = list(package.parts)
+    for part in parts:
+        part.before_marshal()
+
+    writer = RawCopyZipWriter(target, source_path)
+    try:
+        # Same order and content as OpcPackage.save(), just a different zip writer
+        PackageWriter._write_content_types_stream(writer, parts)
+        PackageWriter._write_pkg_rels(writer, package.rels)
+        PackageWriter._write_parts(writer, parts)
+    finally:
+        writer.close()
+    return writer.copied, writer.compressed
+
+
+def save_docx(doc, docx_path: Path):
+    """
+    Writes doc over docx_path, the package it was loaded from, reusing the raw
+    compressed bytes of every unchanged part. Returns (copied, compressed) entry counts.
+    """
+    docx_path = Path(docx_path)
+    # Written next to the source and swapped in, since the source is read while writing
+    fd, temp_name = tempfile.mkstemp(prefix=f".{docx_path.stem}_", suffix=".docx", dir=docx_path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            counts = write_docx(doc, docx_path, target)
+        os.replace(temp_name, docx_path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+    return counts
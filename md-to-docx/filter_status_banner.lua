@@ -0,0 +1,56 @@
+-- Turns [[STATUS_BANNER:status-<KEY>:<TEXT>]] paragraphs, as markdown_preprocessor writes
+-- them, into paragraphs with the matching "Status Banner ..." style. The styles are
+-- compiled into every reference document (status_banners.add_banner_styles), so
+-- pandoc writes finished banners and the post-processor has nothing left to do.
+-- Markers with any other type, in table cells or not spanning a whole paragraph
+-- are left as text for the post-processor's fallback.
+
+-- Keep in sync with status_banners.BANNER_STYLES / banner_style_name()
+local STYLE_NAMES = {
+  ['high-risk'] = 'Status Banner High Risk',
+  ['medium-risk'] = 'Status Banner Medium Risk',
+  ['low-risk'] = 'Status Banner Low Risk',
+  ['info'] = 'Status Banner Info',
+  ['warning'] = 'Status Banner Warning',
+  ['default'] = 'Status Banner Default',
+}
+
+local function banner(inlines)
+  local count = #inlines
+  if count == 0 or inlines[1].t ~= 'Str' or inlines[count].t ~= 'Str' then
+    return nil
+  end
+
+  local last = inlines[count].text
+  if last:sub(-2) ~= ']]' then
+    return nil
+  end
+  -- The first and last Str are the same one for a single-word banner
+  local first = count == 1 and last:sub(1, -3) or inlines[1].text
+  local key, rest = first:match('^%[%[STATUS_BANNER:status%-([%a-]+):(.*)$')
+  local style_name = key and STYLE_NAMES[key]
+  if not style_name then
+    return nil
+  end
+
+  local content = pandoc.List(inlines)
+  if count > 1 then
+    content[count] = pandoc.Str(last:sub(1, -3))
+  end
+  content[1] = pandoc.Str(rest)
+  -- Drop what stripping the marker emptied
+  content = content:filter(function(inline)
+    return inline.t ~= 'Str' or inline.text ~= ''
+  end)
+  while #content > 0 and content[1].t == 'Space' do
+    content:remove(1)
+  end
+  return pandoc.Div({pandoc.Para(content)}, {['custom-style'] = style_name})
+end
+
+-- The preprocessor's markers are always paragraphs of their own. A filter on Plain
+-- would only catch hand-written markers in table cells, at the price of marshaling
+-- every cell; the post-processor styles those instead.
+function Para(el)
+  return banner(el.content)
+end
@@ -1,16 +1,43 @@
+-- Character style for header cell text, compiled into every reference document
+-- (table_styling.add_header_run_style). Keep in sync with table_styling.HEADER_RUN_STYLE.
+local HEADER_RUN_STYLE = 'Table Header'
+
+-- Header cell text: bold as direct formatting (a bold character style would toggle
+-- against a table style that bolds the first row) and the header font from the style
+local function emphasize_header(inlines)
+  return {pandoc.Span({pandoc.Strong(inlines)}, {['custom-style'] = HEADER_RUN_STYLE})}
+end
+
+local function emphasize_header_cell(cell)
+  for index, block in ipairs(cell.contents) do
+    if (block.t == 'Plain' or block.t == 'Para') and #block.content > 0 then
+      block.content = emphasize_header(block.content)
+      cell.contents[index] = block
+    end
+  end
+end
+
 function Table(el)
   -- Use "MyCustomTable" style
   -- Classes mapping to style names usually works best if style name has no spaces.
-  
+
   -- Clear all classes and set MyCustomTable
   el.classes = pandoc.List({'MyCustomTable'})
-  
+
   -- Also set custom-style attribute just in case
-  el.attributes = {} 
+  el.attributes = {}
   el.attributes['custom-style'] = 'MyCustomTable'
-  
+
   -- Try setting the Attr object explicitely to avoid any existing attr issues
   -- el.attr = pandoc.Attr("", {"MyCustomTable"}, {["custom-style"] = "MyCustomTable"})
-  
+
+  -- Only the first row, which is what the post-processor shades as the header
+  local header = el.head.rows[1]
+  if header then
+    for _, cell in ipairs(header.cells) do
+      emphasize_header_cell(cell)
+    end
+  end
+
   return el
 end
@@ -0,0 +1,364 @@
+"""
+Image helpers for the post-processing pipeline.
+
+Embedded images are trimmed and fitted to a resolution policy (IMAGE_DPI of the
+space they're displayed in, IMAGE_MAX_BYTES per image) in one decode/encode.
+
+Whitespace trimming scans inwards from each edge, one band of rows or columns
+at a time, with NumPy min-reductions. It stops at the first content, so only the
+margins (plus one band per side) are ever inspected, and no full-size copy or
+white comparison image is allocated.
+
+Vector diagrams travel as a small PNG fallback with their SVG attached in a
+private chunk (see attach_svg), so caches, pandoc and the package all handle one
+file; svg_size reads their dimensions from the root element alone. Bitmap
+dimensions come from image_size, which reads only the PNG or JPEG header.
+"""
+import atexit
+import multiprocessing
+import os
+import re
+import struct
+import threading
+import zlib
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+# White border kept around the content, in pixels
+TRIM_PADDING = 4
+# Crops saving less than this fraction of the pixels aren't worth a re-encode
+TRIM_MIN_SAVINGS = float(os.environ.get("MD_TO_DOCX_TRIM_MIN_SAVINGS", "0.04"))
+# Rows/columns inspected per step while scanning in from an edge
+SCAN_BAND = 64
+# Embedded images get at most this many pixels per inch of the space they're shown in (0: no limit)
+IMAGE_DPI = int(os.environ.get("MD_TO_DOCX_IMAGE_DPI", "300"))
+# Byte budget per embedded image; heavier ones are downsampled further (0: no budget)
+IMAGE_MAX_BYTES = int(os.environ.get("MD_TO_DOCX_IMAGE_MAX_BYTES", str(2 * 1024 * 1024)))
+# Re-encode with the encoder's optimize pass: smaller files, slower saves
+IMAGE_OPTIMIZE = os.environ.get("MD_TO_DOCX_IMAGE_OPTIMIZE", "0") == "1"
+# Processes trimming a document's images in parallel; 1 trims them in-process
+MEDIA_WORKERS = int(os.environ.get("MD_TO_DOCX_MEDIA_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Private, ancillary, safe-to-copy PNG chunk holding a diagram's zlib-compressed SVG
+SVG_CHUNK_TYPE = b'mmSv'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+_media_pool = None
+_media_pool_lock = threading.Lock()
+
+
+def _first_content(image, box, axis, reverse):
+    """
+    Offset, within box, of the first row (axis=0) or column (axis=1) of image
+    holding a non-white pixel, scanning from the start of box, or from its end
+    when reverse is set. None if that part of the image is all white.
+    Only one band at a time is copied out of the image.
+    """
+    left, top, right, bottom = box
+    length = (bottom - top) if axis == 0 else (right - left)
+    if reverse:
+        bands = ((max(0, stop - SCAN_BAND), stop) for stop in range(length, 0, -SCAN_BAND))
+    else:
+        bands = ((start, min(length, start + SCAN_BAND)) for start in range(0, length, SCAN_BAND))
+    for start, stop in bands:
+        if axis == 0:
+            band = image.crop((left, top + start, right, top + stop))
+        else:
+            band = image.crop((left + start, top, left + stop, bottom))
+        if band.mode in _ALPHA_MODES:
+            # Alpha is ignored, as it was when comparing the RGB conversion
+            band = band.convert(_ALPHA_MODES[band.mode])
+        # Contiguous 2-D reductions: one minimum per row, or per column and channel
+        pixels = np.asarray(band)
+        pixels = pixels.reshape(pixels.shape[0], -1)
+        if axis == 0:
+            minimums = pixels.min(axis=1)
+        else:
+            minimums = pixels.min(axis=0).reshape(stop - start, -1).min(axis=1)
+        non_white = np.flatnonzero(minimums < 255)
+        if non_white.size:
+            return start + (non_white[-1] if reverse else non_white[0])
+    return None
+
+
+# Modes whose 8-bit channels can be checked for white directly
+_DIRECT_MODES = ('RGB', 'L', 'RGBA', 'LA')
+# Alpha is dropped band by band rather than converting the whole image
+_ALPHA_MODES = {'RGBA': 'RGB', 'LA': 'L'}
+
+
+def content_bounds(image):
+    """
+    Bounding box (left, top, right, bottom) of everything that isn't pure white,
+    matching ImageChops.difference(image.convert('RGB'), white).getbbox().
+    Returns None for an all-white image.
+    """
+    if image.mode not in _DIRECT_MODES:
+        # Palette and other modes: look at the same RGB view the comparison had
+        image = image.convert('RGB')
+    width, height = image.size
+
+    full = (0, 0, width, height)
+    top = _first_content(image, full, 0, False)
+    if top is None:
+        return None
+    bottom = _first_content(image, full, 0, True) + 1
+    # Columns only need checking between the content rows
+    rows = (0, top, width, bottom)
+    left = _first_content(image, rows, 1, False)
+    right = _first_content(image, rows, 1, True) + 1
+    return left, top, right, bottom
+
+
+def _trim_box(img, padding, min_savings):
+    """Crop box around the content plus padding, or None when trimming isn't worth it."""
+    original_width, original_height = img.size
+    bbox = content_bounds(img)
+    if bbox is None:
+        return None
+
+    left, top, right, bottom = bbox
+    left = max(0, left - padding)
+    top = max(0, top - padding)
+    right = min(original_width, right + padding)
+    bottom = min(original_height, bottom + padding)
+
+    kept = ((right - left) * (bottom - top)) / (original_width * original_height)
+    if 1 - kept < min_savings:
+        return None
+    return left, top, right, bottom
+
+
+def _encode(image, image_format, optimize):
+    output = BytesIO()
+    if optimize:
+        image.save(output, format=image_format, optimize=True)
+    else:
+        image.save(output, format=image_format)
+    return output.getvalue()
+
+
+def trim_image_blob(blob: bytes, padding=TRIM_PADDING, min_savings=TRIM_MIN_SAVINGS):
+    """
+    Crops the white border around a PNG/JPEG image.
+    Returns the re-encoded bytes, or None when the image should be left untouched:
+    nothing but white, or a crop too small to be worth re-encoding.
+    """
+    with Image.open(BytesIO(blob)) as img:
+        box = _trim_box(img, padding, min_savings)
+        if box is None:
+            return None
+        return _encode(img.crop(box), img.format, optimize=False)
+
+
+def fit_image_blob(blob: bytes, max_size=None, max_bytes=IMAGE_MAX_BYTES, optimize=IMAGE_OPTIMIZE):
+    """
+    Trims the white border, then downsamples (LANCZOS) until the image fits within
+    max_size, a (width, height) pixel box where None means unbounded, and its
+    encoding is at most max_bytes (0 for no budget).
+    Returns the re-encoded bytes, or None when the image is fine as it is.
+    """
+    with Image.open(BytesIO(blob)) as img:
+        image_format = img.format
+        box = _trim_box(img, TRIM_PADDING, TRIM_MIN_SAVINGS)
+        base = img.crop(box) if box is not None else img
+        width, height = base.size
+
+        scale = 1.0
+        max_width, max_height = max_size or (None, None)
+        if max_width:
+            scale = min(scale, max_width / width)
+        if max_height:
+            scale = min(scale, max_height / height)
+        over_budget = max_bytes and len(blob) > max_bytes
+        if box is None and scale >= 1.0 and not over_budget:
+            return None
+        if max_bytes:
+            # Encoded size roughly follows pixel count: aim for the budget on the first encode
+            original_width, original_height = img.size
+            estimate = len(blob) * (width * height * scale * scale) / (original_width * original_height)
+            if estimate > max_bytes:
+                scale *= (max_bytes / estimate) ** 0.5 * 0.95
+
+        if base.mode in ('P', '1'):
+            # Palette images would otherwise be resized with NEAREST
+            base = base.convert('RGBA' if 'transparency' in base.info else 'RGB')
+
+        def render(factor):
+            if factor >= 1.0:
+                return base
+            size = (max(1, round(width * factor)), max(1, round(height * factor)))
+            return base.resize(size, Image.Resampling.LANCZOS)
+
+        data = _encode(render(scale), image_format, optimize)
+        # Still too heavy: shrink by the square root of the overshoot (bytes follow area)
+        for _attempt in range(4):
+            if not max_bytes or len(data) <= max_bytes:
+                break
+            scale *= max(0.5, (max_bytes / len(data)) ** 0.5 * 0.95)
+            data = _encode(render(scale), image_format, optimize)
+        if len(data) >= len(blob) and box is None:
+            return None
+        return data
+
+
+def _fit_safely(blob, max_size, max_bytes, optimize):
+    # Runs in the media pool: one bad image must not fail the others
+    try:
+        return fit_image_blob(blob, max_size, max_bytes, optimize), None
+    except Exception as error:
+        return None, str(error)
+
+
+def _get_media_pool():
+    global _media_pool
+    with _media_pool_lock:
+        if _media_pool is None:
+            # Never forked from here: the pool starts on a request thread of a threaded
+            # server, and a fork would copy locks other threads hold and inherit open
+            # pipes (the Mermaid helper only exits on EOF of its stdin). The fork server
+            # is a clean single-threaded process that preloads this module and forks the workers.
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context("spawn")
+            _media_pool = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, mp_context=context)
+        return _media_pool
+
+
+def shutdown_media_pool():
+    global _media_pool
+    with _media_pool_lock:
+        pool, _media_pool = _media_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_media_pool)
+
+
+def fit_image_blobs(blobs, max_sizes, max_bytes=IMAGE_MAX_BYTES, optimize=IMAGE_OPTIMIZE):
+    """
+    fit_image_blob() for many images, each with its own pixel box, spread across the
+    media process pool when there is more than one. Returns a (new bytes or None,
+    error message or None) pair per blob.
+    """
+    count = len(blobs)
+    arguments = (blobs, max_sizes, [max_bytes] * count, [optimize] * count)
+    # Inside a conversion pool worker process the documents are already parallel
+    in_worker_process = multiprocessing.parent_process() is not None
+    if count < 2 or MEDIA_WORKERS < 2 or in_worker_process:
+        return list(map(_fit_safely, *arguments))
+    try:
+        return list(_get_media_pool().map(_fit_safely, *arguments))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start afresh next time and finish here
+        shutdown_media_pool()
+        return list(map(_fit_safely, *arguments))
+
+
+def pixels_for(emu, dpi=IMAGE_DPI):
+    """Pixels needed to show emu (914400 per inch) at dpi; None when unlimited or unknown."""
+    if not dpi or not emu:
+        return None
+    return max(1, round(emu / 914400 * dpi))
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def attach_svg(png: bytes, svg: bytes):
+    """Returns png with svg stored in an SVG_CHUNK_TYPE chunk just before IEND."""
+    if not png.startswith(PNG_SIGNATURE) or png[-8:-4] != b'IEND':
+        raise ValueError("Not a complete PNG")
+    return png[:-12] + _png_chunk(SVG_CHUNK_TYPE, zlib.compress(svg)) + png[-12:]
+
+
+def detach_svg(png: bytes):
+    """
+    Splits a PNG written by attach_svg into (plain PNG, SVG bytes). Anything else
+    comes back unchanged with None. Only chunk headers are read, nothing is decoded.
+    """
+    if not png.startswith(PNG_SIGNATURE) or SVG_CHUNK_TYPE not in png:
+        return png, None
+    position = len(PNG_SIGNATURE)
+    while position + 8 <= len(png):
+        length, chunk_type = struct.unpack_from('>I4s', png, position)
+        end = position + 12 + length
+        if chunk_type == SVG_CHUNK_TYPE:
+            svg = zlib.decompress(png[position + 8:end - 4])
+            return png[:position] + png[end:], svg
+        if chunk_type == b'IEND':
+            break
+        position = end
+    return png, None
+
+
+_SVG_LENGTH = re.compile(r'^\s*([0-9.]+)\s*(px)?\s*$')
+
+
+def svg_size(svg: bytes):
+    """
+    (width, height) of an SVG in CSS pixels, from the root element's width and
+    height or else its viewBox. Only the root start tag is parsed. None if unknown.
+    """
+    try:
+        _event, root = next(ElementTree.iterparse(BytesIO(svg), events=('start',)))
+    except (ElementTree.ParseError, StopIteration):
+        return None
+    width = _SVG_LENGTH.match(root.get('width', ''))
+    height = _SVG_LENGTH.match(root.get('height', ''))
+    if width and height:
+        size = (float(width.group(1)), float(height.group(1)))
+    else:
+        view_box = root.get('viewBox', '').replace(',', ' ').split()
+        if len(view_box) != 4:
+            return None
+        size = (float(view_box[2]), float(view_box[3]))
+    return size if size[0] > 0 and size[1] > 0 else None
+
+
+# JPEG start-of-frame markers (baseline, progressive, lossless...); C4, C8 and CC are other segments
+_JPEG_FRAME_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers that stand alone, without a length: TEM, RST0-7, SOI, EOI
+_JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xDA)}
+
+
+def image_size(blob: bytes):
+    """
+    (width, height) in pixels of a PNG or JPEG, read from its header (IHDR or the
+    start-of-frame segment) without decoding. None for other formats or damaged headers.
+    """
+    if blob.startswith(PNG_SIGNATURE):
+        if len(blob) < 24 or blob[12:16] != b'IHDR':
+            return None
+        return struct.unpack_from('>II', blob, 16)
+    if not blob.startswith(b'\xff\xd8'):
+        return None
+    position = 2
+    while position + 4 <= len(blob):
+        if blob[position] != 0xFF:
+            return None
+        marker = blob[position + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            position += 1
+            continue
+        if marker in _JPEG_STANDALONE_MARKERS:
+            position += 2
+            continue
+        (length,) = struct.unpack_from('>H', blob, position + 2)
+        if marker in _JPEG_FRAME_MARKERS:
+            if position + 9 > len(blob):
+                return None
+            height, width = struct.unpack_from('>HH', blob, position + 5)
+            return width, height
+        position += 2 + length
+    return None
@@ -0,0 +1,192 @@
+"""
+Single-pass rewriting of the HTML bits pandoc can't turn into DOCX.
+
+Every registered rewrite contributes one alternative to a combined scanner
+pattern, so the document is walked once no matter how many rewrites exist.
+A rewrite is either a single tag (replaced on its own) or a block: an opening
+tag plus everything up to a closing string, handed to the handler as inner text.
+"""
+import os
+import re
+
+from banner_markers import banner_marker
+
+# name -> Rewrite, in registration order
+REWRITES = {}
+
+# tuple of rewrite names -> (combined pattern, rewrites)
+_scanner_cache = {}
+
+
+class Rewrite:
+    def __init__(self, name, opening, handler, closing=None, flags=0):
+        self.name = name
+        self.opening = opening
+        self.flags = flags
+        self.pattern = re.compile(opening, flags)
+        self.handler = handler
+        # None for single-tag rewrites
+        self.closing = closing
+
+
+def register_rewrite(name, opening, closing=None, flags=0):
+    """
+    Decorator adding a rewrite to the registry.
+    Tag rewrites are called as handler(match); block rewrites as
+    handler(match, inner), where inner already had the tag rewrites applied.
+    """
+    def decorator(handler):
+        REWRITES[name] = Rewrite(name, opening, handler, closing=closing, flags=flags)
+        _scanner_cache.clear()
+        return handler
+    return decorator
+
+
+# Strip <details> and <summary> tags (keep content) for DOCX compatibility
+# These HTML tags are often ignored or dropped by Pandoc when converting to DOCX
+@register_rewrite('details', r'</?details\b[^>]*>', flags=re.IGNORECASE)
+def _strip_details(match):
+    return ''
+
+
+@register_rewrite('summary', r'</?summary\b[^>]*>', flags=re.IGNORECASE)
+def _strip_summary(match):
+    return ''
+
+
+# Transform <div class="mermaid">...</div> into ```mermaid...```
+@register_rewrite('mermaid', r'<div class="mermaid">', closing='</div>')
+def _mermaid_block(match, inner):
+    return f"\n```mermaid\n{inner.strip()}\n```\n"
+
+
+# Transform <div class="status-banner status-TYPE">...</div> into a banner marker
+@register_rewrite('status-banner', r'<div class="status-banner (.*?)">', closing='</div>', flags=re.DOTALL)
+def _status_banner_block(match, inner):
+    return banner_marker(match.group(1), inner)
+
+
+def _literal_prefix(openings):
+    """
+    Leading characters shared by every opening pattern that match only themselves
+    (punctuation, not regex syntax or letters that a flag could case-fold).
+    """
+    prefix = os.path.commonprefix(openings)
+    for length, char in enumerate(prefix):
+        if char.isalnum() or char in '\\.^$*+?{}[]|()':
+            prefix = prefix[:length]
+            break
+    # A character followed by a quantifier belongs to that quantifier, not the prefix
+    while prefix and any(opening[len(prefix):][:1] in ('*', '+', '?', '{') for opening in openings):
+        prefix = prefix[:-1]
+    return prefix
+
+
+def _scanner_for(names):
+    """Compiles (once per set of rewrites) the combined pattern finding any opening."""
+    scanner = _scanner_cache.get(names)
+    if scanner is None:
+        rewrites = [REWRITES[name] for name in names]
+        # Hoisting the shared '<' out of the alternation lets the regex engine jump
+        # between candidate positions instead of trying every branch at every offset
+        prefix = _literal_prefix([rewrite.opening for rewrite in rewrites])
+        alternatives = []
+        for index, rewrite in enumerate(rewrites):
+            flags = ''
+            if rewrite.flags & re.IGNORECASE:
+                flags += 'i'
+            if rewrite.flags & re.DOTALL:
+                flags += 's'
+            body = rewrite.opening[len(prefix):]
+            body = f"(?{flags}:{body})" if flags else f"(?:{body})"
+            alternatives.append(f"(?P<r{index}>{body})")
+        pattern = re.compile(f"{re.escape(prefix)}(?:{'|'.join(alternatives)})")
+        scanner = (pattern, rewrites)
+        _scanner_cache[names] = scanner
+    return scanner
+
+
+class MarkdownPreprocessor:
+    """
+    Incremental single-pass preprocessor. feed() returns the output that is final
+    so far; text that might still be part of an unfinished tag or block is held
+    back until more input (or close()) arrives.
+    """
+
+    def __init__(self, rewrites=None):
+        names = tuple(rewrites) if rewrites is not None else tuple(REWRITES)
+        self._scanner, self._rewrites = _scanner_for(names)
+        tag_names = tuple(rewrite.name for rewrite in self._rewrites if rewrite.closing is None)
+        self._tag_scanner, self._tag_rewrites = _scanner_for(tag_names) if tag_names else (None, [])
+        self._pending = ""
+
+    def _rewrite_tags(self, text):
+        # Single-tag rewrites only, used on the inner text of blocks
+        if self._tag_scanner is None or '<' not in text:
+            return text
+        rewrites = self._tag_rewrites
+
+        def replacement(match):
+            rewrite = rewrites[int(match.lastgroup[1:])]
+            return rewrite.handler(rewrite.pattern.match(match.group(0)))
+
+        return self._tag_scanner.sub(replacement, text)
+
+    def _process(self, text, final):
+        """Returns (output, consumed): rewritten text and how much of text it covers."""
+        output = []
+        position = 0
+        length = len(text)
+        while position < length:
+            match = self._scanner.search(text, position)
+            if match is None:
+                break
+            rewrite = self._rewrites[int(match.lastgroup[1:])]
+            opening = rewrite.pattern.match(text, match.start())
+            if rewrite.closing is None:
+                output.append(text[position:match.start()])
+                output.append(rewrite.handler(opening))
+                position = match.end()
+                continue
+
+            close_at = text.find(rewrite.closing, match.end())
+            if close_at == -1:
+                if not final:
+                    # The block may still be closed by input that hasn't arrived yet
+                    output.append(text[position:match.start()])
+                    return ''.join(output), match.start()
+                # Never closed: keep the opening tag as plain text and move on
+                output.append(text[position:match.end()])
+                position = match.end()
+                continue
+
+            inner = self._rewrite_tags(text[match.end():close_at])
+            output.append(text[position:match.start()])
+            output.append(rewrite.handler(opening, inner))
+            position = close_at + len(rewrite.closing)
+
+        if not final:
+            # A '<' with no '>' after it could be the start of a tag cut in half
+            partial = text.rfind('<', position)
+            if partial != -1 and text.find('>', partial) == -1:
+                output.append(text[position:partial])
+                return ''.join(output), partial
+        output.append(text[position:])
+        return ''.join(output), length
+
+    def feed(self, text):
+        self._pending += text
+        output, consumed = self._process(self._pending, final=False)
+        self._pending = self._pending[consumed:]
+        return output
+
+    def close(self):
+        output, _consumed = self._process(self._pending, final=True)
+        self._pending = ""
+        return output
+
+
+def preprocess_markdown_text(content, rewrites=None):
+    """Applies the registered rewrites (or the named subset) to a whole document."""
+    preprocessor = MarkdownPreprocessor(rewrites)
+    return preprocessor.feed(content) + preprocessor.close()
@@ -0,0 +1,172 @@
+// Long-lived Mermaid renderer driven by mermaid_renderer.BrowserPoolRenderer.
+// Launches Chrome once, keeps a pool of pages with mermaid already loaded, and
+// answers one JSON request per stdin line with one JSON line on stdout:
+//   -> {"id": 1, "source": "graph LR; A-->B", "width": 800, "scale": 4, "background": "white"}
+//   <- {"id": 1, "png": "<base64>"}   or   {"id": 1, "error": "..."}
+// With "svg": true in the request the reply also carries the standalone SVG markup
+// ("svg": "<svg ...>"), sized to the same box as the PNG.
+// Options (launch, mermaidConfig, poolSize, recycleAfter) arrive as JSON in argv[2].
+const readline = require('readline');
+const puppeteer = require('puppeteer');
+
+const options = JSON.parse(process.argv[2] || '{}');
+const poolSize = Math.max(1, options.poolSize || 2);
+const recycleAfter = Math.max(1, options.recycleAfter || 50);
+const mermaidScript = require.resolve('mermaid/dist/mermaid.min.js');
+
+let browser;
+let created = 0;
+const idle = [];
+const waiters = [];
+
+function send(message) {
+  process.stdout.write(JSON.stringify(message) + '\n');
+}
+
+async function newPage() {
+  const page = await browser.newPage();
+  await page.setContent('<!DOCTYPE html><html><body style="margin:0"><div id="container"></div></body></html>');
+  await page.addScriptTag({ path: mermaidScript });
+  await page.evaluate((config) => {
+    mermaid.initialize(Object.assign({}, config, { startOnLoad: false }));
+  }, options.mermaidConfig || {});
+  return { page, renders: 0 };
+}
+
+async function acquire() {
+  if (idle.length) {
+    return idle.pop();
+  }
+  if (created < poolSize) {
+    created++;
+    try {
+      return await newPage();
+    } catch (error) {
+      created--;
+      retryWaiter();
+      throw error;
+    }
+  }
+  return new Promise((resolve, reject) => waiters.push({ resolve, reject }));
+}
+
+// A page could not be created, so its slot is free again: the next waiter tries to
+// open one itself instead of waiting for a release that will never come
+function retryWaiter() {
+  const waiter = waiters.shift();
+  if (waiter) {
+    acquire().then(waiter.resolve, waiter.reject);
+  }
+}
+
+async function release(slot) {
+  if (slot.renders >= recycleAfter) {
+    // Recycle pages periodically so mermaid/DOM leaks can't build up forever
+    await slot.page.close().catch(() => {});
+    try {
+      slot = await newPage();
+    } catch (error) {
+      created--;
+      retryWaiter();
+      return;
+    }
+  }
+  const waiter = waiters.shift();
+  if (waiter) {
+    waiter.resolve(slot);
+  } else {
+    idle.push(slot);
+  }
+}
+
+async function render(request) {
+  let slot;
+  try {
+    slot = await acquire();
+    const page = slot.page;
+    await page.setViewport({
+      width: request.width || 800,
+      height: 600,
+      deviceScaleFactor: request.scale || 1,
+    });
+    const drawn = await page.evaluate(async (id, source, background, wantSvg) => {
+      document.body.style.background = background;
+      const container = document.getElementById('container');
+      container.innerHTML = '';
+      let svg;
+      if (typeof mermaid.run === 'function') {
+        // mermaid >= 10: promise based
+        svg = (await mermaid.render(id, source)).svg;
+      } else {
+        svg = await new Promise((resolve, reject) => {
+          try {
+            mermaid.render(id, source, (code) => resolve(code), container);
+          } catch (error) {
+            reject(error);
+          }
+        });
+      }
+      container.innerHTML = svg;
+      const element = container.querySelector('svg');
+      const rect = element.getBoundingClientRect();
+      const clip = {
+        x: rect.left,
+        y: rect.top,
+        width: Math.ceil(rect.width),
+        height: Math.ceil(rect.height),
+      };
+      let markup = null;
+      if (wantSvg) {
+        // Fixed size instead of mermaid's width="100%" + max-width, serialized as XML
+        const copy = element.cloneNode(true);
+        copy.setAttribute('width', String(clip.width));
+        copy.setAttribute('height', String(clip.height));
+        copy.style.removeProperty('max-width');
+        markup = new XMLSerializer().serializeToString(copy);
+      }
+      return { clip, markup };
+    }, `diagram${request.id}`, request.source, request.background || 'white', Boolean(request.svg));
+    const png = await page.screenshot({ clip: drawn.clip, encoding: 'base64' });
+    const reply = { id: request.id, png };
+    if (drawn.markup !== null) {
+      reply.svg = drawn.markup;
+    }
+    send(reply);
+  } catch (error) {
+    send({ id: request.id, error: String((error && error.message) || error) });
+  } finally {
+    if (slot) {
+      slot.renders++;
+      release(slot);
+    }
+  }
+}
+
+(async () => {
+  try {
+    browser = await puppeteer.launch(Object.assign({ headless: true }, options.launch || {}));
+  } catch (error) {
+    send({ ready: false, error: String((error && error.message) || error) });
+    process.exit(1);
+  }
+  send({ ready: true });
+
+  const lines = readline.createInterface({ input: process.stdin });
+  lines.on('line', (line) => {
+    if (!line.trim()) {
+      return;
+    }
+    let request;
+    try {
+      request = JSON.parse(line);
+    } catch (error) {
+      return;
+    }
+    render(request);
+  });
+  // The Python side closing stdin is the shutdown signal
+  lines.on('close', async () => {
+    await browser.close().catch(() => {});
+    process.exit(0);
+  });
+})();
@@ -0,0 +1,303 @@
+import base64
+import itertools
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from io import BytesIO
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from PIL import Image, ImageDraw
+
+from image_processing import attach_svg
+
+RENDER_SERVER_SCRIPT = Path(__file__).resolve().parent / "mermaid_render_server.js"
+
+
+class MermaidRenderError(Exception):
+    """A diagram couldn't be rendered; callers fall back to mermaid-filter."""
+
+# Every renderer returns PNG bytes. With vector=True that PNG is a fallback drawn
+# at fallback_scale and carries the diagram's SVG (image_processing.attach_svg).
+
+
+class BrowserPoolRenderer:
+    """
+    Renders diagrams through a long-lived Node helper (mermaid_render_server.js) that
+    keeps Chrome and a pool of pages warm across requests, so only the first diagram
+    pays for browser startup. Thread-safe: requests are multiplexed over one pipe.
+    """
+
+    def __init__(self, launch_options, mermaid_config, width=800, scale=4, pool_size=2,
+                 recycle_after=50, timeout=60, node="node", node_path=None, retry_delay=60,
+                 vector=False, fallback_scale=2):
+        self.launch_options = launch_options
+        self.mermaid_config = mermaid_config
+        self.width = width
+        self.scale = scale
+        self.vector = vector
+        self.fallback_scale = fallback_scale
+        self.pool_size = pool_size
+        self.recycle_after = recycle_after
+        self.timeout = timeout
+        self.node = node
+        self.node_path = node_path
+        # After a failed start, don't try to spawn Chrome again for this many seconds
+        self.retry_delay = retry_delay
+        self._process = None
+        # Requests waiting on the current helper process, by request id
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._unavailable_until = 0
+
+    def _start(self):
+        options = {
+            "launch": self.launch_options,
+            "mermaidConfig": self.mermaid_config,
+            "poolSize": self.pool_size,
+            "recycleAfter": self.recycle_after,
+        }
+        env = os.environ.copy()
+        if self.node_path:
+            env["NODE_PATH"] = self.node_path
+        process = subprocess.Popen(
+            [self.node, str(RENDER_SERVER_SCRIPT), json.dumps(options)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+            text=True,
+            bufsize=1,
+        )
+
+        ready = Future()
+        pending = {}
+        reader = threading.Thread(
+            target=self._read_responses,
+            args=(process, pending, ready),
+            name="mermaid-render-reader",
+            daemon=True
+        )
+        reader.start()
+        try:
+            ready.result(timeout=self.timeout)
+        except Exception:
+            process.kill()
+            raise
+        return process, pending
+
+    def _read_responses(self, process, pending, ready):
+        for line in process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if "ready" in message:
+                if message["ready"]:
+                    ready.set_result(True)
+                else:
+                    ready.set_exception(MermaidRenderError(message.get("error", "browser failed to start")))
+                continue
+            with self._lock:
+                future = pending.pop(message.get("id"), None)
+            if future is None:
+                continue
+            if "png" in message:
+                future.set_result(message)
+            else:
+                future.set_exception(MermaidRenderError(message.get("error", "render failed")))
+
+        # stdout closed: the helper died, fail everything still waiting on it
+        error = MermaidRenderError("Mermaid render server exited")
+        if not ready.done():
+            ready.set_exception(error)
+        with self._lock:
+            if self._process is process:
+                self._process = None
+            orphaned = list(pending.values())
+            pending.clear()
+        for future in orphaned:
+            future.set_exception(error)
+
+    def _ensure_started(self):
+        with self._start_lock:
+            with self._lock:
+                if self._process is not None and self._process.poll() is None:
+                    return self._process, self._pending
+                if time.monotonic() < self._unavailable_until:
+                    raise MermaidRenderError("Mermaid render server is unavailable")
+            try:
+                process, pending = self._start()
+            except Exception as error:
+                with self._lock:
+                    self._unavailable_until = time.monotonic() + self.retry_delay
+                raise MermaidRenderError(f"Could not start Mermaid render server: {error}") from error
+            with self._lock:
+                self._process = process
+                self._pending = pending
+            return process, pending
+
+    def render(self, source):
+        """Renders one diagram and returns the PNG bytes (with the SVG attached in vector mode)."""
+        process, pending = self._ensure_started()
+        request_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            pending[request_id] = future
+        request = {
+            "id": request_id,
+            "source": source,
+            "width": self.width,
+            "scale": self.fallback_scale if self.vector else self.scale,
+            "background": "white",
+            "svg": self.vector,
+        }
+        try:
+            with self._write_lock:
+                process.stdin.write(json.dumps(request) + "\n")
+                process.stdin.flush()
+            message = future.result(timeout=self.timeout)
+        except (OSError, FutureTimeoutError) as error:
+            raise MermaidRenderError(f"Diagram render failed: {error}") from error
+        finally:
+            with self._lock:
+                pending.pop(request_id, None)
+        png = base64.b64decode(message["png"])
+        if self.vector:
+            if "svg" not in message:
+                raise MermaidRenderError("Render server returned no SVG")
+            return attach_svg(png, message["svg"].encode('utf-8'))
+        return png
+
+    def close(self):
+        with self._lock:
+            process, self._process = self._process, None
+        if process is not None:
+            try:
+                process.stdin.close()
+                process.wait(timeout=10)
+            except Exception:
+                process.kill()
+
+
+class MermaidCliRenderer:
+    """
+    One mermaid-cli (mmdc) run per diagram, with the options mermaid-filter uses.
+    Starts Chrome every time; useful where Node can't keep a helper process alive.
+    """
+
+    def __init__(self, mmdc, launch_options, mermaid_config, width=800, scale=4, vector=False, fallback_scale=2):
+        self.mmdc = mmdc
+        self.launch_options = launch_options
+        self.mermaid_config = mermaid_config
+        self.width = width
+        self.scale = scale
+        self.vector = vector
+        self.fallback_scale = fallback_scale
+
+    def render(self, source):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_root = Path(temp_dir)
+            source_path = temp_root / "diagram.mmd"
+            output_path = temp_root / "diagram.png"
+            mermaid_conf_path = temp_root / "mermaid-config.json"
+            puppeteer_conf_path = temp_root / "puppeteer.json"
+            source_path.write_text(source, encoding='utf-8')
+            mermaid_conf_path.write_text(json.dumps(self.mermaid_config))
+            puppeteer_conf_path.write_text(json.dumps(self.launch_options))
+
+            def run_mmdc(path, scale):
+                cmd = [
+                    self.mmdc,
+                    "-i", str(source_path),
+                    "-o", str(path),
+                    "-w", str(self.width),
+                    "-s", str(scale),
+                    "-t", self.mermaid_config.get("theme", "default"),
+                    "-b", "white",
+                    "-c", str(mermaid_conf_path),
+                    "-p", str(puppeteer_conf_path),
+                ]
+                subprocess.run(cmd, check=True, capture_output=True)
+                return path.read_bytes()
+
+            try:
+                if not self.vector:
+                    return run_mmdc(output_path, self.scale)
+                # mmdc writes one format per run, picked from the output extension
+                svg = run_mmdc(temp_root / "diagram.svg", 1)
+                return attach_svg(run_mmdc(output_path, self.fallback_scale), svg)
+            except (subprocess.CalledProcessError, OSError) as error:
+                raise MermaidRenderError(f"mmdc failed: {error}") from error
+
+    def close(self):
+        pass
+
+
+class StubRenderer:
+    """
+    Chrome-free stand-in: draws a box per diagram line with Pillow. Output is
+    deterministic for a given source, with a white margin like real renders.
+    Used by tests and benchmarks; render_delay simulates browser latency.
+    """
+
+    def __init__(self, width=800, scale=1, render_delay=0.0, vector=False, fallback_scale=2):
+        self.width = width
+        self.scale = scale
+        self.render_delay = render_delay
+        self.vector = vector
+        self.fallback_scale = fallback_scale
+
+    def render(self, source):
+        if self.render_delay:
+            time.sleep(self.render_delay)
+        lines = [line.strip()[:80] for line in source.strip().splitlines() if line.strip()] or [""]
+        if self.vector:
+            return attach_svg(self._draw_png(lines, self.fallback_scale), self._draw_svg(lines))
+        return self._draw_png(lines, self.scale)
+
+    def _draw_png(self, lines, scale):
+        row_height = 40 * scale
+        margin = 20 * scale
+        width = self.width * scale
+        height = row_height * len(lines) + 2 * margin
+        image = Image.new('RGB', (width, height), 'white')
+        draw = ImageDraw.Draw(image)
+        for index, line in enumerate(lines):
+            top = margin + index * row_height
+            draw.rectangle(
+                (margin, top + 4, width - margin, top + row_height - 4),
+                outline=(51, 51, 51),
+                width=max(1, scale)
+            )
+            draw.text((margin * 2, top + row_height // 3), line, fill=(0, 0, 0))
+        output = BytesIO()
+        image.save(output, format='PNG')
+        return output.getvalue()
+
+    def _draw_svg(self, lines):
+        # Same layout as _draw_png at scale 1, in CSS pixels
+        height = 40 * len(lines) + 40
+        elements = []
+        for index, line in enumerate(lines):
+            top = 20 + index * 40
+            elements.append(
+                f'<rect x="20" y="{top + 4}" width="{self.width - 40}" height="32" '
+                f'fill="none" stroke="#333333"/>'
+                f'<text x="40" y="{top + 24}" font-family="Arial" font-size="12">{escape(line)}</text>'
+            )
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" height="{height}" '
+            f'viewBox="0 0 {self.width} {height}"><rect width="100%" height="100%" fill="white"/>'
+            f'{"".join(elements)}</svg>'
+        ).encode('utf-8')
+
+    def close(self):
+        pass
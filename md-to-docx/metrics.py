@@ -0,0 +1,201 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Just the three metric kinds the service needs (counters, gauges, histograms), with
+labels, kept in a registry that renders them for a /metrics scrape. Values that
+already live elsewhere (pool and job queue sizes, cache statistics) are read at
+scrape time by collector callbacks instead of being mirrored here.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; conversions range from milliseconds (cache hits) to minutes (huge diagram sets)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) for every series."""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Name it with the conventional _total suffix."""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Counts the with-block as in flight while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (not cumulative), sum, count
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        samples = []
+        for key, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", key, (("le", _format_value(bound)),), cumulative))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def collector(self, fn):
+        """
+        Registers fn() -> [(name, kind, help, {((label, value), ...): sample value})],
+        called on every scrape. Usable as a decorator.
+        """
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        """Every metric in the text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, key, extra, value in metric.samples():
+                labels = _format_labels(metric.label_names, key, extra)
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        for collect in collectors:
+            try:
+                families = collect()
+            except Exception as error:
+                print(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {error}")
+                continue
+            for name, kind, help_text, series in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for label_pairs, value in series.items():
+                    labels = _format_labels((), (), label_pairs)
+                    lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REGISTRY = Registry()
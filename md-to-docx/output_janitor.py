@@ -0,0 +1,162 @@
+import asyncio
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+
+def _entry_size(path):
+    """Bytes held by a file, or by everything under a directory."""
+    try:
+        if not path.is_dir() or path.is_symlink():
+            return path.lstat().st_size
+    except FileNotFoundError:
+        return 0
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+class OutputJanitor:
+    """
+    Keeps the service's scratch areas from growing without bound: anything in
+    output_dir or work_dir older than ttl seconds is removed, and once output_dir
+    holds more than max_bytes its oldest entries go first. Paths returned by in_use()
+    (outputs still being streamed, results of unexpired jobs) are never touched.
+    Scratch workspaces are only aged out, since a running conversion may own one.
+    """
+
+    def __init__(self, output_dir: Path, work_dir: Path, ttl=3600, max_bytes=0, interval=60, in_use=None):
+        self.areas = {"outputs": Path(output_dir), "work": Path(work_dir)}
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.in_use = in_use
+        self.removed = {"ttl": 0, "quota": 0}
+        self.removed_bytes = 0
+        self._lock = threading.Lock()
+        self._task = None
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 or self.max_bytes > 0
+
+    async def start(self):
+        """Sweeps every interval seconds on the running event loop, starting right away."""
+        if self._task is not None or not self.enabled:
+            return
+        self._task = asyncio.create_task(self._run(), name="md-to-docx-janitor")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                print(f"Output janitor sweep failed: {error}")
+            await asyncio.sleep(self.interval)
+
+    def _entries(self, area):
+        """(mtime, size, path) of every top-level entry of an area, oldest first."""
+        entries = []
+        root = self.areas[area]
+        if not root.exists():
+            return entries
+        for entry in os.scandir(root):
+            path = Path(entry.path)
+            try:
+                mtime = entry.stat(follow_symlinks=False).st_mtime
+            except FileNotFoundError:
+                continue
+            entries.append((mtime, _entry_size(path), path))
+        entries.sort()
+        return entries
+
+    def _remove(self, path, size, reason):
+        try:
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+        except FileNotFoundError:
+            return
+        except OSError as error:
+            print(f"Output janitor could not remove {path}: {error}")
+            return
+        with self._lock:
+            self.removed[reason] += 1
+            self.removed_bytes += size
+
+    def sweep(self):
+        """One pass over both areas; returns how many entries were removed."""
+        if not self.enabled:
+            return 0
+        keep = {Path(path).resolve() for path in (self.in_use() if self.in_use is not None else ())}
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for area in self.areas:
+            kept = []
+            for mtime, size, path in self._entries(area):
+                if path.resolve() in keep:
+                    continue
+                if self.ttl > 0 and mtime < cutoff:
+                    self._remove(path, size, "ttl")
+                    removed += 1
+                else:
+                    kept.append((size, path))
+            if area != "outputs" or self.max_bytes <= 0:
+                continue
+            # Entries in use still count towards the quota, they just can't be evicted
+            total = sum(size for size, _path in kept) + sum(
+                _entry_size(path) for path in keep if path.parent == self.areas[area].resolve()
+            )
+            for size, path in kept:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path, size, "quota")
+                total -= size
+                removed += 1
+        if removed:
+            print(f"Output janitor removed {removed} stale entries")
+        return removed
+
+    def stats(self):
+        usage = {}
+        for area in self.areas:
+            entries = self._entries(area)
+            usage[area] = {"entries": len(entries), "bytes": sum(size for _mtime, size, _path in entries)}
+        with self._lock:
+            removed = dict(self.removed)
+            removed_bytes = self.removed_bytes
+        return {
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "max_bytes": self.max_bytes,
+            **usage,
+            "removed": removed,
+            "removed_bytes": removed_bytes,
+        }
+
+
+def janitor_from_env(output_dir, work_dir, in_use=None):
+    return OutputJanitor(
+        output_dir,
+        work_dir,
+        ttl=int(os.environ.get("MD_TO_DOCX_OUTPUT_TTL", "3600")),
+        max_bytes=int(os.environ.get("MD_TO_DOCX_OUTPUT_MAX_BYTES", str(1024 * 1024 * 1024))),
+        interval=int(os.environ.get("MD_TO_DOCX_JANITOR_INTERVAL", "60")),
+        in_use=in_use,
+    )
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+
+
+def hash_parts(*parts):
+    """
+    SHA-256 over a sequence of str/bytes parts. Each part is length-prefixed so
+    ("ab", "c") and ("a", "bc") never produce the same key.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk store of finished DOCX files.
+    Entries are plain files named after their key; the file mtime doubles as the
+    last-used time, so the oldest entries are evicted first once the total size
+    goes over max_bytes.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, suffix=".docx"):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        if self.enabled:
+            self.root.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _entry_path(self, key):
+        return self.root / f"{key}{self.suffix}"
+
+    def get(self, key):
+        """Returns the cached file for key, or None. A hit refreshes the entry's LRU position."""
+        if not self.enabled:
+            return None
+        path = self._entry_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def fetch(self, key, target_path: Path):
+        """
+        Like get(), but links (or copies) the entry to target_path and returns that,
+        so a concurrent eviction can't delete the file while the caller still reads it.
+        """
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            os.link(path, target_path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            try:
+                shutil.copyfile(path, target_path)
+            except FileNotFoundError:
+                return None
+        return target_path
+
+    def put(self, key, source_path: Path):
+        """Stores a copy of source_path under key and evicts old entries if needed."""
+        if not self.enabled:
+            return None
+        path = self._entry_path(key)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            # Hard-link when possible; the source is a fresh output file nobody rewrites
+            os.link(source_path, temp_path)
+        except OSError:
+            shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, path)
+        self._evict()
+        return path
+
+    def put_file(self, key, source):
+        """Stores the contents of source, a readable binary file, from its start."""
+        if not self.enabled:
+            return None
+        path = self._entry_path(key)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        source.seek(0)
+        try:
+            with open(temp_path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        self._evict()
+        return path
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.root):
+                if not entry.name.endswith(self.suffix) or entry.name.startswith('.'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            entries.sort()
+            for _mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        count = 0
+        total = 0
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(self.suffix) and not entry.name.startswith('.'):
+                try:
+                    total += entry.stat().st_size
+                    count += 1
+                except FileNotFoundError:
+                    continue
+        return {"enabled": True, "entries": count, "bytes": total, "max_bytes": self.max_bytes}
@@ -1,235 +1,284 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask, BackgroundTasks
+from starlette.responses import Response
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+import codecs
+import hashlib
+import io
 import shutil
 import os
 import subprocess
+import sys
+import threading
 import uuid
+import atexit
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+from functools import lru_cache, wraps
 from pathlib import Path
 import re
 import tempfile
+import time
 import zipfile
+from urllib.parse import quote
+from io import BytesIO
 from docx import Document
+from docx.parts.image import ImagePart
 from docx.shared import Pt, RGBColor, Emu
 from docx.enum.section import WD_ORIENT, WD_SECTION_START
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.part import Part
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
-from PIL import Image, ImageChops, ImageDraw, ImageFont
+from lxml import etree
+from PIL import Image, ImageDraw, ImageFont
+
+# The md-to-docx folder has dashes in its name and isn't a package, so put it on the
+# path to make the helper modules next to this file importable.
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from conversion_pool import PoolSaturatedError, pool_from_env
+from conversion_jobs import JobQueueFullError, job_manager_from_env
+from result_cache import ResultCache, hash_parts
+from diagram_cache import DiagramCache
+from docx_package import save_docx, write_docx
+from image_processing import (
+    IMAGE_DPI, IMAGE_MAX_BYTES, IMAGE_OPTIMIZE, TRIM_MIN_SAVINGS,
+    detach_svg, fit_image_blobs, image_size, pixels_for, svg_size, trim_image_blob,
+)
+from markdown_preprocessor import MarkdownPreprocessor, preprocess_markdown_text
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
+from output_janitor import janitor_from_env
+from status_banners import apply_status_banners
+from style_profiles import ReferenceDocCache, load_profiles
+from table_styling import style_tables
+from mermaid_renderer import (
+    BrowserPoolRenderer,
+    MermaidCliRenderer,
+    MermaidRenderError,
+    StubRenderer,
+)
 
 router = APIRouter(prefix="/md-to-docx", tags=["Markdown to DOCX"])
 
-UPLOAD_DIR = Path("./tmp/uploads")
 OUTPUT_DIR = Path("./tmp/outputs")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+# One scratch directory per conversion is created in here
+WORK_DIR = Path("./tmp/work")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def _set_cell_borders(cell):
-    tc = cell._tc
-    tc_pr = tc.get_or_add_tcPr()
-    
-    # Set margins
-    tc_mar = tc_pr.find(qn('w:tcMar'))
-    if tc_mar is None:
-        tc_mar = OxmlElement('w:tcMar')
-        tc_pr.append(tc_mar)
-        
-    for side, width in [('top', 100), ('bottom', 100), ('left', 100), ('right', 100)]:
-        node = tc_mar.find(qn(f'w:{side}'))
-        if node is None:
-            node = OxmlElement(f'w:{side}')
-            tc_mar.append(node)
-        node.set(qn('w:w'), str(width))
-        node.set(qn('w:type'), 'dxa')
-
-    # Set borders
-    tc_borders = tc_pr.find(qn('w:tcBorders'))
-    if tc_borders is None:
-        tc_borders = OxmlElement('w:tcBorders')
-        tc_pr.append(tc_borders)
-
-    for edge in ('top', 'left', 'bottom', 'right'):
-        element = tc_borders.find(qn(f'w:{edge}'))
-        if element is None:
-            element = OxmlElement(f'w:{edge}')
-            tc_borders.append(element)
-        element.set(qn('w:val'), 'single')
-        element.set(qn('w:sz'), '4') # Reduced from 8 to make it less heavy
-        element.set(qn('w:space'), '0')
-        element.set(qn('w:color'), 'AAAAAA') # Lighter gray border instead of black
-
-
-
-def _set_cell_shading(cell, fill='D9E2F3'):
-    tc = cell._tc
-    tc_pr = tc.get_or_add_tcPr()
-    shd = tc_pr.find(qn('w:shd'))
-    if shd is None:
-        shd = OxmlElement('w:shd')
-        tc_pr.append(shd)
-    shd.set(qn('w:val'), 'clear')
-    shd.set(qn('w:color'), 'auto')
-    shd.set(qn('w:fill'), fill)
-
-
-def _set_header_row_style(table):
-    if not table.rows:
-        return
-
-    for cell in table.rows[0].cells:
-        _set_cell_shading(cell)
-        for paragraph in cell.paragraphs:
-            for run in paragraph.runs:
-                run.bold = True
-                run.font.name = 'Arial'
-                run.font.size = Pt(11)
-                run.font.color.rgb = RGBColor(0, 0, 0)
-
-
-
-def _enforce_document_styles(doc):
-    # Enforce base font settings on Normal and Body Text
-    for style_name in ['Normal', 'Body Text']:
-        if style_name in doc.styles:
-            style = doc.styles[style_name]
-            style.font.name = 'Arial'
-            style.font.size = Pt(11)
-            style.font.color.rgb = RGBColor(0, 0, 0)
-            style.paragraph_format.space_after = Pt(8)
-            style.paragraph_format.line_spacing = 1.15
-
-    # Enforce list styles to match body
-    for style_name in ['List Paragraph', 'List Bullet', 'List Number']:
-        if style_name in doc.styles:
-            style = doc.styles[style_name]
-            style.font.name = 'Arial'
-            style.font.size = Pt(11)
-            style.paragraph_format.space_after = Pt(4)
-
-    # Tweak Headings for better hierarchy and artistic contrast
-    
-    # Option A: Modern Corporate (Unified Dark Navy for all headers)
-    # Using RGB(31, 78, 121) -> #1F4E79 (Classic Deep Navy)
-    
-    # Heading 1: Major Document Sections
-    heading_1 = doc.styles['Heading 1']
-    heading_1.font.name = 'Arial'
-    heading_1.font.size = Pt(20)
-    heading_1.font.bold = True
-    heading_1.font.color.rgb = RGBColor(31, 78, 121) 
-    heading_1.paragraph_format.space_before = Pt(24)
-    heading_1.paragraph_format.space_after = Pt(12)
-
-    # Heading 2: Main Topics 
-    heading_2 = doc.styles['Heading 2']
-    heading_2.font.name = 'Arial'
-    heading_2.font.size = Pt(16)
-    heading_2.font.bold = True
-    heading_2.font.color.rgb = RGBColor(31, 78, 121) # Same Deep Navy
-    heading_2.paragraph_format.space_before = Pt(18)
-    heading_2.paragraph_format.space_after = Pt(10)
-
-    # Heading 3: Specific Items 
-    heading_3 = doc.styles['Heading 3']
-    heading_3.font.name = 'Arial'
-    heading_3.font.size = Pt(14)
-    heading_3.font.bold = True
-    heading_3.font.color.rgb = RGBColor(31, 78, 121) # Same Deep Navy
-    heading_3.paragraph_format.space_before = Pt(14)
-    heading_3.paragraph_format.space_after = Pt(6)
-
-    # Heading 4: Metadata Headers 
-    if 'Heading 4' in doc.styles:
-        heading_4 = doc.styles['Heading 4']
-        heading_4.font.name = 'Arial'
-        heading_4.font.size = Pt(12)
-        heading_4.font.bold = True
-        # Slightly lighter variation for H4 to keep it subtle but related
-        heading_4.font.color.rgb = RGBColor(57, 102, 148) 
-        heading_4.paragraph_format.space_before = Pt(14)
-        heading_4.paragraph_format.space_after = Pt(6)
-        
-        # Remove any borders/underlines 
-        p_pr = heading_4._element.get_or_add_pPr()
-        p_borders = p_pr.find(qn('w:pBorders'))
-        if p_borders is not None:
-             p_pr.remove(p_borders)
-
-    # Attempt to catch Titles if used
-    if 'Title' in doc.styles:
-        title = doc.styles['Title']
-        title.font.name = 'Arial'
-        title.font.size = Pt(18)
-        title.font.bold = True
-        title.font.color.rgb = RGBColor(0, 51, 102)
-        title.paragraph_format.alignment = 0 # Left align (WD_ALIGN_PARAGRAPH.LEFT is 0)
+WORK_DIR.mkdir(parents=True, exist_ok=True)
+
+# Uploads are read in chunks of this size and rejected past the limit
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("MD_TO_DOCX_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Most Markdown files one /batch request may carry, counting those inside zips
+MAX_BATCH_FILES = int(os.environ.get("MD_TO_DOCX_MAX_BATCH_FILES", "200"))
+# Most Markdown bytes (uncompressed) one /batch request may carry; its texts are held in memory
+MAX_BATCH_BYTES = int(os.environ.get("MD_TO_DOCX_MAX_BATCH_BYTES", str(100 * 1024 * 1024)))
+
+# Blocking pandoc and python-docx work runs here instead of on the event loop
+CONVERSION_POOL = pool_from_env()
+
+# How /convert/ and /batch/ hand the finished file to the client:
+#   memory - serialized into a buffer that spills to an anonymous file in WORK_DIR past
+#            SPOOL_MAX_BYTES, and streamed from there; OUTPUT_DIR is never touched
+#   file   - written to OUTPUT_DIR, served from there and deleted once sent
+# A process pool can't hand a buffer back, so /convert/ always uses files there.
+OUTPUT_MODE = os.environ.get("MD_TO_DOCX_OUTPUT_MODE", "memory")
+SPOOL_MAX_BYTES = int(os.environ.get("MD_TO_DOCX_SPOOL_MAX_BYTES", str(16 * 1024 * 1024)))
+STREAM_CONVERSIONS = OUTPUT_MODE == "memory" and CONVERSION_POOL.kind == "thread"
+RESPONSE_CHUNK_SIZE = 64 * 1024
 
 
 def _trim_image_file(image_path: Path):
     try:
-        with Image.open(image_path) as img:
-            original_width, original_height = img.size
-
-            if img.mode != 'RGB':
-                rgb = img.convert('RGB')
-            else:
-                rgb = img
-
-            white_bg = Image.new('RGB', rgb.size, 'white')
-            diff = ImageChops.difference(rgb, white_bg)
-            bbox = diff.getbbox()
+        trimmed = trim_image_blob(image_path.read_bytes())
+        if trimmed is not None:
+            image_path.write_bytes(trimmed)
+    except Exception as error:
+        print(f"Image trim skipped for {image_path.name}: {error}")
 
-            if bbox is None:
-                return
 
-            left, top, right, bottom = bbox
-            padding = 4
-            left = max(0, left - padding)
-            top = max(0, top - padding)
-            right = min(original_width, right + padding)
-            bottom = min(original_height, bottom + padding)
+def _available_width(doc):
+    """Narrowest text width (page minus side margins) across the sections, in EMU, or None."""
+    widths = []
+    for section in doc.sections:
+        if section.page_width is None or section.left_margin is None or section.right_margin is None:
+            continue
+        widths.append(int(section.page_width - section.left_margin - section.right_margin))
+    return min(widths) if widths else None
 
-            if (right - left) >= original_width and (bottom - top) >= original_height:
-                return
 
-            width_ratio = (right - left) / original_width
-            height_ratio = (bottom - top) / original_height
+def _longest_available_extent(doc):
+    """
+    Longest side a full-page appendix diagram can take up (landscape width or
+    portrait height of the first section's page, minus margins), in EMU, or None.
+    """
+    if not doc.sections:
+        return None
+    section = doc.sections[0]
+    sizes = (section.page_width, section.page_height, section.left_margin,
+             section.right_margin, section.top_margin, section.bottom_margin)
+    if any(size is None for size in sizes):
+        return None
+    page_w, page_h, left, right, top, bottom = (int(size) for size in sizes)
+    long_side = max(page_w, page_h)
+    return long_side - min(left + right, top + bottom)
+
+
+# Office 2016+ blip extension pointing at an SVG version of the picture; older readers show the PNG
+SVG_BLIP_EXTENSION_URI = '{96DAC541-7B7A-43D3-8B79-37D633B846F1}'
+SVG_NAMESPACE = 'http://schemas.microsoft.com/office/drawing/2016/SVG/main'
+SVG_BLIP_TAG = f'{{{SVG_NAMESPACE}}}svgBlip'
+
+
+def _add_svg_blip(blip, svg_rel_id):
+    ext_list = blip.find(qn('a:extLst'))
+    if ext_list is None:
+        ext_list = OxmlElement('a:extLst')
+        blip.append(ext_list)
+    ext = OxmlElement('a:ext')
+    ext.set('uri', SVG_BLIP_EXTENSION_URI)
+    ext_list.append(ext)
+    svg_blip = etree.SubElement(ext, SVG_BLIP_TAG, nsmap={'asvg': SVG_NAMESPACE})
+    svg_blip.set(qn('r:embed'), svg_rel_id)
+
+
+def _embed_vector_diagrams(doc):
+    """
+    Diagrams rendered with MD_TO_DOCX_DIAGRAM_FORMAT=svg reach the package as PNG
+    fallbacks carrying their SVG. Each SVG becomes its own image part, linked from
+    the picture's blip, and the PNG goes back to a plain fallback.
+    """
+    package = doc.part.package
+    svg_rel_ids = {}
+    for rel in list(doc.part.rels.values()):
+        if rel.is_external or rel.reltype != RT.IMAGE:
+            continue
+        image_part = rel.target_part
+        if not isinstance(image_part, ImagePart) or image_part.partname.ext.lower() != 'png':
+            continue
+        png, svg = detach_svg(image_part.blob)
+        if svg is None:
+            continue
+        image_part._blob = png
+        svg_part = Part(package.next_partname('/word/media/image%d.svg'), 'image/svg+xml', svg, package)
+        svg_rel_ids[rel.rId] = doc.part.relate_to(svg_part, RT.IMAGE)
 
-            if width_ratio > 0.98 and height_ratio > 0.98:
-                return
+    if not svg_rel_ids:
+        return
+    for blip in doc.element.body.iter(qn('a:blip')):
+        svg_rel_id = svg_rel_ids.get(blip.get(qn('r:embed')))
+        if svg_rel_id is not None:
+            _add_svg_blip(blip, svg_rel_id)
 
-            cropped = img.crop((left, top, right, bottom))
-            cropped.save(image_path)
-    except Exception as error:
-        print(f"Image trim skipped for {image_path.name}: {error}")
 
+def _vector_images(doc):
+    """Relationship ids of pictures with an SVG version, mapped to the SVG's relationship id."""
+    images = {}
+    for svg_blip in doc.element.body.iter(SVG_BLIP_TAG):
+        # asvg:svgBlip < a:ext < a:extLst < a:blip
+        blip = svg_blip.getparent().getparent().getparent()
+        images[blip.get(qn('r:embed'))] = svg_blip.get(qn('r:embed'))
+    return images
 
-def _trim_docx_media_images(docx_path: Path):
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_root = Path(temp_dir)
-        with zipfile.ZipFile(docx_path, 'r') as source_zip:
-            source_zip.extractall(temp_root)
 
-        media_dir = temp_root / 'word' / 'media'
-        if media_dir.exists():
-            for image_file in media_dir.iterdir():
-                if image_file.suffix.lower() in ('.png', '.jpg', '.jpeg'):
-                    _trim_image_file(image_file)
+class _ImageIndex:
+    """
+    Pixel sizes of a document's pictures, for the stages that only need them to lay
+    pictures out (media, aspect, appendix). Each is read once from the PNG/JPEG
+    header, or for vector diagrams from the SVG at MERMAID_FILTER_SCALE, the size a
+    PNG render of it would have had. Nothing is decoded. _postprocess_docx builds
+    one per document and calls refresh() after every stage that changes media.
+    """
 
-        with zipfile.ZipFile(docx_path, 'w', zipfile.ZIP_DEFLATED) as target_zip:
-            for file_path in temp_root.rglob('*'):
-                if file_path.is_file():
-                    target_zip.write(file_path, file_path.relative_to(temp_root))
+    def __init__(self, doc):
+        self.doc = doc
+        self.vector_images = _vector_images(doc)
+        self._sizes = {}
+
+    def refresh(self):
+        """Picks up SVG versions added since, and forgets sizes of parts whose bytes were replaced."""
+        self.vector_images = _vector_images(self.doc)
+        self._sizes = {part: entry for part, entry in self._sizes.items() if entry[0] is part.blob}
+
+    def part_size(self, part):
+        """(width, height) of a bitmap image part."""
+        blob = part.blob
+        cached = self._sizes.get(part)
+        if cached is not None:
+            return cached[1]
+        size = image_size(blob)
+        if size is None:
+            # Formats pandoc rarely embeds (GIF, BMP, TIFF): python-docx knows their headers
+            size = (part.image.px_width, part.image.px_height)
+        self._sizes[part] = (blob, size)
+        return size
+
+    def picture_size(self, rel_id):
+        """(width, height) of the picture behind a blip's relationship id."""
+        related_parts = self.doc.part.related_parts
+        svg_rel_id = self.vector_images.get(rel_id)
+        if svg_rel_id is not None:
+            svg_part = related_parts[svg_rel_id]
+            if svg_part not in self._sizes:
+                size = svg_size(svg_part.blob)
+                if size is not None:
+                    scale = int(MERMAID_FILTER_SCALE)
+                    size = (round(size[0] * scale), round(size[1] * scale))
+                self._sizes[svg_part] = (svg_part.blob, size)
+            size = self._sizes[svg_part][1]
+            if size is not None:
+                return size
+        return self.part_size(related_parts[rel_id])
+
+
+def _fit_docx_media_images(doc, images):
+    """
+    Trims every embedded PNG/JPEG and downsamples it to the resolution policy: at most
+    IMAGE_DPI across the space it is displayed in, within IMAGE_MAX_BYTES.
+    Works on the image parts of the loaded package, so no unzip/re-zip round-trip is needed.
+    PNG fallbacks of vector diagrams are already drawn small and are left alone.
+    """
+    # Inline images are stretched to the text width by the aspect stage; large diagrams
+    # are also shown full-page in the appendix, so they keep enough pixels for that
+    text_width_px = pixels_for(_available_width(doc))
+    appendix_px = pixels_for(_longest_available_extent(doc))
+    vector_fallbacks = {doc.part.related_parts[rel_id] for rel_id in images.vector_images}
+
+    parts = []
+    max_sizes = []
+    for part in doc.part.package.iter_parts():
+        if not isinstance(part, ImagePart) or part in vector_fallbacks:
+            continue
+        if not part.partname.startswith('/word/media/'):
+            continue
+        if part.partname.ext.lower() not in ('png', 'jpg', 'jpeg'):
+            continue
+        max_size = (text_width_px, None)
+        try:
+            if appendix_px and _is_large_diagram(*images.part_size(part)):
+                max_size = (appendix_px, appendix_px)
+        except Exception as error:
+            print(f"Image size check skipped for {part.partname}: {error}")
+        parts.append(part)
+        max_sizes.append(max_size)
+
+    results = fit_image_blobs([part.blob for part in parts], max_sizes)
+    for part, (fitted, error) in zip(parts, results):
+        if error is not None:
+            print(f"Image trim skipped for {part.partname}: {error}")
+            continue
+        if fitted is not None:
+            part._blob = fitted
+            # Drop the cached header info so later stages see the new dimensions
+            part._image = None
 
 
-def _sync_inline_shape_aspect_ratio(docx_path: Path):
-    doc = Document(str(docx_path))
-    max_width = None
-    if doc.sections:
-        widths = []
-        for section in doc.sections:
-            widths.append(int(section.page_width - section.left_margin - section.right_margin))
-        if widths:
-            max_width = min(widths)
+def _sync_inline_shape_aspect_ratio(doc, images):
+    max_width = _available_width(doc)
 
     settings = doc.settings._element
     no_compress = settings.find(qn('w:doNotCompressPictures'))
@@ -241,10 +290,7 @@ def _sync_inline_shape_aspect_ratio(docx_path: Path):
     for shape in doc.inline_shapes:
         try:
             blip = shape._inline.graphic.graphicData.pic.blipFill.blip
-            rel_id = blip.embed
-            image_part = doc.part.related_parts[rel_id]
-            pixel_width = image_part.image.px_width
-            pixel_height = image_part.image.px_height
+            pixel_width, pixel_height = images.picture_size(blip.embed)
             if pixel_width and pixel_height:
                 target_width = int(shape.width)
                 if max_width is not None:
@@ -255,16 +301,17 @@ def _sync_inline_shape_aspect_ratio(docx_path: Path):
                 shape.height = Emu(corrected_height)
         except Exception as error:
             print(f"Inline shape ratio sync skipped: {error}")
-    doc.save(str(docx_path))
 
 
-def _best_diagram_layout(img_width_px, img_height_px, avail_portrait, avail_landscape):
+def _best_diagram_layout(img_width_px, img_height_px, avail_portrait, avail_landscape, allow_rotation=True):
     candidates = [
         ('portrait', False, avail_portrait),
         ('portrait', True, avail_portrait),
         ('landscape', False, avail_landscape),
         ('landscape', True, avail_landscape),
     ]
+    if not allow_rotation:
+        candidates = [candidate for candidate in candidates if not candidate[1]]
 
     best = None
     for orientation, rotate_90, (avail_w, avail_h) in candidates:
@@ -352,40 +399,65 @@ def _add_bookmark_to_paragraph(paragraph, bookmark_name, bookmark_id):
     paragraph._p.append(end)
 
 
-def _inject_appendix_title_into_image(image_path: Path, title_text: str):
+def _titled_appendix_image(blob: bytes, title_text: str, rotate_90=False):
+    """
+    The appendix copy of a bitmap diagram: turned a quarter if the layout asks for
+    it, with the figure title in a banner above. Decoded and encoded once, in the
+    source's format. Returns (bytes, (width, height)).
+    """
+    with Image.open(BytesIO(blob)) as source_image:
+        image_format = source_image.format
+        image = source_image.rotate(90, expand=True) if rotate_90 else source_image.copy()
+
     try:
-        with Image.open(image_path) as source_image:
-            image = source_image.convert('RGB')
-            width, height = image.size
+        image = image.convert('RGB')
+        width, height = image.size
 
-            banner_height = max(80, int(width * 0.06))
-            canvas = Image.new('RGB', (width, height + banner_height), 'white')
-            draw = ImageDraw.Draw(canvas)
+        banner_height = max(80, int(width * 0.06))
+        canvas = Image.new('RGB', (width, height + banner_height), 'white')
+        draw = ImageDraw.Draw(canvas)
 
-            draw.rectangle((0, 0, width, banner_height), fill=(242, 246, 255))
+        draw.rectangle((0, 0, width, banner_height), fill=(242, 246, 255))
 
-            try:
-                font = ImageFont.truetype('arial.ttf', max(24, int(width * 0.03)))
-            except Exception:
-                font = ImageFont.load_default()
-
-            text_bbox = draw.textbbox((0, 0), title_text, font=font)
-            text_w = text_bbox[2] - text_bbox[0]
-            text_h = text_bbox[3] - text_bbox[1]
-            text_x = max(12, (width - text_w) // 2)
-            text_y = max(8, (banner_height - text_h) // 2)
-            draw.text((text_x, text_y), title_text, fill=(0, 51, 102), font=font)
-
-            canvas.paste(image, (0, banner_height))
-            canvas.save(image_path)
+        try:
+            font = ImageFont.truetype('arial.ttf', max(24, int(width * 0.03)))
+        except Exception:
+            font = ImageFont.load_default()
+
+        text_bbox = draw.textbbox((0, 0), title_text, font=font)
+        text_w = text_bbox[2] - text_bbox[0]
+        text_h = text_bbox[3] - text_bbox[1]
+        text_x = max(12, (width - text_w) // 2)
+        text_y = max(8, (banner_height - text_h) // 2)
+        draw.text((text_x, text_y), title_text, fill=(0, 51, 102), font=font)
+
+        canvas.paste(image, (0, banner_height))
+        image = canvas
     except Exception as error:
-        print(f"Appendix title injection skipped for {image_path.name}: {error}")
+        print(f"Appendix title injection skipped for {title_text}: {error}")
 
+    output = BytesIO()
+    image.save(output, format=image_format)
+    return output.getvalue(), image.size
 
-def _append_full_page_diagram_appendix(docx_path: Path):
-    doc = Document(str(docx_path))
+
+# Page height set aside for the title paragraph above a vector appendix diagram
+APPENDIX_TITLE_HEIGHT = int(Pt(36))
+
+
+def _add_appendix_title_paragraph(doc, title_text):
+    paragraph = doc.add_paragraph()
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    paragraph.paragraph_format.keep_with_next = True
+    run = paragraph.add_run(title_text)
+    run.bold = True
+    run.font.size = Pt(16)
+    run.font.color.rgb = RGBColor(0, 51, 102)
+    return paragraph
+
+
+def _append_full_page_diagram_appendix(doc, images):
     if not doc.inline_shapes:
-        doc.save(str(docx_path))
         return
 
     first_section = doc.sections[0]
@@ -410,6 +482,7 @@ def _append_full_page_diagram_appendix(docx_path: Path):
         landscape_page_h - base_top - base_bottom,
     )
 
+    vector_images = images.vector_images
     diagram_entries = []
     seen_rel_ids = set()
     for shape in list(doc.inline_shapes):
@@ -420,13 +493,13 @@ def _append_full_page_diagram_appendix(docx_path: Path):
                 continue
             seen_rel_ids.add(rel_id)
             image_part = doc.part.related_parts[rel_id]
-            img_w = image_part.image.px_width
-            img_h = image_part.image.px_height
+            img_w, img_h = images.picture_size(rel_id)
             if not _is_large_diagram(img_w, img_h):
                 continue
             diagram_entries.append({
                 'rel_id': rel_id,
                 'image_part': image_part,
+                'svg_rel_id': vector_images.get(rel_id),
                 'img_w': img_w,
                 'img_h': img_h,
                 'shape': shape,
@@ -435,7 +508,6 @@ def _append_full_page_diagram_appendix(docx_path: Path):
             print(f"Appendix collection skipped a shape: {error}")
 
     if not diagram_entries:
-        doc.save(str(docx_path))
         return
 
     figure_map = {}
@@ -463,375 +535,1238 @@ def _append_full_page_diagram_appendix(docx_path: Path):
             _insert_reference_after_paragraph(paragraph, meta['anchor'], meta['label'])
             annotated_rel_ids.add(current_rel_id)
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_root = Path(temp_dir)
-
-        for entry in diagram_entries:
-            try:
-                index = figure_map[entry['rel_id']]['index']
-                image_part = entry['image_part']
+    for entry in diagram_entries:
+        try:
+            index = figure_map[entry['rel_id']]['index']
+            figure_label = figure_map[entry['rel_id']]['label']
+            image_part = entry['image_part']
+            svg_rel_id = entry['svg_rel_id']
+            img_w = entry['img_w']
+            img_h = entry['img_h']
+
+            if svg_rel_id is not None:
+                # Vector diagram: nothing is decoded or redrawn. The page reuses the
+                # same PNG and SVG parts, with the title in a paragraph above it,
+                # so the picture isn't rotated (the title would end up sideways)
+                layout = _best_diagram_layout(
+                    img_w,
+                    img_h,
+                    (avail_portrait[0], avail_portrait[1] - APPENDIX_TITLE_HEIGHT),
+                    (avail_landscape[0], avail_landscape[1] - APPENDIX_TITLE_HEIGHT),
+                    allow_rotation=False
+                )
+                if layout is None:
+                    continue
+                picture_source = BytesIO(image_part.blob)
+            else:
                 source_ext = image_part.filename.split('.')[-1].lower()
                 if source_ext not in ('png', 'jpg', 'jpeg'):
                     continue
 
-                source_path = temp_root / f'diagram_{index}.{source_ext}'
-                source_path.write_bytes(image_part.blob)
-
-                img_w = entry['img_w']
-                img_h = entry['img_h']
-
+                # Rotation is decided from the indexed size; pixels are only touched
+                # once, to rotate and title the page's copy
                 layout = _best_diagram_layout(img_w, img_h, avail_portrait, avail_landscape)
                 if layout is None:
                     continue
 
-                render_path = source_path
-                if layout['rotate_90']:
-                    with Image.open(source_path) as source_image:
-                        rotated = source_image.rotate(90, expand=True)
-                        render_path = temp_root / f'diagram_{index}_rotated.{source_ext}'
-                        rotated.save(render_path)
-
-                figure_label = figure_map[entry['rel_id']]['label']
-                _inject_appendix_title_into_image(render_path, figure_label)
-                with Image.open(render_path) as titled_image:
-                    titled_w, titled_h = titled_image.size
-
+                titled_blob, (titled_w, titled_h) = _titled_appendix_image(
+                    image_part.blob, figure_label, layout['rotate_90']
+                )
                 layout = _best_diagram_layout(titled_w, titled_h, avail_portrait, avail_landscape)
                 if layout is None:
                     continue
+                picture_source = BytesIO(titled_blob)
+
+            section = doc.add_section(WD_SECTION_START.NEW_PAGE)
+            section.left_margin = Emu(base_left)
+            section.right_margin = Emu(base_right)
+            section.top_margin = Emu(base_top)
+            section.bottom_margin = Emu(base_bottom)
+
+            if layout['orientation'] == 'landscape':
+                section.orientation = WD_ORIENT.LANDSCAPE
+                section.page_width = Emu(landscape_page_w)
+                section.page_height = Emu(landscape_page_h)
+            else:
+                section.orientation = WD_ORIENT.PORTRAIT
+                section.page_width = Emu(portrait_page_w)
+                section.page_height = Emu(portrait_page_h)
 
-                section = doc.add_section(WD_SECTION_START.NEW_PAGE)
-                section.left_margin = Emu(base_left)
-                section.right_margin = Emu(base_right)
-                section.top_margin = Emu(base_top)
-                section.bottom_margin = Emu(base_bottom)
-
-                if layout['orientation'] == 'landscape':
-                    section.orientation = WD_ORIENT.LANDSCAPE
-                    section.page_width = Emu(landscape_page_w)
-                    section.page_height = Emu(landscape_page_h)
-                else:
-                    section.orientation = WD_ORIENT.PORTRAIT
-                    section.page_width = Emu(portrait_page_w)
-                    section.page_height = Emu(portrait_page_h)
-
+            if svg_rel_id is not None:
+                anchor_paragraph = _add_appendix_title_paragraph(doc, figure_label)
                 picture_paragraph = doc.add_paragraph()
-                _add_bookmark_to_paragraph(
-                    picture_paragraph,
-                    figure_map[entry['rel_id']]['anchor'],
-                    9000 + index
-                )
-                run = picture_paragraph.add_run()
-                run.add_picture(
-                    str(render_path),
-                    width=Emu(layout['width_emu']),
-                    height=Emu(layout['height_emu'])
-                )
+            else:
+                picture_paragraph = anchor_paragraph = doc.add_paragraph()
+            _add_bookmark_to_paragraph(
+                anchor_paragraph,
+                figure_map[entry['rel_id']]['anchor'],
+                9000 + index
+            )
+            run = picture_paragraph.add_run()
+            # Identical bytes map back onto the existing image part and relationship
+            run.add_picture(
+                picture_source,
+                width=Emu(layout['width_emu']),
+                height=Emu(layout['height_emu'])
+            )
+            if svg_rel_id is not None:
+                _add_svg_blip(run._r.findall('.//' + qn('a:blip'))[-1], svg_rel_id)
 
-            except Exception as error:
-                print(f"Appendix render skipped diagram {index}: {error}")
+        except Exception as error:
+            print(f"Appendix render skipped diagram {index}: {error}")
+
+
+# Post-processing stages, in the order they run against the in-memory document.
+# Every stage takes the loaded Document and mutates it in place. Whatever the Lua
+# filters already did inside pandoc (banners, header text) is skipped here.
+POSTPROCESS_STAGES = [
+    ('banner', apply_status_banners),
+    ('tables', style_tables),
+    ('vector', _embed_vector_diagrams),
+    ('media', _fit_docx_media_images),
+    ('aspect', _sync_inline_shape_aspect_ratio),
+    ('appendix', _append_full_page_diagram_appendix),
+]
+# Stages that lay pictures out also get the document's _ImageIndex
+IMAGE_INDEX_STAGES = {'media', 'aspect', 'appendix'}
+# Stages that add or replace image parts; the index is refreshed after each of them
+MEDIA_STAGES = {'vector', 'media', 'appendix'}
+
+
+def _run_postprocess_stage(stage_name, stage, doc, images):
+    if stage_name in IMAGE_INDEX_STAGES:
+        stage(doc, images)
+    else:
+        stage(doc)
+    if stage_name in MEDIA_STAGES:
+        images.refresh()
+
+
+def _postprocess_docx(docx_path: Path, on_stage=None, target=None):
+    """
+    Loads the pandoc output once, runs every post-processing stage against the
+    in-memory package and serializes it once: over docx_path, or into target (a
+    writable binary file) when one is given.
+    Returns the time spent in each stage, in seconds; on_stage(name, seconds)
+    is also called as each one finishes.
+    """
+    timings = {}
 
-    doc.save(str(docx_path))
+    def record(stage_name, started):
+        timings[stage_name] = time.perf_counter() - started
+        if on_stage is not None:
+            on_stage(stage_name, timings[stage_name])
 
+    started = time.perf_counter()
+    doc = Document(str(docx_path))
+    record('load', started)
 
-def _apply_table_style(table):
-    preferred_styles = ['MyCustomTable', 'Table Grid', 'Normal Table']
-    for style_name in preferred_styles:
-        try:
-            table.style = style_name
-            return
-        except Exception:
-            continue
+    images = _ImageIndex(doc)
+    for stage_name, stage in POSTPROCESS_STAGES:
+        started = time.perf_counter()
+        _run_postprocess_stage(stage_name, stage, doc, images)
+        record(stage_name, started)
 
+    started = time.perf_counter()
+    # Untouched parts (most media) keep pandoc's compressed bytes
+    if target is None:
+        save_docx(doc, docx_path)
+    else:
+        write_docx(doc, docx_path, target)
+    record('save', started)
 
-def _apply_status_banner(doc):
-    """
-    Finds paragraphs with [[STATUS_BANNER:<TYPE>:<TEXT>]] and styles them as a banner.
-    """
-    # Regex to capture TYPE and TEXT
-    banner_pattern = re.compile(r'\[\[STATUS_BANNER:(.*?):(.*?)\]\]')
-    
-    # Define styles for different banner types
-    styles = {
-        'high-risk': {
-            'bg': 'FFEBEE',       # Light Red
-            'border': 'FFCDD2',   # Red Border
-            'text': (0xB7, 0x1C, 0x1C) # Dark Red
-        },
-        'medium-risk': {
-            'bg': 'FFF3E0',       # Light Orange
-            'border': 'FFE0B2',   # Orange Border
-            'text': (0xE6, 0x51, 0x00) # Dark Orange
-        },
-        'low-risk': {
-            'bg': 'E8F5E9',       # Light Green
-            'border': 'C8E6C9',   # Green Border
-            'text': (0x1B, 0x5E, 0x20) # Dark Green
-        },
-        'info': {
-            'bg': 'E3F2FD',       # Light Blue
-            'border': 'BBDEFB',   # Blue Border
-            'text': (0x0D, 0x47, 0xA1) # Dark Blue
-        },
-        'warning': {
-            'bg': 'FFF8E1',       # Light Yellow
-            'border': 'FFECB3',   # Yellow Border
-            'text': (0xF5, 0x7F, 0x17) # Dark Yellow/Orange
-        },
-        'default': {
-            'bg': 'F5F5F5',       # Light Grey
-            'border': 'E0E0E0',   # Grey Border
-            'text': (0x42, 0x42, 0x42) # Dark Grey
-        }
-    }
+    summary = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in timings.items())
+    print(f"Post-processed {docx_path.name}: {summary}")
+    return timings
+
+
+def _server_timing_header(timings):
+    # Server-Timing lets browser devtools and curl -v show the per-stage breakdown
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
 
-    for paragraph in doc.paragraphs:
-        match = banner_pattern.search(paragraph.text)
-        if match:
-            banner_type = match.group(1).lower()
-            text_content = match.group(2)
-            
-            # map css classes to internal keys
-            style_key = 'default'
-            if 'high-risk' in banner_type:
-                style_key = 'high-risk'
-            elif 'medium-risk' in banner_type:
-                style_key = 'medium-risk'
-            elif 'low-risk' in banner_type or 'success' in banner_type:
-                style_key = 'low-risk'
-            elif 'info' in banner_type:
-                style_key = 'info'
-            elif 'warning' in banner_type:
-                style_key = 'warning'
-
-            style = styles[style_key]
-
-            # Clear existing runs and add new styled run
-            paragraph.clear()
-            
-            run = paragraph.add_run(text_content)
-            run.bold = True
-            r, g, b = style['text']
-            run.font.color.rgb = RGBColor(r, g, b)
-            run.font.size = Pt(10)
-            
-            # Apply paragraph shading (Background Color)
-            pPr = paragraph._p.get_or_add_pPr()
-            
-            # Remove existing shader if any
-            existing_shd = pPr.find(qn('w:shd'))
-            if existing_shd is not None:
-                pPr.remove(existing_shd)
-            
-            shd = OxmlElement('w:shd')
-            shd.set(qn('w:val'), 'clear')
-            shd.set(qn('w:color'), 'auto')
-            shd.set(qn('w:fill'), style['bg'])
-            pPr.append(shd)
-            
-            # Add padding via borders
-            existing_pBdr = pPr.find(qn('w:pBdr'))
-            if existing_pBdr is not None:
-                pPr.remove(existing_pBdr)
-            
-            pBdr = OxmlElement('w:pBdr')
-            for side in ['top', 'left', 'bottom', 'right']:
-                bdr = OxmlElement(f'w:{side}')
-                bdr.set(qn('w:val'), 'single')
-                bdr.set(qn('w:sz'), '4') # 1/2 pt
-                bdr.set(qn('w:space'), '4') # 4 pt padding
-                bdr.set(qn('w:color'), style['border'])
-                pBdr.append(bdr)
-            pPr.append(pBdr)
-
-            # Set alignment if needed
-            paragraph.alignment = 0 # Left aligned
-
-
-def _enforce_table_borders(docx_path: Path):
-    doc = Document(str(docx_path))
-    _apply_status_banner(doc)
-    _enforce_document_styles(doc)
-    for table in doc.tables:
-        _apply_table_style(table)
-        _set_header_row_style(table)
-        for row in table.rows:
-            for cell in row.cells:
-                _set_cell_borders(cell) 
-                # Ensure table content doesn't inherit large paragraph spacing
-                for paragraph in cell.paragraphs:
-                    paragraph.paragraph_format.space_after = Pt(0)
-                    if paragraph.style.name == 'Normal':
-                        paragraph.style = doc.styles['Normal'] # Re-assert style if needed but properties override style
-    
-    doc.save(str(docx_path))
-    _trim_docx_media_images(docx_path)
-    _sync_inline_shape_aspect_ratio(docx_path)
-    _append_full_page_diagram_appendix(docx_path)
 
 # Helper: Preprocess Markdown for Mermaid
-def preprocess_markdown(file_path):
+class MarkdownStreamPreprocessor:
     """
-    Reads markdown file, converts <div class="mermaid"> to fenced code blocks,
-    and returns path to a temporary file.
+    Preprocesses Markdown as it arrives in chunks of bytes. Text is rewritten as
+    soon as it can't be part of an unfinished tag or div any more, and the output
+    is hashed as it is produced, so no copy of the upload is ever written.
     """
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Strip <details> and <summary> tags (keep content) for DOCX compatibility
-        # These HTML tags are often ignored or dropped by Pandoc when converting to DOCX
-        content = re.sub(r'</?details\b[^>]*>', '', content, flags=re.IGNORECASE)
-        content = re.sub(r'</?summary\b[^>]*>', '', content, flags=re.IGNORECASE)
-
-        # Regex to transform <div class="mermaid">...</div> into ```mermaid...```
-        pattern = re.compile(r'<div class="mermaid">\s*(.*?)\s*</div>', re.DOTALL)
-        
-        def replacement(match):
-            code = match.group(1).strip()
-            return f"\n```mermaid\n{code}\n```\n"
-        
-        new_content = pattern.sub(replacement, content)
-
-        # Regex to transform <div class="status-banner status-high-risk">...</div> text
-        # Regex to transform <div class="status-banner status-TYPE">...</div> text
-        banner_pattern = re.compile(r'<div class="status-banner (.*?)">(.*?)</div>', re.DOTALL)
-        
-        def banner_replacement(match):
-            banner_type = match.group(1).strip()
-            text = match.group(2).strip()
-            return f"\n\n[[STATUS_BANNER:{banner_type}:{text}]]\n\n"
-
-        new_content = banner_pattern.sub(banner_replacement, new_content)
-        
-        base = os.path.splitext(file_path)[0]
-        temp_path = f"{base}_processed.md"
-        
-        with open(temp_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        
-        return temp_path
-    except Exception as e:
-        print(f"Error preprocessing markdown: {e}")
-        return file_path
 
-@router.post("/convert/")
-async def convert_markdown_to_docx(file: UploadFile = File(...)):
-    if not file.filename.endswith(".md"):
-        raise HTTPException(status_code=400, detail="Only .md files are allowed")
+    def __init__(self):
+        # Decodes UTF-8 across chunk boundaries and normalizes \r\n like text-mode open()
+        self._decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder('utf-8')(),
+            translate=True
+        )
+        self._preprocessor = MarkdownPreprocessor()
+        self._parts = []
+        self._digest = hashlib.sha256()
+        # Time spent decoding, rewriting and hashing, as opposed to waiting for the upload
+        self.seconds = 0.0
+
+    def _emit(self, processed):
+        if processed:
+            self._parts.append(processed)
+            self._digest.update(processed.encode('utf-8'))
+
+    def feed(self, chunk: bytes):
+        started = time.perf_counter()
+        self._emit(self._preprocessor.feed(self._decoder.decode(chunk)))
+        self.seconds += time.perf_counter() - started
+
+    def close(self):
+        """Flushes the remaining text and returns the whole preprocessed document."""
+        started = time.perf_counter()
+        self._emit(self._preprocessor.feed(self._decoder.decode(b"", final=True)))
+        self._emit(self._preprocessor.close())
+        text = "".join(self._parts)
+        self.seconds += time.perf_counter() - started
+        return text
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+async def _read_markdown_upload(file: UploadFile):
+    """
+    Streams the upload through MarkdownStreamPreprocessor in fixed-size chunks.
+    Returns the preprocessed text and its SHA-256. Raises 413 past MAX_UPLOAD_BYTES.
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
 
-    request_id = str(uuid.uuid4())
-    input_path = UPLOAD_DIR / f"{request_id}_{file.filename}"
-    output_filename = f"{Path(file.filename).stem}.docx"
-    output_path = OUTPUT_DIR / f"{request_id}_{output_filename}"
-
-    # Save uploaded file
-    with open(input_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Preprocess
-    processed_path = preprocess_markdown(str(input_path))
-
-    # Puppeteer Config for Mermaid Filter
-    # We want a high density (scale factor) but we don't want a huge fixed viewport 
-    # that forces whitespace if the diagram is small.
-    puppeteer_config = {
-        "executablePath": "/usr/bin/google-chrome",
-        "args": ["--no-sandbox", "--disable-setuid-sandbox"],
-        # Render denser images to preserve sharpness after any post-processing.
-        "defaultViewport": {"width": 2200, "height": 1400, "deviceScaleFactor": 8}
+    preprocessor = MarkdownStreamPreprocessor()
+    received = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+            preprocessor.feed(chunk)
+        markdown_text = preprocessor.close()
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Markdown file must be UTF-8 encoded")
+    UPLOAD_BYTES.inc(received)
+    _observe_stages({
+        'upload': time.perf_counter() - started - preprocessor.seconds,
+        'preprocess': preprocessor.seconds,
+    })
+    return markdown_text, preprocessor.hexdigest()
+
+
+def _read_markdown_zip_entry(archive, info):
+    """Same as _read_markdown_upload for one member of an uploaded zip (blocking)."""
+    # file_size comes from the zip directory; the read loop below still enforces the limit
+    if info.file_size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+
+    preprocessor = MarkdownStreamPreprocessor()
+    received = 0
+    try:
+        with archive.open(info) as entry:
+            while True:
+                chunk = entry.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+                preprocessor.feed(chunk)
+        markdown_text = preprocessor.close()
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Markdown file must be UTF-8 encoded")
+    UPLOAD_BYTES.inc(received)
+    _observe_stages({'preprocess': preprocessor.seconds})
+    return markdown_text, preprocessor.hexdigest()
+
+# Puppeteer Config for Mermaid Filter
+# We want a high density (scale factor) but we don't want a huge fixed viewport 
+# that forces whitespace if the diagram is small.
+PUPPETEER_CONFIG = {
+    "executablePath": "/usr/bin/google-chrome",
+    "args": ["--no-sandbox", "--disable-setuid-sandbox"],
+    # Render denser images to preserve sharpness after any post-processing.
+    "defaultViewport": {"width": 2200, "height": 1400, "deviceScaleFactor": 8}
+}
+
+# Mermaid Config to improve quality (increase scale)
+MERMAID_CONFIG = {
+    "theme": "default", 
+    "startOnLoad": False,  
+    "themeVariables": {
+        "fontFamily": "Arial",
+        "fontSize": "22px"
+    },
+    "flowchart": {
+        "useMaxWidth": True, # Prevents massive SVGs that might break things, lets Mermaid manage width
+        "htmlLabels": True,
+        "curve": "cardinal"
+    },
+    "sequence": {
+         "useMaxWidth": True
+    }
+}
+
+MERMAID_FILTER_SCALE = "4"
+# mermaid-filter's default -w when a block doesn't set its own width
+MERMAID_FILTER_WIDTH = "800"
+
+# How diagrams rendered here are embedded:
+#   png - a bitmap at MERMAID_FILTER_SCALE (default)
+#   svg - the SVG itself, plus a PNG fallback at MD_TO_DOCX_DIAGRAM_FALLBACK_SCALE
+#         for readers older than Word 2016. Diagrams left to mermaid-filter stay PNG.
+DIAGRAM_FORMAT = os.environ.get("MD_TO_DOCX_DIAGRAM_FORMAT", "png")
+DIAGRAM_FALLBACK_SCALE = os.environ.get("MD_TO_DOCX_DIAGRAM_FALLBACK_SCALE", "2")
+VECTOR_DIAGRAMS = DIAGRAM_FORMAT == "svg"
+
+# Word draws SVG text but not the HTML labels (foreignObject) mermaid uses by default
+RENDER_MERMAID_CONFIG = MERMAID_CONFIG
+if VECTOR_DIAGRAMS:
+    RENDER_MERMAID_CONFIG = {
+        **MERMAID_CONFIG,
+        "htmlLabels": False,
+        "flowchart": {**MERMAID_CONFIG["flowchart"], "htmlLabels": False},
     }
-    import json
+
+# Bump whenever post-processing changes the DOCX it produces, so old cache entries stop matching
+RESULT_CACHE_VERSION = "4"
+
+# Named style profiles (style_profiles.PROFILES plus any from a JSON file), each compiled
+# once into its own reference document; clients pick one with ?profile=
+STYLE_PROFILES = load_profiles(os.environ.get("MD_TO_DOCX_STYLE_PROFILES"))
+DEFAULT_STYLE_PROFILE = os.environ.get("MD_TO_DOCX_STYLE_PROFILE", "default")
+if DEFAULT_STYLE_PROFILE not in STYLE_PROFILES:
+    raise ValueError(f"MD_TO_DOCX_STYLE_PROFILE names an unknown profile: {DEFAULT_STYLE_PROFILE}")
+
+REFERENCE_DOCS = ReferenceDocCache(
+    Path(os.environ.get("MD_TO_DOCX_REFERENCE_CACHE_DIR", "./tmp/cache/references")),
+    STYLE_PROFILES
+)
+
+RESULT_CACHE = ResultCache(
+    Path(os.environ.get("MD_TO_DOCX_CACHE_DIR", "./tmp/cache/results")),
+    max_bytes=int(os.environ.get("MD_TO_DOCX_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+)
+
+
+# How diagrams get rendered before pandoc runs:
+#   pool   - warm Chrome pages kept alive by mermaid_render_server.js (default)
+#   cli    - one mermaid-cli run per diagram
+#   stub   - Pillow placeholder images, no browser (tests / benchmarks)
+#   filter - don't render here at all, leave every block to -F mermaid-filter
+# Whatever the renderer can't handle falls back to mermaid-filter inside pandoc.
+MERMAID_RENDERER_KIND = os.environ.get("MD_TO_DOCX_MERMAID_RENDERER", "pool")
+
+DIAGRAM_CACHE = DiagramCache(
+    Path(os.environ.get("MD_TO_DOCX_DIAGRAM_CACHE_DIR", "./tmp/cache/diagrams")),
+    max_bytes=int(os.environ.get("MD_TO_DOCX_DIAGRAM_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    render_settings=json.dumps(
+        [MERMAID_RENDERER_KIND, RENDER_MERMAID_CONFIG, PUPPETEER_CONFIG, MERMAID_FILTER_SCALE, MERMAID_FILTER_WIDTH,
+         DIAGRAM_FORMAT, DIAGRAM_FALLBACK_SCALE, TRIM_MIN_SAVINGS],
+        sort_keys=True
+    )
+)
+
+# Fenced blocks as written by preprocess_markdown_text (or by hand in the source)
+MERMAID_BLOCK_PATTERN = re.compile(r'^```mermaid[ \t]*\n(.*?)\n```[ \t]*$', re.MULTILINE | re.DOTALL)
+
+# Global npm modules of the mermaid-filter install, where puppeteer and mermaid live
+MERMAID_NODE_PATH = os.pathsep.join([
+    "/usr/local/lib/node_modules/mermaid-filter/node_modules",
+    "/usr/local/lib/node_modules",
+    "/usr/lib/node_modules/mermaid-filter/node_modules",
+    "/usr/lib/node_modules",
+])
+
+# Diagrams of one document rendered at the same time (the pool renderer queues
+# anything beyond MD_TO_DOCX_BROWSER_PAGES inside the browser helper)
+DIAGRAM_RENDER_WORKERS = int(os.environ.get("MD_TO_DOCX_DIAGRAM_WORKERS", "4"))
+
+_mermaid_renderer = None
+_mermaid_renderer_lock = threading.Lock()
+
+
+def _find_mermaid_cli():
+    # mmdc ships inside the global mermaid-filter install; it's what the filter itself calls
+    candidates = [
+        os.environ.get("MD_TO_DOCX_MMDC"),
+        shutil.which("mmdc"),
+        "/usr/local/lib/node_modules/mermaid-filter/node_modules/.bin/mmdc",
+        "/usr/lib/node_modules/mermaid-filter/node_modules/.bin/mmdc",
+    ]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _create_mermaid_renderer():
+    width = int(MERMAID_FILTER_WIDTH)
+    scale = int(MERMAID_FILTER_SCALE)
+    vector_options = {"vector": VECTOR_DIAGRAMS, "fallback_scale": int(DIAGRAM_FALLBACK_SCALE)}
+    if MERMAID_RENDERER_KIND == "pool":
+        return BrowserPoolRenderer(
+            launch_options=PUPPETEER_CONFIG,
+            mermaid_config=RENDER_MERMAID_CONFIG,
+            width=width,
+            scale=scale,
+            pool_size=int(os.environ.get("MD_TO_DOCX_BROWSER_PAGES", "4")),
+            recycle_after=int(os.environ.get("MD_TO_DOCX_BROWSER_RECYCLE_AFTER", "50")),
+            node_path=os.environ.get("MD_TO_DOCX_NODE_PATH", MERMAID_NODE_PATH),
+            **vector_options
+        )
+    if MERMAID_RENDERER_KIND == "cli":
+        mmdc = _find_mermaid_cli()
+        if mmdc is not None:
+            return MermaidCliRenderer(mmdc, PUPPETEER_CONFIG, RENDER_MERMAID_CONFIG, width=width, scale=scale, **vector_options)
+    if MERMAID_RENDERER_KIND == "stub":
+        return StubRenderer(width=width, scale=scale, **vector_options)
+    return None
+
+
+def _get_mermaid_renderer():
+    global _mermaid_renderer
+    with _mermaid_renderer_lock:
+        if _mermaid_renderer is None:
+            _mermaid_renderer = _create_mermaid_renderer()
+        return _mermaid_renderer
+
+
+def _close_mermaid_renderer():
+    global _mermaid_renderer
+    with _mermaid_renderer_lock:
+        if _mermaid_renderer is not None:
+            _mermaid_renderer.close()
+            _mermaid_renderer = None
+
+
+atexit.register(_close_mermaid_renderer)
+
+
+def _render_diagram_to_cache(renderer, key, source, render_dir: Path):
+    """Renders, trims and caches one diagram. Returns its image path in render_dir, or None on failure."""
+    try:
+        png = renderer.render(source)
+    except MermaidRenderError as error:
+        print(f"Diagram render failed, leaving it to mermaid-filter: {error}")
+        return None
+    rendered_path = render_dir / f"{key}.png"
+    rendered_path.write_bytes(png)
+    if not VECTOR_DIAGRAMS:
+        # A trimmed fallback would no longer match its SVG's box; mermaid's SVG is tight anyway
+        _trim_image_file(rendered_path)
+    # The document keeps pointing at this private copy: the cached entry may be
+    # evicted (even by this very put) before pandoc reads it
+    DIAGRAM_CACHE.put(key, rendered_path)
+    return rendered_path
+
+
+def _render_mermaid_blocks(markdown_text, render_dir: Path):
+    """
+    Replaces every mermaid block with an image reference. All blocks are collected
+    first, cache misses are rendered concurrently, then the text is rewritten in a
+    single pass, so wall-clock time follows the slowest diagram instead of the sum.
+    Blocks that can't be rendered here are left in place for mermaid-filter to
+    handle inside pandoc.
+    """
+    sources = {}
+    for match in MERMAID_BLOCK_PATTERN.finditer(markdown_text):
+        # Identical diagrams within a document are rendered once
+        sources.setdefault(DIAGRAM_CACHE.key_for(match.group(1)), match.group(1))
+    if not sources:
+        return markdown_text
+
+    image_paths = {}
+    misses = {}
+    for key, source in sources.items():
+        cached_path = DIAGRAM_CACHE.fetch(key, render_dir / f"{key}.png")
+        if cached_path is None:
+            misses[key] = source
+        else:
+            image_paths[key] = cached_path
+
+    renderer = _get_mermaid_renderer()
+    if misses and renderer is not None:
+        workers = max(1, min(DIAGRAM_RENDER_WORKERS, len(misses)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mermaid-render") as executor:
+            futures = {
+                key: executor.submit(_render_diagram_to_cache, renderer, key, source, render_dir)
+                for key, source in misses.items()
+            }
+        for key, future in futures.items():
+            rendered_path = future.result()
+            if rendered_path is not None:
+                image_paths[key] = rendered_path
+
+    def replacement(match):
+        image_path = image_paths.get(DIAGRAM_CACHE.key_for(match.group(1)))
+        if image_path is None:
+            return match.group(0)
+        return f"![](<{Path(image_path).resolve().as_posix()}>)"
+
+    return MERMAID_BLOCK_PATTERN.sub(replacement, markdown_text)
+
+
+# Lua filters pandoc runs, in order. filter_table_style.lua sets the table style and
+# emphasizes header rows; filter_status_banner.lua turns banner markers into styled paragraphs.
+LUA_FILTERS = ["filter_table_style.lua", "filter_status_banner.lua"]
+
+
+def _find_lua_filters():
+    filter_paths = []
+    for filter_name in LUA_FILTERS:
+        filter_path = Path("md-to-docx") / filter_name
+        if not filter_path.exists():
+            filter_path = Path(filter_name) # if in cwd
+        if not filter_path.exists():
+            filter_path = Path(__file__).resolve().parent / filter_name
+        if filter_path.exists():
+            filter_paths.append(filter_path)
+    return filter_paths
+
+
+def _find_reference_doc():
+    # Check for reference doc in current dir (where app is running) or md-to-docx folder
+    ref_doc_name = "reference.docx"
+    ref_doc_path = Path(ref_doc_name)
+    if not ref_doc_path.exists():
+         # Check inside md-to-docx folder relative to current working directory
+         possible_path = Path("md-to-docx") / ref_doc_name
+         if possible_path.exists():
+             ref_doc_path = possible_path
+    return ref_doc_path if ref_doc_path.exists() else None
+
+
+def _reference_doc_for(profile):
+    """Reference document pandoc gets for a style profile, compiled on first use."""
+    base_path = _find_reference_doc()
+    return REFERENCE_DOCS.get(profile, base_path, _file_digest(base_path))
+
+
+def compile_reference_docs():
+    """Compiles every style profile up front (at app startup) so no request pays for it."""
+    for profile in STYLE_PROFILES:
+        try:
+            _reference_doc_for(profile)
+        except Exception as error:
+            # Compiled again on first use; the conversion will report the problem then
+            print(f"Style profile '{profile}' could not be compiled: {error}")
+
+
+def _resolve_profile(profile):
+    if profile is None:
+        return DEFAULT_STYLE_PROFILE
+    if profile not in STYLE_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown style profile '{profile}'; available: {', '.join(sorted(STYLE_PROFILES))}"
+        )
+    return profile
+
+
+@lru_cache(maxsize=32)
+def _cached_file_digest(path_str, mtime_ns, size):
+    return hash_parts(Path(path_str).read_bytes())
+
+
+def _file_digest(path):
+    if path is None:
+        return ""
+    stat = path.stat()
+    return _cached_file_digest(str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+
+
+def _conversion_cache_key(markdown_digest, profile=DEFAULT_STYLE_PROFILE):
+    """
+    Cache key for a conversion: everything that can change the DOCX pandoc and
+    the post-processing produce for this input.
+    markdown_digest is the SHA-256 of the preprocessed Markdown.
+    """
+    return hash_parts(
+        RESULT_CACHE_VERSION,
+        markdown_digest,
+        REFERENCE_DOCS.digest(profile, _file_digest(_find_reference_doc())),
+        *[f"{filter_path.name}:{_file_digest(filter_path)}" for filter_path in _find_lua_filters()],
+        json.dumps(PUPPETEER_CONFIG, sort_keys=True),
+        # mermaid-filter draws with MERMAID_CONFIG, the renderer with RENDER_MERMAID_CONFIG
+        json.dumps(MERMAID_CONFIG, sort_keys=True),
+        json.dumps(RENDER_MERMAID_CONFIG, sort_keys=True),
+        MERMAID_RENDERER_KIND,
+        MERMAID_FILTER_SCALE,
+        MERMAID_FILTER_WIDTH,
+        DIAGRAM_FORMAT,
+        DIAGRAM_FALLBACK_SCALE,
+        # The media stage trims and downsamples embedded images by these
+        json.dumps([IMAGE_DPI, IMAGE_MAX_BYTES, IMAGE_OPTIMIZE, TRIM_MIN_SAVINGS]),
+    )
+
+
+def _prepare_workspace():
+    """
+    Creates a private scratch directory for one conversion, holding the config files
+    mermaid-filter reads from its CWD, so concurrent conversions never share them.
+    """
+    workspace = Path(tempfile.mkdtemp(prefix="conversion_", dir=WORK_DIR)).resolve()
+
     # mermaid-filter expects .puppeteer.json in CWD
-    config_path = Path(".puppeteer.json")
-    with open(config_path, "w") as f:
-        json.dump(puppeteer_config, f)
+    with open(workspace / ".puppeteer.json", "w") as f:
+        json.dump(PUPPETEER_CONFIG, f)
 
-    # Mermaid Config to improve quality (increase scale)
-    # mermaid-filter looks for .mermaid-config.json in CWD
-    mermaid_config = {
-        "theme": "default", 
-        "startOnLoad": False,  
-        "themeVariables": {
-            "fontFamily": "Arial",
-            "fontSize": "22px"
-        },
-        "flowchart": {
-            "useMaxWidth": True, # Prevents massive SVGs that might break things, lets Mermaid manage width
-            "htmlLabels": True,
-            "curve": "cardinal"
-        },
-        "sequence": {
-             "useMaxWidth": True
-        }
-    }
     # Also we can set puppeterr options often in the same place or separate
     # But usually mermaid-filter has a separate mechanism for scale.
     # It seems mermaid-filter 1.4.x might determine scale via puppeteer viewport or explicit args?
     # Actually, recent versions respecting --width or similar in the code block, 
     # but global settings are in .mermaid-filter.json? No, it's .puppeteer.json usually acting as the bridge.
-    # Let's try creating a .mermaid-config.json
-    mermaid_conf_path = Path(".mermaid-config.json")
-    with open(mermaid_conf_path, "w") as f:
-        json.dump(mermaid_config, f)
-
-    # Convert using Pandoc
-    # Command: pandoc input.md -o output.docx -F mermaid-filter --reference-doc=reference.docx (if exists)
-    # We add --verbose to see mermaid-filter logs
-    # filter_table_style.lua forces 'TableGrid' style on all tables
-    filter_style_path = Path("md-to-docx/filter_table_style.lua")
-    if not filter_style_path.exists():
-        filter_style_path = Path("filter_table_style.lua") # if in cwd
-
-    cmd = [
-        "pandoc",
-        "-f", "gfm+raw_html",
-        processed_path,
-        "-o", str(output_path),
-        "-F", "mermaid-filter",
-        "--verbose"
-    ]
-    
-    if filter_style_path.exists():
-         cmd.extend(["--lua-filter", str(filter_style_path)])
+    # mermaid-filter looks for .mermaid-config.json in CWD
+    with open(workspace / ".mermaid-config.json", "w") as f:
+        json.dump(MERMAID_CONFIG, f)
 
+    return workspace
+
+
+def _run_conversion(markdown_text, output_path: Path, on_stage=None, workspace: Path = None,
+                    profile=DEFAULT_STYLE_PROFILE, target=None):
+    """
+    Blocking part of a conversion: diagrams, pandoc (styled by the profile's
+    reference document) and post-processing.
+    Runs on CONVERSION_POOL inside its own workspace (or a shared one prepared by
+    the caller, e.g. for a batch) and returns the time spent in each stage (see
+    CONVERSION_STAGES), reporting each to on_stage as it ends.
+    The DOCX is written to output_path, or into target (a writable binary file, e.g.
+    a spooled buffer) when given, in which case output_path is unused and pandoc's
+    intermediate output stays in the workspace.
+    """
     # Remove MERMAID_FILTER env vars that interfere with manual config
-    # We rely on the config files above.
+    # We rely on the config files in the workspace.
     env = os.environ.copy()
-    env["MERMAID_FILTER_SCALE"] = "4"
+    env["MERMAID_FILTER_SCALE"] = MERMAID_FILTER_SCALE
     # env["MERMAID_FILTER_WIDTH"] = "900" # Let it flow naturally
-    
-    # Check for reference doc in current dir (where app is running) or md-to-docx folder
-    ref_doc_name = "reference.docx"
-    ref_doc_path = Path(ref_doc_name)
-    if not ref_doc_path.exists():
-         # Check inside md-to-docx folder relative to current working directory
-         possible_path = Path("md-to-docx") / ref_doc_name
-         if possible_path.exists():
-             ref_doc_path = possible_path
-    
-    if ref_doc_path.exists():
-        cmd.extend(["--reference-doc", str(ref_doc_path)])
 
+    owns_workspace = workspace is None
+    if owns_workspace:
+        workspace = _prepare_workspace()
+    # Diagrams get a directory per conversion even in a shared workspace
+    render_dir = Path(tempfile.mkdtemp(prefix="diagrams_", dir=workspace))
+    pandoc_path = output_path if target is None else render_dir / "pandoc.docx"
     try:
-        # We need to run this where the puppeteer config is visible if mermaid-filter looks for it in CWD
-        subprocess.run(cmd, check=True, cwd=os.getcwd(), env=env)
-        _enforce_table_borders(output_path)
-    except subprocess.CalledProcessError as e:
-        raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
+        # Diagrams already in the cache (or renderable here) skip mermaid-filter entirely
+        started = time.perf_counter()
+        rendered_text = _render_mermaid_blocks(markdown_text, render_dir)
+        pre_timings = {'diagrams': time.perf_counter() - started}
+        if on_stage is not None:
+            on_stage('diagrams', pre_timings['diagrams'])
+
+        # Convert using Pandoc
+        # Command: pandoc input.md -o output.docx -F mermaid-filter --reference-doc=reference.docx (if exists)
+        # We add --verbose to see mermaid-filter logs
+        # The Markdown goes in on stdin; paths are absolute because pandoc runs inside the workspace
+        cmd = [
+            "pandoc",
+            "-f", "gfm+raw_html",
+            "-o", str(pandoc_path.resolve()),
+        ]
+        # Only pay for the filter's own Chrome start when some diagrams are still unrendered
+        if MERMAID_BLOCK_PATTERN.search(rendered_text):
+            cmd.extend(["-F", "mermaid-filter"])
+        cmd.append("--verbose")
+        # Relative image links keep resolving against the service's working directory,
+        # as they did before pandoc moved into the workspace
+        cmd.extend(["--resource-path", os.pathsep.join([str(Path.cwd()), str(workspace)])])
+
+        for filter_path in _find_lua_filters():
+            cmd.extend(["--lua-filter", str(filter_path.resolve())])
+
+        # Styles come from the profile's compiled reference doc, not a pass over the output
+        cmd.extend(["--reference-doc", str(_reference_doc_for(profile).resolve())])
+
+        # mermaid-filter picks up the puppeteer/mermaid configs from its CWD: the workspace
+        started = time.perf_counter()
+        subprocess.run(cmd, input=rendered_text, encoding='utf-8', check=True, cwd=workspace, env=env)
+        pre_timings['pandoc'] = time.perf_counter() - started
+        if on_stage is not None:
+            on_stage('pandoc', pre_timings['pandoc'])
+        return {**pre_timings, **_postprocess_docx(pandoc_path, on_stage, target)}
     finally:
-        # Cleanup input files
-        if os.path.exists(input_path):
-            os.remove(input_path)
-            if input_path != Path(processed_path) and os.path.exists(processed_path):
-                 os.remove(processed_path)
+        shutil.rmtree(workspace if owns_workspace else render_dir, ignore_errors=True)
+
+
+# Every stage a conversion reports, in order; job progress is measured against it
+CONVERSION_STAGES = ['diagrams', 'pandoc', 'load'] + [name for name, _stage in POSTPROCESS_STAGES] + ['save']
+
+
+def _run_conversion_job(markdown_text, output_path: Path, cache_key, on_stage=None, profile=DEFAULT_STYLE_PROFILE):
+    """Background-job variant of a conversion: also stores the result in RESULT_CACHE."""
+    timings = _run_conversion(markdown_text, output_path, on_stage, profile=profile)
+    RESULT_CACHE.put(cache_key, output_path)
+    return timings
+
+
+# Metrics served by main.py at /metrics. Conversions hand their stage timings back to
+# this process, so stages are recorded here whichever kind of pool ran them.
+STAGE_SECONDS = REGISTRY.histogram(
+    "md_to_docx_stage_seconds",
+    "Time spent in each stage: upload, preprocess, the conversion stages and sending the response.",
+    ("stage",)
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "md_to_docx_request_seconds",
+    "Conversion request latency, from the handler starting until the response is sent.",
+    ("endpoint",)
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "md_to_docx_requests_in_flight",
+    "Conversion requests being handled, including ones still sending their response.",
+    ("endpoint",)
+)
+CONVERSIONS = REGISTRY.counter(
+    "md_to_docx_conversions_total",
+    "Conversions by endpoint and outcome (converted, cached, queued, rejected, failed).",
+    ("endpoint", "outcome")
+)
+UPLOAD_BYTES = REGISTRY.counter("md_to_docx_upload_bytes_total", "Markdown bytes received, before preprocessing.")
+
+
+def _observe_stages(timings):
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def _failure_outcome(error):
+    # Client errors and a full pool or queue are turned away; anything else broke
+    if isinstance(error, HTTPException) and (error.status_code < 500 or error.status_code == 503):
+        return "rejected"
+    return "failed"
+
+
+def _tracked(endpoint):
+    """
+    Decorator for conversion endpoints: counts the request in flight until its
+    response has been sent, and records the request latency, the time spent sending
+    the response, and failures.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
 
+            def finished():
+                REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+                REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+            try:
+                response = await handler(*args, **kwargs)
+            except BaseException as error:
+                CONVERSIONS.inc(endpoint=endpoint, outcome=_failure_outcome(error))
+                finished()
+                raise
+            if not isinstance(response, Response):
+                finished()
+                return response
+
+            # Background tasks run once the body is out, which ends the response stage
+            response_started = time.perf_counter()
+
+            def sent():
+                STAGE_SECONDS.observe(time.perf_counter() - response_started, stage="response")
+                finished()
+
+            tasks = [BackgroundTask(sent)]
+            if response.background is not None:
+                tasks.append(response.background)
+            response.background = BackgroundTasks(tasks)
+            return response
+        return wrapper
+    return decorator
+
+
+@REGISTRY.collector
+def _queue_and_cache_metrics():
+    pool = CONVERSION_POOL.stats()
+    jobs = JOB_MANAGER.stats()
+    families = [
+        ("md_to_docx_pool_workers", "gauge", "Conversions the worker pool runs at once.",
+         {(): pool["max_workers"]}),
+        ("md_to_docx_pool_conversions", "gauge", "Conversions on the worker pool, running or waiting for a slot.",
+         {(("state", "running"),): pool["running"], (("state", "queued"),): pool["queued"]}),
+        ("md_to_docx_jobs", "gauge", "Background jobs held, by status.",
+         {(("status", status),): jobs[status] for status in ("queued", "running", "done", "failed")}),
+    ]
+    disk = OUTPUT_JANITOR.stats()
+    families.append(("md_to_docx_disk_bytes", "gauge", "Bytes held by finished outputs and scratch workspaces.",
+                     {(("area", area),): disk[area]["bytes"] for area in ("outputs", "work")}))
+    families.append(("md_to_docx_disk_entries", "gauge", "Files and workspaces in each scratch area.",
+                     {(("area", area),): disk[area]["entries"] for area in ("outputs", "work")}))
+    if disk["enabled"]:
+        families.append(("md_to_docx_janitor_removed_total", "counter", "Stale outputs and workspaces removed, by reason.",
+                         {(("reason", reason),): count for reason, count in disk["removed"].items()}))
+        families.append(("md_to_docx_janitor_removed_bytes_total", "counter", "Bytes freed by the janitor.",
+                         {(): disk["removed_bytes"]}))
+    caches = {"result": RESULT_CACHE.stats(), "diagram": DIAGRAM_CACHE.stats()}
+    enabled = {name: stats for name, stats in caches.items() if stats["enabled"]}
+    if enabled:
+        families.append(("md_to_docx_cache_bytes", "gauge", "Bytes held by each on-disk cache.",
+                         {(("cache", name),): stats["bytes"] for name, stats in enabled.items()}))
+        families.append(("md_to_docx_cache_entries", "gauge", "Entries held by each on-disk cache.",
+                         {(("cache", name),): stats["entries"] for name, stats in enabled.items()}))
+    if "hits" in caches["diagram"]:
+        families.append(("md_to_docx_diagram_cache_requests_total", "counter", "Diagram cache lookups by result.",
+                         {(("result", "hit"),): caches["diagram"]["hits"],
+                          (("result", "miss"),): caches["diagram"]["misses"]}))
+    return families
+
+
+def _job_done(job):
+    """JOB_MANAGER completion hook: records the finished job's stages and outcome."""
+    if job["status"] == "done":
+        _observe_stages(job["stages"])
+        CONVERSIONS.inc(endpoint="jobs", outcome="converted")
+    else:
+        CONVERSIONS.inc(endpoint="jobs", outcome="failed")
+
+
+def render_metrics():
+    """Every md-to-docx metric in the Prometheus text format, for main.py's /metrics."""
+    return REGISTRY.render()
+
+
+def _expire_job(job):
+    # Cache hits are the job's own link to the entry, so the cache keeps its copy
+    if job.get("output_path"):
+        Path(job["output_path"]).unlink(missing_ok=True)
+
+
+# Background conversions for the /jobs endpoints, sharing CONVERSION_POOL with /convert/.
+# main.py starts and stops its workers with the app.
+JOB_MANAGER = job_manager_from_env(CONVERSION_POOL, on_expire=_expire_job, on_done=_job_done)
+
+# Outputs whose response is still being sent; the janitor leaves them alone
+_STREAMING_OUTPUTS = set()
+_STREAMING_OUTPUTS_LOCK = threading.Lock()
+
+
+def _hold_output(path: Path):
+    with _STREAMING_OUTPUTS_LOCK:
+        _STREAMING_OUTPUTS.add(path)
+
+
+def _release_output(path: Path):
+    """Deletes an output once its response is sent, or its conversion failed."""
+    with _STREAMING_OUTPUTS_LOCK:
+        _STREAMING_OUTPUTS.discard(path)
+    # The result cache holds its own link to the file, so its entry survives this
+    path.unlink(missing_ok=True)
+
+
+def _outputs_in_use():
+    # Expired jobs remove their own outputs first; the rest are kept for their ttl
+    JOB_MANAGER.prune()
+    with _STREAMING_OUTPUTS_LOCK:
+        streaming = list(_STREAMING_OUTPUTS)
+    return streaming + JOB_MANAGER.output_paths()
+
+
+# Clears outputs and workspaces that nothing released (crashes, abandoned jobs) and
+# keeps OUTPUT_DIR under its size quota. main.py starts and stops it with the app.
+OUTPUT_JANITOR = janitor_from_env(OUTPUT_DIR, WORK_DIR, in_use=_outputs_in_use)
+
+
+DOCX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+def _spool():
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, dir=WORK_DIR)
+
+
+def _spooled_response(buffer, filename, media_type, headers):
+    """Streams a spooled buffer from its start as an attachment and closes it once sent."""
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+    # Same Content-Disposition FileResponse sends
+    quoted = quote(filename)
+    if quoted != filename:
+        disposition = f"attachment; filename*=utf-8''{quoted}"
+    else:
+        disposition = f'attachment; filename="{filename}"'
+    return StreamingResponse(
+        iter(lambda: buffer.read(RESPONSE_CHUNK_SIZE), b""),
+        media_type=media_type,
+        headers={"Content-Disposition": disposition, "Content-Length": str(size), **headers},
+        background=BackgroundTask(buffer.close)
+    )
+
+
+@router.post("/convert/")
+@_tracked("convert")
+async def convert_markdown_to_docx(file: UploadFile = File(...), profile: Optional[str] = Query(None)):
+    if not file.filename.endswith(".md"):
+        raise HTTPException(status_code=400, detail="Only .md files are allowed")
+    profile = _resolve_profile(profile)
+
+    output_filename = f"{Path(file.filename).stem}.docx"
+
+    # Stream, preprocess and hash the upload in one go
+    markdown_text, markdown_digest = await _read_markdown_upload(file)
+
+    cache_key = await run_in_threadpool(_conversion_cache_key, markdown_digest, profile)
+    # Served from a private link to the cache entry, which an eviction can't pull away
+    # mid-response; the pool isn't involved at all
+    cached_path = OUTPUT_DIR / f"{uuid.uuid4()}_{output_filename}"
+    _hold_output(cached_path)
+    if await run_in_threadpool(RESULT_CACHE.fetch, cache_key, cached_path) is None:
+        _release_output(cached_path)
+    else:
+        CONVERSIONS.inc(endpoint="convert", outcome="cached")
+        return FileResponse(
+            path=cached_path,
+            filename=output_filename,
+            media_type=DOCX_MEDIA_TYPE,
+            headers={"X-Cache": "HIT"},
+            background=BackgroundTask(_release_output, cached_path)
+        )
+
+    if STREAM_CONVERSIONS:
+        output_path = None
+        buffer = _spool()
+    else:
+        output_path = OUTPUT_DIR / f"{uuid.uuid4()}_{output_filename}"
+        buffer = None
+        _hold_output(output_path)
+    try:
+        try:
+            timings = await CONVERSION_POOL.run(
+                _run_conversion, markdown_text, output_path, None, None, profile, buffer
+            )
+        except PoolSaturatedError as e:
+            raise HTTPException(
+                status_code=503,
+                detail="Conversion service is busy, please retry later",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except subprocess.CalledProcessError as e:
+            raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
+        _observe_stages(timings)
+        CONVERSIONS.inc(endpoint="convert", outcome="converted")
+
+        if buffer is not None:
+            await run_in_threadpool(RESULT_CACHE.put_file, cache_key, buffer)
+        else:
+            await run_in_threadpool(RESULT_CACHE.put, cache_key, output_path)
+    except BaseException:
+        if buffer is not None:
+            buffer.close()
+        else:
+            # pandoc may have written a partial output before the failure
+            _release_output(output_path)
+        raise
+
+    headers = {"Server-Timing": _server_timing_header(timings), "X-Cache": "MISS"}
+    if buffer is not None:
+        return _spooled_response(buffer, output_filename, DOCX_MEDIA_TYPE, headers)
     return FileResponse(
         path=output_path, 
         filename=output_filename, 
-        media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        media_type=DOCX_MEDIA_TYPE,
+        headers=headers,
+        background=BackgroundTask(_release_output, output_path)
     )
 
+@router.post("/jobs", status_code=202)
+@_tracked("jobs")
+async def create_conversion_job(file: UploadFile = File(...), profile: Optional[str] = Query(None)):
+    """Queues a conversion and returns its job id straight away; poll GET /jobs/{id}."""
+    if not file.filename.endswith(".md"):
+        raise HTTPException(status_code=400, detail="Only .md files are allowed")
+    profile = _resolve_profile(profile)
+
+    output_filename = f"{Path(file.filename).stem}.docx"
+    markdown_text, markdown_digest = await _read_markdown_upload(file)
+    cache_key = await run_in_threadpool(_conversion_cache_key, markdown_digest, profile)
+
+    job = JOB_MANAGER.create(filename=output_filename, output_path=None, cached=False)
+    job_id = job["id"]
+    output_path = OUTPUT_DIR / f"{job_id}_{output_filename}"
+    JOB_MANAGER.update(job_id, output_path=str(output_path))
+    # A hit becomes the job's own link to the entry, kept until the job expires
+    if await run_in_threadpool(RESULT_CACHE.fetch, cache_key, output_path) is not None:
+        JOB_MANAGER.finish(job_id, output_path=str(output_path), cached=True)
+        CONVERSIONS.inc(endpoint="jobs", outcome="cached")
+        return _job_status(JOB_MANAGER.get(job_id))
+
+    # Progress callbacks can't cross a process boundary; process pools report at the end
+    on_stage = None
+    if CONVERSION_POOL.kind == "thread":
+        on_stage = lambda stage, seconds: JOB_MANAGER.stage_done(job_id, stage, seconds)
+    try:
+        await JOB_MANAGER.submit(job_id, _run_conversion_job, markdown_text, output_path, cache_key, on_stage, profile)
+    except JobQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue is full, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    CONVERSIONS.inc(endpoint="jobs", outcome="queued")
+    return _job_status(JOB_MANAGER.get(job_id))
+
+
+def _job_status(job):
+    """Public view of a job record: status, current stage and per-stage timings."""
+    stages = job["stages"]
+    current = None
+    if job["status"] == "running":
+        current = next((name for name in CONVERSION_STAGES if name not in stages), None)
+    completed = sum(1 for name in CONVERSION_STAGES if name in stages)
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "stage": current,
+        "progress": 1.0 if job["status"] == "done" else round(completed / len(CONVERSION_STAGES), 3),
+        "stages": {name: round(seconds * 1000, 1) for name, seconds in stages.items()},
+        "cached": job["cached"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "result_url": f"{router.prefix}/jobs/{job['id']}/result" if job["status"] == "done" else None,
+    }
+
+
+@router.get("/jobs/{job_id}")
+def get_conversion_job(job_id: str):
+    job = JOB_MANAGER.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return _job_status(job)
+
+
+@router.get("/jobs/{job_id}/result")
+def get_conversion_job_result(job_id: str):
+    job = JOB_MANAGER.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=409, detail=f"Conversion failed: {job['error']}")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    output_path = Path(job["output_path"])
+    if not output_path.exists():
+        raise HTTPException(status_code=410, detail="Job result is no longer available")
+    return FileResponse(
+        path=output_path,
+        filename=job["filename"],
+        media_type=DOCX_MEDIA_TYPE,
+        headers={
+            "Server-Timing": _server_timing_header(job["stages"]),
+            "X-Cache": "HIT" if job["cached"] else "MISS",
+        }
+    )
+
+
+def _batch_output_name(source_name, used_names):
+    """DOCX name inside the batch zip: the source's relative path, made unique."""
+    parts = [part for part in Path(source_name.replace("\\", "/")).parts if part not in ("", ".", "..", "/")]
+    stem = Path(*parts).with_suffix("") if parts else Path("document")
+    candidate = f"{stem.as_posix()}.docx"
+    counter = 2
+    while candidate in used_names:
+        candidate = f"{stem.as_posix()}_{counter}.docx"
+        counter += 1
+    used_names.add(candidate)
+    return candidate
+
+
+def _check_batch_limits(files, size):
+    if files > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"A batch may hold at most {MAX_BATCH_FILES} files")
+    if size > MAX_BATCH_BYTES:
+        raise HTTPException(status_code=413, detail=f"A batch may hold at most {MAX_BATCH_BYTES} bytes of Markdown")
+
+
+def _read_batch_zip(file, name, accepted_files, accepted_bytes):
+    """
+    Reads every .md member of one uploaded zip (blocking). The member count and the
+    uncompressed sizes from the zip directory are checked against what the batch
+    can still take before anything is decompressed; zipfile never reads a member
+    past its recorded size. Returns the source entries and the bytes they hold.
+    """
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        return [(name, None, None, "Not a valid zip file")], 0
+    with archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(".md")
+            and not Path(info.filename).name.startswith(".")
+        ]
+        # Members over MAX_UPLOAD_BYTES are refused one by one without being read
+        size = sum(info.file_size for info in members if info.file_size <= MAX_UPLOAD_BYTES)
+        _check_batch_limits(accepted_files + len(members), accepted_bytes + size)
+        sources = []
+        for info in members:
+            try:
+                text, digest = _read_markdown_zip_entry(archive, info)
+                sources.append((info.filename, text, digest, None))
+            except HTTPException as e:
+                sources.append((info.filename, None, None, e.detail))
+    return sources, size
+
+
+async def _collect_batch_sources(files):
+    """
+    Expands the uploads into (source name, markdown text, digest, error) entries:
+    .md files are read directly, .zip files contribute every .md member.
+    Problems with one file become its error instead of failing the batch, while
+    going over MAX_BATCH_FILES or MAX_BATCH_BYTES rejects the whole request.
+    """
+    sources = []
+    total_bytes = 0
+    for file in files:
+        name = file.filename or "upload"
+        if name.lower().endswith(".zip"):
+            members, size = await run_in_threadpool(_read_batch_zip, file.file, name, len(sources), total_bytes)
+            sources.extend(members)
+            total_bytes += size
+        elif name.endswith(".md"):
+            _check_batch_limits(len(sources) + 1, total_bytes + (file.size or 0))
+            try:
+                text, digest = await _read_markdown_upload(file)
+                sources.append((name, text, digest, None))
+            except HTTPException as e:
+                sources.append((name, None, None, e.detail))
+                continue
+            total_bytes += file.size if file.size is not None else len(text.encode("utf-8"))
+            _check_batch_limits(len(sources), total_bytes)
+        else:
+            sources.append((name, None, None, "Only .md and .zip files are allowed"))
+    return sources
+
+
+async def _convert_batch_entry(entry, markdown_text, digest, workspace: Path, profile):
+    """Converts one batch member (or serves it from the cache) and fills in its manifest entry."""
+    cache_key = await run_in_threadpool(_conversion_cache_key, digest, profile)
+    output_path = workspace / f"{uuid.uuid4().hex}.docx"
+    # Linked into the workspace, so an eviction can't remove it before it is zipped
+    cached_path = await run_in_threadpool(RESULT_CACHE.fetch, cache_key, output_path)
+    if cached_path is not None:
+        entry.update(status="ok", cached=True, path=cached_path)
+        CONVERSIONS.inc(endpoint="batch", outcome="cached")
+        return
+
+    try:
+        # Members were accepted with the batch, so they wait for slots instead of failing with 503
+        timings = await CONVERSION_POOL.run_waiting(
+            _run_conversion, markdown_text, output_path, None, workspace, profile
+        )
+    except Exception as e:
+        # One broken document shouldn't take the rest of the batch down with it
+        print(f"Batch member {entry['source']} failed: {e}")
+        entry.update(status="failed", error=f"Conversion failed: {str(e)}")
+        CONVERSIONS.inc(endpoint="batch", outcome="failed")
+        return
+    _observe_stages(timings)
+    CONVERSIONS.inc(endpoint="batch", outcome="converted")
+    await run_in_threadpool(RESULT_CACHE.put, cache_key, output_path)
+    entry.update(
+        status="ok",
+        cached=False,
+        path=output_path,
+        stages={name: round(seconds * 1000, 1) for name, seconds in timings.items()},
+    )
+
+
+def _write_batch_zip(target, manifest):
+    # DOCX files are already deflated, so they're stored as-is
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED) as archive:
+        for entry in manifest:
+            path = entry.pop("path", None)
+            if path is not None:
+                archive.write(path, entry["output"])
+        archive.writestr("manifest.json", json.dumps({"files": manifest}, indent=2), zipfile.ZIP_DEFLATED)
+
+
+@router.post("/batch/")
+@_tracked("batch")
+async def convert_markdown_batch(files: List[UploadFile] = File(...), profile: Optional[str] = Query(None)):
+    """
+    Converts many Markdown files in one request: any mix of .md uploads and zips of
+    them. Members run in parallel on CONVERSION_POOL and share one workspace; the
+    response is a zip of the DOCX outputs plus manifest.json recording, per source
+    file, whether it converted and why not. Every member uses the same style profile.
+    """
+    profile = _resolve_profile(profile)
+    sources = await _collect_batch_sources(files)
+    if not sources:
+        raise HTTPException(status_code=400, detail="No Markdown files in the upload")
+
+    used_names = set()
+    manifest = []
+    conversions = []
+    for source_name, markdown_text, digest, error in sources:
+        entry = {"source": source_name, "output": None, "status": "failed", "cached": False, "error": error}
+        if error is None:
+            entry["output"] = _batch_output_name(source_name, used_names)
+            conversions.append((entry, markdown_text, digest))
+        else:
+            CONVERSIONS.inc(endpoint="batch", outcome="rejected")
+        manifest.append(entry)
+
+    workspace = await run_in_threadpool(_prepare_workspace)
+    if OUTPUT_MODE == "memory":
+        zip_path = None
+        archive = _spool()
+    else:
+        zip_path = OUTPUT_DIR / f"batch_{uuid.uuid4().hex}.zip"
+        archive = zip_path
+        _hold_output(zip_path)
+    try:
+        await asyncio.gather(*(
+            _convert_batch_entry(entry, markdown_text, digest, workspace, profile)
+            for entry, markdown_text, digest in conversions
+        ))
+        for entry in manifest:
+            if entry["status"] != "ok":
+                entry["output"] = None
+        await run_in_threadpool(_write_batch_zip, archive, manifest)
+    except BaseException:
+        if zip_path is None:
+            archive.close()
+        else:
+            _release_output(zip_path)
+        raise
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    succeeded = sum(1 for entry in manifest if entry["status"] == "ok")
+    headers = {
+        "X-Batch-Succeeded": str(succeeded),
+        "X-Batch-Failed": str(len(manifest) - succeeded),
+    }
+    if zip_path is None:
+        return _spooled_response(archive, "converted.zip", "application/zip", headers)
+    return FileResponse(
+        path=zip_path,
+        filename="converted.zip",
+        media_type="application/zip",
+        headers=headers,
+        background=BackgroundTask(_release_output, zip_path)
+    )
+
+
 @router.get("/health")
 def health_check():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "pool": CONVERSION_POOL.stats(),
+        "jobs": JOB_MANAGER.stats(),
+        "cache": RESULT_CACHE.stats(),
+        "diagrams": DIAGRAM_CACHE.stats(),
+        "disk": OUTPUT_JANITOR.stats(),
+        "style_profiles": sorted(STYLE_PROFILES),
+    }
@@ -0,0 +1,160 @@
+"""
+Status banners: coloured, bordered paragraphs built from [[STATUS_BANNER:<TYPE>:<TEXT>]] markers.
+
+The preprocessor writes one marker per <div class="status-banner ..."> at the
+start of a paragraph of its own, with the type already resolved to one of
+BANNER_STYLES (as 'status-<key>'). filter_status_banner.lua gives those paragraphs a "Status Banner"
+paragraph style (add_banner_styles puts them in the reference documents) while
+pandoc writes the DOCX. Markers the filter leaves alone are styled afterwards:
+the paragraphs holding one are found with a single XPath over the whole body
+(table cells included), so only those are read and rewritten.
+"""
+import re
+
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement
+from docx.oxml.ns import nsmap, qn
+from docx.shared import Pt, RGBColor
+from docx.text.paragraph import Paragraph
+from lxml import etree
+
+from banner_markers import MARKER_PREFIX, banner_style_key
+
+BANNER_STYLES = {
+    'high-risk': {
+        'bg': 'FFEBEE',       # Light Red
+        'border': 'FFCDD2',   # Red Border
+        'text': (0xB7, 0x1C, 0x1C) # Dark Red
+    },
+    'medium-risk': {
+        'bg': 'FFF3E0',       # Light Orange
+        'border': 'FFE0B2',   # Orange Border
+        'text': (0xE6, 0x51, 0x00) # Dark Orange
+    },
+    'low-risk': {
+        'bg': 'E8F5E9',       # Light Green
+        'border': 'C8E6C9',   # Green Border
+        'text': (0x1B, 0x5E, 0x20) # Dark Green
+    },
+    'info': {
+        'bg': 'E3F2FD',       # Light Blue
+        'border': 'BBDEFB',   # Blue Border
+        'text': (0x0D, 0x47, 0xA1) # Dark Blue
+    },
+    'warning': {
+        'bg': 'FFF8E1',       # Light Yellow
+        'border': 'FFECB3',   # Yellow Border
+        'text': (0xF5, 0x7F, 0x17) # Dark Yellow/Orange
+    },
+    'default': {
+        'bg': 'F5F5F5',       # Light Grey
+        'border': 'E0E0E0',   # Grey Border
+        'text': (0x42, 0x42, 0x42) # Dark Grey
+    }
+}
+
+_MARKER_PATTERN = re.compile(r'\[\[STATUS_BANNER:(.*?):(.*?)\]\]')
+# Every paragraph with a marker in one of its text nodes, in document order, at any depth
+# (body, table cells, nested tables). Pandoc keeps the marker prefix within one w:t.
+_FLAGGED_PARAGRAPHS = etree.XPath(
+    f".//w:p[.//w:t[contains(., '{MARKER_PREFIX}')]]",
+    namespaces={'w': nsmap['w']}
+)
+
+# Paragraph properties that come before w:pBdr
+_PBDR_PREDECESSORS = frozenset(qn(tag) for tag in (
+    'w:pStyle', 'w:keepNext', 'w:keepLines', 'w:pageBreakBefore', 'w:framePr', 'w:widowControl',
+    'w:numPr', 'w:suppressLineNumbers',
+))
+
+
+def banner_style_name(style_key):
+    """Paragraph style for a key of BANNER_STYLES, e.g. 'Status Banner High Risk'."""
+    return 'Status Banner ' + style_key.replace('-', ' ').title()
+
+
+def _set_shading_and_borders(pPr, style):
+    # Remove existing shader and borders if any
+    for tag in ('w:pBdr', 'w:shd'):
+        existing = pPr.find(qn(tag))
+        if existing is not None:
+            pPr.remove(existing)
+
+    # Add padding via borders
+    pBdr = OxmlElement('w:pBdr')
+    for side in ['top', 'left', 'bottom', 'right']:
+        bdr = OxmlElement(f'w:{side}')
+        bdr.set(qn('w:val'), 'single')
+        bdr.set(qn('w:sz'), '4') # 1/2 pt
+        bdr.set(qn('w:space'), '4') # 4 pt padding
+        bdr.set(qn('w:color'), style['border'])
+        pBdr.append(bdr)
+
+    # Apply paragraph shading (Background Color)
+    shd = OxmlElement('w:shd')
+    shd.set(qn('w:val'), 'clear')
+    shd.set(qn('w:color'), 'auto')
+    shd.set(qn('w:fill'), style['bg'])
+
+    # Schema order: pBdr then shd, both ahead of spacing, indentation and alignment
+    for child in pPr:
+        if child.tag not in _PBDR_PREDECESSORS:
+            child.addprevious(pBdr)
+            break
+    else:
+        pPr.append(pBdr)
+    pBdr.addnext(shd)
+
+
+def add_banner_styles(doc):
+    """
+    Adds (or redefines) a paragraph style per banner type, formatted the way the
+    post-processor formats banner paragraphs, so pandoc can write finished banners.
+    """
+    styles = doc.styles
+    base = styles['Body Text'] if 'Body Text' in styles else None
+    for style_key, spec in BANNER_STYLES.items():
+        name = banner_style_name(style_key)
+        style = styles[name] if name in styles else styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = base
+        style.font.bold = True
+        style.font.color.rgb = RGBColor(*spec['text'])
+        style.font.size = Pt(10)
+        _set_shading_and_borders(style.element.get_or_add_pPr(), spec)
+        style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+
+def _style_banner(paragraph, text_content, style):
+    # Clear existing runs and add new styled run
+    paragraph.clear()
+
+    run = paragraph.add_run(text_content)
+    run.bold = True
+    r, g, b = style['text']
+    run.font.color.rgb = RGBColor(r, g, b)
+    run.font.size = Pt(10)
+
+    _set_shading_and_borders(paragraph._p.get_or_add_pPr(), style)
+
+    # Set alignment if needed
+    paragraph.alignment = 0 # Left aligned
+
+
+def apply_status_banners(doc):
+    """
+    Styles every paragraph still holding a [[STATUS_BANNER:<TYPE>:<TEXT>]] marker
+    as a banner. Returns how many were styled.
+    """
+    styled = 0
+    body = doc.element.body
+    for p in _FLAGGED_PARAGRAPHS(body):
+        # The parent only matters for part lookups, which styling a run never does
+        paragraph = Paragraph(p, doc._body)
+        match = _MARKER_PATTERN.search(paragraph.text)
+        if match is None:
+            # The prefix without a complete marker: ordinary text, left alone
+            continue
+        _style_banner(paragraph, match.group(2), BANNER_STYLES[banner_style_key(match.group(1))])
+        styled += 1
+    return styled
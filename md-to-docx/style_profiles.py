@@ -0,0 +1,179 @@
+"""
+Named style profiles, compiled into pandoc reference documents.
+
+A profile maps paragraph style names to the formatting they get (font, size,
+colour, spacing...). Instead of restyling every converted document, a profile is
+applied once to a copy of the base reference.docx and pandoc emits documents
+that are styled from the start. Compiled references are cached on disk under a
+digest of the base document and the profile, so they're rebuilt only when one
+of them changes. Every compiled reference also carries the banner and table
+header styles the Lua filters assign.
+"""
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.shared import Pt, RGBColor
+
+from result_cache import hash_parts
+from status_banners import BANNER_STYLES, add_banner_styles
+from table_styling import HEADER_FONT, HEADER_FONT_COLOR, HEADER_FONT_SIZE, HEADER_RUN_STYLE, add_header_run_style
+
+_BODY = {"font": "Arial", "size": 11, "color": "000000", "space_after": 8, "line_spacing": 1.15}
+_LIST = {"font": "Arial", "size": 11, "space_after": 4}
+
+# Arial throughout, deep navy (#1F4E79) headings
+DEFAULT_PROFILE = {
+    "Normal": _BODY,
+    "Body Text": _BODY,
+    "List Paragraph": _LIST,
+    "List Bullet": _LIST,
+    "List Number": _LIST,
+    "Heading 1": {"font": "Arial", "size": 20, "bold": True, "color": "1F4E79", "space_before": 24, "space_after": 12},
+    "Heading 2": {"font": "Arial", "size": 16, "bold": True, "color": "1F4E79", "space_before": 18, "space_after": 10},
+    "Heading 3": {"font": "Arial", "size": 14, "bold": True, "color": "1F4E79", "space_before": 14, "space_after": 6},
+    # Slightly lighter, to keep metadata headers subtle but related
+    "Heading 4": {"font": "Arial", "size": 12, "bold": True, "color": "396694", "space_before": 14, "space_after": 6,
+                  "borders": False},
+    "Title": {"font": "Arial", "size": 18, "bold": True, "color": "003366", "alignment": "left"},
+}
+
+PROFILES = {
+    "default": DEFAULT_PROFILE,
+    # The base reference.docx as it is (create_reference.py's blue headings)
+    "classic": {},
+}
+
+_ALIGNMENTS = {
+    "left": WD_ALIGN_PARAGRAPH.LEFT,
+    "center": WD_ALIGN_PARAGRAPH.CENTER,
+    "right": WD_ALIGN_PARAGRAPH.RIGHT,
+    "justify": WD_ALIGN_PARAGRAPH.JUSTIFY,
+}
+_SPEC_KEYS = {"font", "size", "bold", "italic", "color", "space_before", "space_after", "line_spacing",
+              "alignment", "borders"}
+# Profile names end up in file names
+_PROFILE_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+# Styles the Lua filters rely on, added to every compiled reference whatever the profile
+_FILTER_STYLES = json.dumps({
+    "banners": BANNER_STYLES,
+    "header": [HEADER_RUN_STYLE, HEADER_FONT, HEADER_FONT_SIZE, str(HEADER_FONT_COLOR)],
+}, sort_keys=True)
+
+
+def load_profiles(path=None):
+    """
+    The built-in PROFILES, plus (or overridden by) those in the JSON file at path:
+    {"name": {"Style Name": {"font": "Arial", "size": 11, ...}, ...}, ...}.
+    """
+    profiles = dict(PROFILES)
+    if path:
+        with open(path, encoding='utf-8') as f:
+            profiles.update(json.load(f))
+    for name, profile in profiles.items():
+        if not _PROFILE_NAME.match(name):
+            raise ValueError(f"Invalid style profile name: {name!r}")
+        for style_name, spec in profile.items():
+            unknown = set(spec) - _SPEC_KEYS
+            if unknown:
+                raise ValueError(f"Style profile {name!r}, style {style_name!r}: unknown keys {sorted(unknown)}")
+            if "alignment" in spec and spec["alignment"] not in _ALIGNMENTS:
+                raise ValueError(f"Style profile {name!r}, style {style_name!r}: bad alignment {spec['alignment']!r}")
+    return profiles
+
+
+def apply_profile(doc, profile):
+    """Sets every style the profile lists on doc. Styles the document lacks are skipped."""
+    for style_name, spec in profile.items():
+        if style_name not in doc.styles:
+            print(f"Style profile skipped '{style_name}': not in the reference document")
+            continue
+        style = doc.styles[style_name]
+        font = style.font
+        if "font" in spec:
+            font.name = spec["font"]
+        if "size" in spec:
+            font.size = Pt(spec["size"])
+        if "bold" in spec:
+            font.bold = spec["bold"]
+        if "italic" in spec:
+            font.italic = spec["italic"]
+        if "color" in spec:
+            font.color.rgb = RGBColor.from_string(spec["color"])
+
+        paragraph_format = style.paragraph_format
+        if "space_before" in spec:
+            paragraph_format.space_before = Pt(spec["space_before"])
+        if "space_after" in spec:
+            paragraph_format.space_after = Pt(spec["space_after"])
+        if "line_spacing" in spec:
+            paragraph_format.line_spacing = spec["line_spacing"]
+        if "alignment" in spec:
+            paragraph_format.alignment = _ALIGNMENTS[spec["alignment"]]
+        if spec.get("borders") is False:
+            p_pr = style.element.pPr
+            p_borders = p_pr.find(qn('w:pBdr')) if p_pr is not None else None
+            if p_borders is not None:
+                p_pr.remove(p_borders)
+
+
+class ReferenceDocCache:
+    """
+    Reference documents with a profile applied, one file per (base document, profile)
+    pair under root. Thread-safe; separate processes may compile the same file
+    concurrently, as each one is written to a temporary name and swapped in.
+    """
+
+    def __init__(self, root, profiles):
+        self.root = Path(root)
+        self.profiles = profiles
+        self._lock = threading.Lock()
+
+    def digest(self, name, base_digest):
+        """Identifies what profile `name` compiled onto a base document with base_digest produces."""
+        return hash_parts(base_digest, json.dumps(self.profiles[name], sort_keys=True), _FILTER_STYLES)
+
+    def get(self, name, base_path, base_digest):
+        """
+        Path of profile `name` compiled onto base_path (None: pandoc's built-in
+        reference document), compiling it first if needed.
+        """
+        path = self.root / f"{name}-{self.digest(name, base_digest)[:16]}.docx"
+        if path.exists():
+            return path
+        with self._lock:
+            if not path.exists():
+                self._compile(name, base_path, path)
+        return path
+
+    def _compile(self, name, base_path, path):
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(prefix=f".{name}_", suffix=".docx", dir=self.root)
+        os.close(fd)
+        try:
+            if base_path is None:
+                subprocess.run(
+                    ["pandoc", "-o", temp_name, "--print-default-data-file", "reference.docx"],
+                    check=True
+                )
+            doc = Document(str(base_path or temp_name))
+            apply_profile(doc, self.profiles[name])
+            add_banner_styles(doc)
+            add_header_run_style(doc)
+            doc.save(temp_name)
+            os.replace(temp_name, path)
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
+        # Builds of this profile for an older base document or profile version
+        for stale in self.root.glob(f"{name}-*.docx"):
+            if stale != path and stale.stem.rsplit('-', 1)[0] == name:
+                stale.unlink(missing_ok=True)
+        print(f"Compiled style profile '{name}' into {path.name}")
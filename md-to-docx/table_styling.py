@@ -0,0 +1,268 @@
+"""
+Table styling straight on the document's lxml tree.
+
+Going through python-docx proxies costs a merged-cell resolution per row.cells
+call and an element lookup per property, which dominates on tables with
+thousands of cells. Here rows, cells, paragraphs and runs are found with
+precompiled XPath, and borders, margins and shading are copies of template
+elements built once. Borders and cell margins go on the table (w:tblBorders,
+w:tblCellMar) whenever that renders the same as repeating them in every cell.
+"""
+import copy
+
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml import OxmlElement
+from docx.oxml.ns import nsmap, qn
+from docx.shared import Pt, RGBColor
+from lxml import etree
+
+# First of these the document defines is applied to every table
+PREFERRED_TABLE_STYLES = ['MyCustomTable', 'Table Grid', 'Normal Table']
+# Light gray hairline around every cell
+BORDER_ATTRIBUTES = {'val': 'single', 'sz': '4', 'space': '0', 'color': 'AAAAAA'}
+# Padding inside every cell, in twentieths of a point
+CELL_MARGIN_DXA = 100
+HEADER_FILL = 'D9E2F3'
+HEADER_FONT = 'Arial'
+HEADER_FONT_SIZE = Pt(11)
+HEADER_FONT_COLOR = RGBColor(0, 0, 0)
+# Character style filter_table_style.lua puts on header cell text (already bold), so
+# those runs need no direct formatting here
+HEADER_RUN_STYLE = 'Table Header'
+
+_NAMESPACES = {'w': nsmap['w']}
+
+# Cells python-docx yields from row.cells: a vertically merged continuation cell
+# resolves to the cell above it, so it isn't styled on its own
+_CELL_STEP = "w:tc[not(w:tcPr/w:vMerge[not(@w:val) or @w:val='continue'])]"
+_CELLS = etree.XPath(f"./w:tr/{_CELL_STEP}", namespaces=_NAMESPACES)
+_CELL_PARAGRAPHS = etree.XPath(f"./w:tr/{_CELL_STEP}/w:p", namespaces=_NAMESPACES)
+_HEADER_CELLS = etree.XPath("./w:tr[1]/w:tc", namespaces=_NAMESPACES)
+_HEADER_RUNS = etree.XPath(
+    f"./w:tr[1]/w:tc/w:p/w:r[not(w:rPr/w:rStyle/@w:val = '{HEADER_RUN_STYLE.replace(' ', '')}')]",
+    namespaces=_NAMESPACES
+)
+# Anything that would draw differently with table-level instead of per-cell borders:
+# cell spacing, row-level table exceptions, or cells with their own borders/margins
+_CELL_LEVEL_OVERRIDES = etree.XPath(
+    "boolean(./w:tblPr/w:tblCellSpacing | ./w:tr/w:tblPrEx | ./w:tr/w:tc/w:tcPr[w:tcBorders or w:tcMar])",
+    namespaces=_NAMESPACES
+)
+# Conditional formats (first row, banding...) sit above table-level borders but below cell-level ones
+_CONDITIONAL_BORDERS = etree.XPath(
+    "boolean(./w:tblStylePr[w:tcPr/w:tcBorders or w:tcPr/w:tcMar or w:tblPr/w:tblBorders])",
+    namespaces=_NAMESPACES
+)
+
+# Schema order of the property children, so inserted elements land in a valid position
+_TC_PR_SEQUENCE = (
+    'w:cnfStyle', 'w:tcW', 'w:gridSpan', 'w:hMerge', 'w:vMerge', 'w:tcBorders', 'w:shd', 'w:noWrap',
+    'w:tcMar', 'w:textDirection', 'w:tcFitText', 'w:vAlign', 'w:hideMark', 'w:headers', 'w:cellIns',
+    'w:cellDel', 'w:cellMerge', 'w:tcPrChange',
+)
+_TBL_PR_SEQUENCE = (
+    'w:tblStyle', 'w:tblpPr', 'w:tblOverlap', 'w:bidiVisual', 'w:tblStyleRowBandSize',
+    'w:tblStyleColBandSize', 'w:tblW', 'w:jc', 'w:tblCellSpacing', 'w:tblInd', 'w:tblBorders', 'w:shd',
+    'w:tblLayout', 'w:tblCellMar', 'w:tblLook', 'w:tblCaption', 'w:tblDescription', 'w:tblPrChange',
+)
+_P_PR_SEQUENCE = (
+    'w:pStyle', 'w:keepNext', 'w:keepLines', 'w:pageBreakBefore', 'w:framePr', 'w:widowControl',
+    'w:numPr', 'w:suppressLineNumbers', 'w:pBdr', 'w:shd', 'w:tabs', 'w:suppressAutoHyphens',
+    'w:kinsoku', 'w:wordWrap', 'w:overflowPunct', 'w:topLinePunct', 'w:autoSpaceDE', 'w:autoSpaceDN',
+    'w:bidi', 'w:adjustRightInd', 'w:snapToGrid', 'w:spacing', 'w:ind', 'w:contextualSpacing',
+    'w:mirrorIndents', 'w:suppressOverlap', 'w:jc', 'w:textDirection', 'w:textAlignment',
+    'w:textboxTightWrap', 'w:outlineLvl', 'w:divId', 'w:cnfStyle', 'w:rPr', 'w:sectPr', 'w:pPrChange',
+)
+
+_P_PR = qn('w:pPr')
+_P_STYLE = qn('w:pStyle')
+_VAL = qn('w:val')
+
+
+def _successors(sequence, tag):
+    """Clark names of the elements that must follow tag, resolved once."""
+    return frozenset(qn(successor) for successor in sequence[sequence.index(tag) + 1:])
+
+
+def _insert_before(parent, element, successors):
+    # python-docx's insert_element_before re-resolves every successor name on each call
+    for child in parent:
+        if child.tag in successors:
+            child.addprevious(element)
+            return
+    parent.append(element)
+
+
+def _template(tag, attributes=None, children=()):
+    element = OxmlElement(tag)
+    for name, value in (attributes or {}).items():
+        element.set(qn(f'w:{name}'), value)
+    for child in children:
+        element.append(child)
+    return element
+
+
+def _sides(tag, sides, attributes):
+    return _template(tag, children=[_template(f'w:{side}', attributes) for side in sides])
+
+
+_MARGIN = {'w': str(CELL_MARGIN_DXA), 'type': 'dxa'}
+TC_BORDERS = _sides('w:tcBorders', ('top', 'left', 'bottom', 'right'), BORDER_ATTRIBUTES)
+TC_MARGINS = _sides('w:tcMar', ('top', 'left', 'bottom', 'right'), _MARGIN)
+TBL_BORDERS = _sides('w:tblBorders', ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'), BORDER_ATTRIBUTES)
+TBL_CELL_MARGINS = _sides('w:tblCellMar', ('top', 'left', 'bottom', 'right'), _MARGIN)
+HEADER_SHADING = _template('w:shd', {'val': 'clear', 'color': 'auto', 'fill': HEADER_FILL})
+NO_SPACE_AFTER = _template('w:spacing', {'after': '0'})
+
+_TC_BORDERS_SUCCESSORS = _successors(_TC_PR_SEQUENCE, 'w:tcBorders')
+_TC_MARGINS_SUCCESSORS = _successors(_TC_PR_SEQUENCE, 'w:tcMar')
+_SHADING_SUCCESSORS = _successors(_TC_PR_SEQUENCE, 'w:shd')
+_TBL_BORDERS_SUCCESSORS = _successors(_TBL_PR_SEQUENCE, 'w:tblBorders')
+_TBL_CELL_MARGINS_SUCCESSORS = _successors(_TBL_PR_SEQUENCE, 'w:tblCellMar')
+_SPACING_SUCCESSORS = _successors(_P_PR_SEQUENCE, 'w:spacing')
+
+
+def _apply_template(parent, template, successors):
+    """
+    Inserts a copy of template into parent, or when parent already has that element,
+    sets the template's attributes on it and on each of its children, keeping the rest.
+    """
+    existing = parent.find(template.tag)
+    if existing is None:
+        _insert_before(parent, copy.deepcopy(template), successors)
+        return
+    existing.attrib.update(template.attrib)
+    for child in template:
+        node = existing.find(child.tag)
+        if node is None:
+            existing.append(copy.deepcopy(child))
+        else:
+            node.attrib.update(child.attrib)
+
+
+def _replace_with_template(parent, template, successors):
+    existing = parent.find(template.tag)
+    if existing is not None:
+        parent.remove(existing)
+    _insert_before(parent, copy.deepcopy(template), successors)
+
+
+def _table_style_id(doc):
+    """Style id for the first of PREFERRED_TABLE_STYLES the document has (None: the default style)."""
+    for style_name in PREFERRED_TABLE_STYLES:
+        try:
+            return True, doc.part.get_style_id(style_name, WD_STYLE_TYPE.TABLE)
+        except Exception:
+            continue
+    return False, None
+
+
+def _style_has_conditional_borders(doc, style_id):
+    """Whether the table style (None: the default one) or a style it's based on has conditional borders."""
+    styles = doc.styles.element
+    if style_id is None:
+        default = styles.default_for(WD_STYLE_TYPE.TABLE)
+        style_id = default.styleId if default is not None else None
+    seen = set()
+    while style_id is not None and style_id not in seen:
+        seen.add(style_id)
+        style = styles.get_by_id(style_id)
+        if style is None:
+            break
+        if _CONDITIONAL_BORDERS(style):
+            return True
+        style_id = style.basedOn_val
+    return False
+
+
+def _normal_paragraph_check(doc):
+    """
+    Predicate for pStyle values python-docx reports as the default 'Normal' style:
+    its own id, and ids of styles the document doesn't define.
+    """
+    styles = doc.styles.element
+    default = styles.default_for(WD_STYLE_TYPE.PARAGRAPH)
+    if default is None or default.name_val != 'Normal':
+        return lambda style_id: False
+    default_id = default.styleId
+    known_ids = {
+        style.styleId for style in styles.style_lst
+        if style.type == WD_STYLE_TYPE.PARAGRAPH
+    }
+    return lambda style_id: style_id == default_id or style_id not in known_ids
+
+
+def add_header_run_style(doc):
+    """
+    Adds (or redefines) the HEADER_RUN_STYLE character style with the header font,
+    size and colour, for reference documents pandoc writes styled header rows from.
+    """
+    styles = doc.styles
+    if HEADER_RUN_STYLE in styles:
+        style = styles[HEADER_RUN_STYLE]
+    else:
+        style = styles.add_style(HEADER_RUN_STYLE, WD_STYLE_TYPE.CHARACTER)
+    style.font.name = HEADER_FONT
+    style.font.size = HEADER_FONT_SIZE
+    style.font.color.rgb = HEADER_FONT_COLOR
+
+
+def _style_header_row(tbl):
+    for tc in _HEADER_CELLS(tbl):
+        _apply_template(tc.get_or_add_tcPr(), HEADER_SHADING, _SHADING_SUCCESSORS)
+    for r in _HEADER_RUNS(tbl):
+        r_pr = r.get_or_add_rPr()
+        r_pr._set_bool_val('b', True)
+        r_pr.rFonts_ascii = HEADER_FONT
+        r_pr.rFonts_hAnsi = HEADER_FONT
+        r_pr.sz_val = HEADER_FONT_SIZE
+        r_pr._remove_color()
+        r_pr.get_or_add_color().val = HEADER_FONT_COLOR
+
+
+def _style_cell_paragraphs(tbl, is_normal):
+    for p in _CELL_PARAGRAPHS(tbl):
+        p_pr = p.find(_P_PR)
+        if p_pr is None:
+            p_pr = OxmlElement('w:pPr')
+            p.insert(0, p_pr)
+        # Keep table content from inheriting the body's paragraph spacing
+        _apply_template(p_pr, NO_SPACE_AFTER, _SPACING_SUCCESSORS)
+        # Normal re-asserted as the style means no explicit style at all
+        p_style = p_pr.find(_P_STYLE)
+        if p_style is not None and is_normal(p_style.get(_VAL)):
+            p_pr.remove(p_style)
+
+
+def style_tables(doc, table_level=True):
+    """
+    Styles every table in the body: preferred table style, shaded bold header row,
+    light borders and padding around every cell, no space after cell paragraphs.
+    With table_level=False borders and margins are always written per cell.
+    """
+    tables = doc.element.body.tbl_lst
+    if not tables:
+        return
+    has_style, style_id = _table_style_id(doc)
+    is_normal = _normal_paragraph_check(doc)
+    # Table style id -> whether it has conditional borders
+    conditional_borders = {}
+
+    for tbl in tables:
+        if has_style:
+            tbl.tblStyle_val = style_id
+
+        _style_header_row(tbl)
+        table_style_id = tbl.tblStyle_val
+        if table_style_id not in conditional_borders:
+            conditional_borders[table_style_id] = _style_has_conditional_borders(doc, table_style_id)
+        if table_level and not conditional_borders[table_style_id] and not _CELL_LEVEL_OVERRIDES(tbl):
+            tbl_pr = tbl.tblPr
+            _replace_with_template(tbl_pr, TBL_BORDERS, _TBL_BORDERS_SUCCESSORS)
+            _replace_with_template(tbl_pr, TBL_CELL_MARGINS, _TBL_CELL_MARGINS_SUCCESSORS)
+        else:
+            for tc in _CELLS(tbl):
+                tc_pr = tc.get_or_add_tcPr()
+                _apply_template(tc_pr, TC_MARGINS, _TC_MARGINS_SUCCESSORS)
+                _apply_template(tc_pr, TC_BORDERS, _TC_BORDERS_SUCCESSORS)
+        _style_cell_paragraphs(tbl, is_normal)
@@ -0,0 +1,64 @@
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+# The service modules import each other by plain name, as router.py arranges at runtime
+sys.path.insert(0, str(SERVICE_DIR))
+
+
+def install_fake_pandoc(bin_dir):
+    """Puts a pandoc on PATH that runs benchmarks/fake_pandoc.py with this interpreter."""
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    launcher = bin_dir / "pandoc"
+    launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{SERVICE_DIR / "benchmarks" / "fake_pandoc.py"}" "$@"\n')
+    launcher.chmod(0o755)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+
+
+@pytest.fixture(scope="session")
+def service_dir(tmp_path_factory):
+    """
+    Working directory of the service under test: the router resolves tmp/outputs and
+    tmp/work against it. pandoc is the offline stand-in and diagrams use the stub renderer.
+    """
+    root = tmp_path_factory.mktemp("service")
+    install_fake_pandoc(root / "bin")
+    os.environ.update({
+        "MD_TO_DOCX_MERMAID_RENDERER": "stub",
+        "MD_TO_DOCX_CACHE_DIR": str(root / "cache" / "results"),
+        "MD_TO_DOCX_DIAGRAM_CACHE_DIR": str(root / "cache" / "diagrams"),
+        "MD_TO_DOCX_REFERENCE_CACHE_DIR": str(root / "cache" / "references"),
+    })
+    previous = os.getcwd()
+    os.chdir(root)
+    yield root
+    os.chdir(previous)
+
+
+@pytest.fixture(scope="session")
+def router(service_dir):
+    # Same dynamic import main.py uses, since the folder name has dashes
+    module = sys.modules.get("md_to_docx_router")
+    if module is None:
+        spec = importlib.util.spec_from_file_location("md_to_docx_router", SERVICE_DIR / "router.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["md_to_docx_router"] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def client(router):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+    app.include_router(router.router)
+    # One client for the session, so the job workers keep running on the same loop
+    with TestClient(app) as test_client:
+        yield test_client
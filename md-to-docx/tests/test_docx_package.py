@@ -0,0 +1,78 @@
+import io
+import zipfile
+
+from docx import Document
+from PIL import Image
+
+from docx_package import save_docx, write_docx
+
+
+def _png(size, color):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    buffer.seek(0)
+    return buffer
+
+
+def _pandoc_like_docx(path):
+    doc = Document()
+    doc.add_paragraph("Original text")
+    doc.add_picture(_png((60, 40), "red"))
+    doc.save(str(path))
+    return path
+
+
+def _raw_entries(source):
+    """name -> (compress_type, CRC, raw compressed bytes) of every zip entry."""
+    entries = {}
+    with zipfile.ZipFile(source) as archive:
+        for info in archive.infolist():
+            archive.fp.seek(info.header_offset + 26)
+            name_length = int.from_bytes(archive.fp.read(2), "little")
+            extra_length = int.from_bytes(archive.fp.read(2), "little")
+            archive.fp.seek(name_length + extra_length, 1)
+            entries[info.filename] = (info.compress_type, info.CRC, archive.fp.read(info.compress_size))
+    return entries
+
+
+def test_save_docx_copies_unchanged_parts(tmp_path):
+    path = _pandoc_like_docx(tmp_path / "out.docx")
+    before = _raw_entries(path)
+    doc = Document(str(path))
+    doc.paragraphs[0].text = "Post-processed text"
+
+    copied, compressed = save_docx(doc, path)
+
+    after = _raw_entries(path)
+    assert set(after) == set(before)
+    changed = {name for name in after if after[name] != before[name]}
+    assert "word/document.xml" in changed
+    # The picture and everything else untouched keep pandoc's compressed bytes
+    assert "word/media/image1.png" not in changed
+    assert copied == len(after) - len(changed)
+    assert compressed == len(changed)
+    assert Document(str(path)).paragraphs[0].text == "Post-processed text"
+    assert not [entry.name for entry in tmp_path.iterdir() if entry.name.startswith(".")]
+
+
+def test_write_docx_into_a_buffer(tmp_path):
+    path = _pandoc_like_docx(tmp_path / "out.docx")
+    doc = Document(str(path))
+    doc.add_picture(_png((30, 30), "blue"))
+    target = io.BytesIO()
+
+    write_docx(doc, path, target)
+
+    target.seek(0)
+    with zipfile.ZipFile(target) as archive:
+        assert archive.testzip() is None
+        media = [info for info in archive.infolist() if info.filename.startswith("word/media/")]
+        # New images are stored, not deflated a second time
+        assert len(media) == 2
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in media if info.filename != "word/media/image1.png")
+    target.seek(0)
+    reopened = Document(target)
+    assert len(reopened.inline_shapes) == 2
+    assert reopened.paragraphs[0].text == "Original text"
+    # The source package is left as it was
+    assert len(Document(str(path)).inline_shapes) == 1
@@ -0,0 +1,215 @@
+import io
+import json
+import threading
+import time
+import uuid
+import zipfile
+
+import pytest
+from PIL import Image
+
+from conversion_pool import ConversionPool
+
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def _markdown(extra=""):
+    # Unique text, so no test is answered from another one's cache entries
+    return f"# Report {uuid.uuid4().hex}\n\nSome text.\n\n| A | B |\n|---|---|\n| 1 | 2 |\n{extra}".encode()
+
+
+def _media(content):
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        return [name for name in archive.namelist() if name.startswith("word/media/")]
+
+
+def _wait_for_job(client, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(f"/md-to-docx/jobs/{job_id}").json()
+        if status["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return status
+        time.sleep(0.05)
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _post_batch(client, files):
+    return client.post("/md-to-docx/batch/", files=[("files", file) for file in files])
+
+
+def test_convert_then_cache_hit(client, service_dir):
+    markdown = _markdown()
+    first = client.post("/md-to-docx/convert/", files={"file": ("report.md", markdown, "text/markdown")})
+    assert first.status_code == 200
+    assert first.headers["x-cache"] == "MISS"
+    assert first.headers["content-type"] == DOCX_MEDIA_TYPE
+    assert "pandoc;dur=" in first.headers["server-timing"]
+
+    second = client.post("/md-to-docx/convert/", files={"file": ("report.md", markdown, "text/markdown")})
+    assert second.status_code == 200
+    assert second.headers["x-cache"] == "HIT"
+    assert second.content == first.content
+    # The private link a hit is served from goes once the response is sent
+    assert list((service_dir / "tmp" / "outputs").iterdir()) == []
+
+
+def test_convert_embeds_diagrams_and_relative_images(client, service_dir):
+    image_dir = service_dir / "images"
+    image_dir.mkdir(exist_ok=True)
+    Image.new("RGB", (40, 30), "red").save(image_dir / "logo.png")
+    markdown = _markdown('\n![](images/logo.png)\n\n<div class="mermaid">\ngraph LR\n  A-->B\n</div>\n')
+
+    response = client.post("/md-to-docx/convert/", files={"file": ("report.md", markdown, "text/markdown")})
+
+    assert response.status_code == 200
+    # The picture, the diagram and the diagram's full-page copy in Appendix A
+    assert len(_media(response.content)) == 3
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert "Appendix Figure A1" in archive.read("word/document.xml").decode()
+
+
+def test_convert_rejects_bad_uploads(client):
+    response = client.post("/md-to-docx/convert/", files={"file": ("report.txt", b"text", "text/plain")})
+    assert response.status_code == 400
+    response = client.post("/md-to-docx/convert/", files={"file": ("report.md", b"\xff\xfe", "text/markdown")})
+    assert response.status_code == 400
+    response = client.post(
+        "/md-to-docx/convert/?profile=missing", files={"file": ("report.md", _markdown(), "text/markdown")}
+    )
+    assert response.status_code == 400
+
+
+def test_convert_answers_503_when_the_pool_is_saturated(client, router, monkeypatch):
+    pool = ConversionPool(kind="thread", max_workers=1, max_queue=0, retry_after=7)
+    monkeypatch.setattr(router, "CONVERSION_POOL", pool)
+    release = threading.Event()
+    # Holds the only slot until the request has been turned away
+    blocker = client.portal.start_task_soon(pool.run, release.wait)
+    try:
+        deadline = time.monotonic() + 10
+        while pool.stats()["running"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        response = client.post("/md-to-docx/convert/", files={"file": ("report.md", _markdown(), "text/markdown")})
+    finally:
+        release.set()
+    blocker.result(timeout=10)
+    pool.shutdown()
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "7"
+
+
+def test_job_lifecycle(client):
+    markdown = _markdown()
+    response = client.post("/md-to-docx/jobs", files={"file": ("report.md", markdown, "text/markdown")})
+    assert response.status_code == 202
+    job = response.json()
+
+    status = _wait_for_job(client, job["id"])
+    assert status["status"] == "done"
+    assert status["progress"] == 1.0
+    assert {"pandoc", "save"} <= set(status["stages"])
+    result = client.get(status["result_url"])
+    assert result.status_code == 200
+    assert result.headers["x-cache"] == "MISS"
+
+    # The same document again is done straight away from the cache
+    again = client.post("/md-to-docx/jobs", files={"file": ("report.md", markdown, "text/markdown")}).json()
+    assert again["status"] == "done"
+    assert again["cached"] is True
+    cached = client.get(again["result_url"])
+    assert cached.headers["x-cache"] == "HIT"
+    assert cached.content == result.content
+
+
+def test_failed_job(client, router, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("pandoc exploded")
+
+    monkeypatch.setattr(router, "_run_conversion_job", fail)
+    job = client.post("/md-to-docx/jobs", files={"file": ("report.md", _markdown(), "text/markdown")}).json()
+
+    status = _wait_for_job(client, job["id"])
+    assert status["status"] == "failed"
+    assert "pandoc exploded" in status["error"]
+    assert client.get(f"/md-to-docx/jobs/{job['id']}/result").status_code == 409
+
+
+def test_unknown_job(client):
+    assert client.get("/md-to-docx/jobs/missing").status_code == 404
+    assert client.get("/md-to-docx/jobs/missing/result").status_code == 404
+
+
+def test_batch_manifest_and_per_file_errors(client):
+    archive = _zip({
+        "docs/one.md": _markdown(),
+        "docs/sub/two.md": _markdown(),
+        "docs/bad.md": b"\xff\xfe",
+        "docs/readme.txt": b"ignored",
+    })
+    response = _post_batch(client, [
+        ("one.md", _markdown(), "text/markdown"),
+        ("set.zip", archive, "application/zip"),
+        ("broken.zip", b"not a zip", "application/zip"),
+        ("notes.pdf", b"%PDF", "application/pdf"),
+    ])
+
+    assert response.status_code == 200
+    assert response.headers["x-batch-succeeded"] == "3"
+    assert response.headers["x-batch-failed"] == "3"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as result:
+        manifest = json.loads(result.read("manifest.json"))["files"]
+        entries = {entry["source"]: entry for entry in manifest}
+        # Outputs mirror the source paths; a clash gets a numbered name
+        assert entries["one.md"]["output"] == "one.docx"
+        assert entries["docs/one.md"]["output"] == "docs/one.docx"
+        assert entries["docs/sub/two.md"]["output"] == "docs/sub/two.docx"
+        for name in ("one.docx", "docs/one.docx", "docs/sub/two.docx"):
+            assert result.read(name)[:2] == b"PK"
+    assert entries["docs/bad.md"]["status"] == "failed"
+    assert entries["docs/bad.md"]["error"] == "Markdown file must be UTF-8 encoded"
+    assert entries["broken.zip"]["error"] == "Not a valid zip file"
+    assert entries["notes.pdf"]["error"] == "Only .md and .zip files are allowed"
+    assert "docs/readme.txt" not in entries
+    assert all(entry["status"] == "ok" and "pandoc" in entry["stages"]
+               for entry in manifest if entry["error"] is None)
+
+
+def test_batch_serves_cached_members(client):
+    markdown = _markdown()
+    _post_batch(client, [("a.md", markdown, "text/markdown")])
+    response = _post_batch(client, [("a.md", markdown, "text/markdown")])
+    with zipfile.ZipFile(io.BytesIO(response.content)) as result:
+        entry = json.loads(result.read("manifest.json"))["files"][0]
+        assert entry["cached"] is True
+        assert result.read("a.docx")[:2] == b"PK"
+
+
+@pytest.mark.parametrize("files", [
+    [("set.zip", _zip({"a.md": b"# A\n" + b"x" * 600, "b.md": b"# B\n" + b"y" * 600}), "application/zip")],
+    [("a.md", b"# A\n" + b"x" * 600, "text/markdown"), ("b.md", b"# B\n" + b"y" * 600, "text/markdown")],
+])
+def test_batch_byte_cap(client, router, monkeypatch, files):
+    monkeypatch.setattr(router, "MAX_BATCH_BYTES", 1000)
+    response = _post_batch(client, files)
+    assert response.status_code == 413
+    assert response.json()["detail"] == "A batch may hold at most 1000 bytes of Markdown"
+
+
+def test_batch_file_cap(client, router, monkeypatch):
+    monkeypatch.setattr(router, "MAX_BATCH_FILES", 2)
+    archive = _zip({f"{index}.md": _markdown() for index in range(3)})
+    response = _post_batch(client, [("set.zip", archive, "application/zip")])
+    assert response.status_code == 413
+
+
+def test_empty_batch(client):
+    response = _post_batch(client, [("set.zip", _zip({"readme.txt": b"no markdown"}), "application/zip")])
+    assert response.status_code == 400
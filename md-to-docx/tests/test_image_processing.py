@@ -0,0 +1,48 @@
+import io
+
+import pytest
+from PIL import Image
+
+from image_processing import attach_svg, detach_svg, image_size, svg_size
+
+
+def _encode(size, image_format, **options):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("size", [(1, 1), (640, 480), (3000, 17)])
+def test_png_size(size):
+    assert image_size(_encode(size, "PNG")) == size
+
+
+@pytest.mark.parametrize("options", [{}, {"progressive": True}, {"exif": b"Exif\x00\x00" + b"\x00" * 64}])
+def test_jpeg_size(options):
+    # Progressive frames and APPn segments before the frame header are skipped over
+    assert image_size(_encode((321, 123), "JPEG", **options)) == (321, 123)
+
+
+def test_png_with_svg_attached_keeps_its_size():
+    png = attach_svg(_encode((40, 30), "PNG"), b'<svg width="20" height="15"/>')
+    assert image_size(png) == (40, 30)
+    assert detach_svg(png)[1] == b'<svg width="20" height="15"/>'
+
+
+@pytest.mark.parametrize("blob", [
+    b"",
+    b"GIF89a" + b"\x00" * 20,
+    _encode((10, 10), "PNG")[:20],
+    _encode((10, 10), "JPEG")[:4],
+    b"\xff\xd8\x00\x00\x00\x00",
+])
+def test_unknown_or_damaged_images(blob):
+    assert image_size(blob) is None
+
+
+def test_gif_is_left_to_python_docx():
+    assert image_size(_encode((8, 8), "GIF")) is None
+
+
+def test_svg_size():
+    assert svg_size(b'<svg xmlns="http://www.w3.org/2000/svg" width="120" height="45"/>') == (120, 45)
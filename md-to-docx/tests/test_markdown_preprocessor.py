@@ -0,0 +1,52 @@
+import pytest
+
+from banner_markers import banner_marker
+from markdown_preprocessor import MarkdownPreprocessor, preprocess_markdown_text
+
+SAMPLE = (
+    "# Title\n\n"
+    "<details><summary>More</summary>hidden text</details>\n\n"
+    '<div class="mermaid">\ngraph LR\n  A-->B\n</div>\n\n'
+    '<div class="status-banner status-high-risk">Watch <b>out</b>\nfor this</div>\n\n'
+    "Plain text with a < sign and a <span>tag</span>.\n"
+)
+
+
+def test_mermaid_div_becomes_fenced_block():
+    assert preprocess_markdown_text('<div class="mermaid">\ngraph LR\n  A-->B\n</div>') == (
+        "\n```mermaid\ngraph LR\n  A-->B\n```\n"
+    )
+
+
+def test_details_and_summary_tags_are_stripped():
+    text = "<details>\n<SUMMARY>Title</SUMMARY>\nBody\n</details>"
+    assert preprocess_markdown_text(text) == "\nTitle\nBody\n"
+
+
+def test_status_banner_becomes_marker():
+    text = '<div class="status-banner status-warning">Check\n  this</div>'
+    assert preprocess_markdown_text(text) == "\n\n[[STATUS_BANNER:status-warning:Check this]]\n\n"
+    assert preprocess_markdown_text(text) == banner_marker("status-warning", "Check\n  this")
+
+
+def test_banner_inner_tags_are_rewritten():
+    text = '<div class="status-banner status-info"><details>Inside</details></div>'
+    assert preprocess_markdown_text(text) == "\n\n[[STATUS_BANNER:status-info:Inside]]\n\n"
+
+
+def test_unclosed_block_is_left_as_text():
+    text = '<div class="mermaid">\ngraph LR\n'
+    assert preprocess_markdown_text(text) == text
+
+
+def test_rewrites_can_be_limited():
+    text = '<details>x</details><div class="status-banner status-info">y</div>'
+    assert preprocess_markdown_text(text, rewrites=("details",)) == 'x<div class="status-banner status-info">y</div>'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, len(SAMPLE)])
+def test_streaming_matches_whole_text(chunk_size):
+    preprocessor = MarkdownPreprocessor()
+    output = [preprocessor.feed(SAMPLE[start:start + chunk_size]) for start in range(0, len(SAMPLE), chunk_size)]
+    output.append(preprocessor.close())
+    assert "".join(output) == preprocess_markdown_text(SAMPLE)
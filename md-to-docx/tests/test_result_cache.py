@@ -0,0 +1,100 @@
+import os
+
+from diagram_cache import DiagramCache
+from result_cache import ResultCache, hash_parts
+
+
+def _source(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(bytes([len(name)]) * size)
+    return path
+
+
+def _age(path, seconds_ago):
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime - seconds_ago))
+
+
+def test_hash_parts_is_length_prefixed():
+    assert hash_parts("ab", "c") != hash_parts("a", "bc")
+    assert hash_parts("a", b"b") == hash_parts(b"a", "b")
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=0)
+    assert cache.put("key", _source(tmp_path, "a.docx", 10)) is None
+    assert cache.get("key") is None
+    assert not (tmp_path / "cache").exists()
+
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=1000)
+    source = _source(tmp_path, "a.docx", 10)
+    stored = cache.put("key", source)
+    assert cache.get("key") == stored
+    assert stored.read_bytes() == source.read_bytes()
+    assert cache.stats() == {"enabled": True, "entries": 1, "bytes": 10, "max_bytes": 1000}
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=250)
+    first = cache.put("first", _source(tmp_path, "1.docx", 100))
+    second = cache.put("second", _source(tmp_path, "2.docx", 100))
+    _age(first, 20)
+    _age(second, 10)
+    # A hit moves the older entry to the front of the queue
+    cache.get("first")
+
+    cache.put("third", _source(tmp_path, "3.docx", 100))
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
+
+
+def test_put_file_stores_the_whole_stream(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=1000)
+    with open(_source(tmp_path, "a.docx", 50), "rb") as source:
+        source.read(20)
+        stored = cache.put_file("key", source)
+    assert stored.stat().st_size == 50
+    assert not [name for name in os.listdir(tmp_path / "cache") if name.startswith(".")]
+
+
+def test_fetch_copy_survives_eviction(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=150, suffix=".png")
+    cache.put("diagram", _source(tmp_path, "diagram.png", 100))
+    private = cache.fetch("diagram", tmp_path / "private.png")
+    assert private == tmp_path / "private.png"
+
+    # Another conversion's diagram pushes the entry out before pandoc reads it
+    _age(cache.get("diagram"), 10)
+    cache.put("other", _source(tmp_path, "other.png", 100))
+
+    assert cache.get("diagram") is None
+    assert private.read_bytes() == bytes([len("diagram.png")]) * 100
+
+
+def test_fetch_of_missing_entry(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=150)
+    assert cache.fetch("missing", tmp_path / "private.docx") is None
+    assert not (tmp_path / "private.docx").exists()
+
+
+def test_oversize_entry_evicts_itself_but_not_its_source(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=50, suffix=".png")
+    source = _source(tmp_path, "huge.png", 100)
+    cache.put("huge", source)
+    assert cache.get("huge") is None
+    assert source.read_bytes() == bytes([len("huge.png")]) * 100
+
+
+def test_diagram_cache_counts_fetches(tmp_path):
+    cache = DiagramCache(tmp_path / "cache", max_bytes=1000, render_settings="settings")
+    key = cache.key_for("graph LR\n  A-->B\n")
+    assert key == cache.key_for("  graph LR\n  A-->B")
+    assert cache.fetch(key, tmp_path / "miss.png") is None
+    cache.put(key, _source(tmp_path, "diagram.png", 10))
+    assert cache.fetch(key, tmp_path / "hit.png") is not None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
@@ -0,0 +1,48 @@
+from docx import Document
+from docx.oxml.ns import qn
+
+from banner_markers import banner_marker
+from status_banners import BANNER_STYLES, apply_status_banners
+
+
+def _marker(banner_type, text):
+    # The marker paragraph as pandoc writes it, without the surrounding blank lines
+    return banner_marker(banner_type, text).strip()
+
+
+def _fill(paragraph):
+    return paragraph._p.pPr.find(qn('w:shd')).get(qn('w:fill'))
+
+
+def test_markers_become_styled_banners():
+    doc = Document()
+    doc.add_paragraph("Intro")
+    doc.add_paragraph(_marker("status-high-risk", "Stop here"))
+    table = doc.add_table(rows=1, cols=1)
+    table.cell(0, 0).paragraphs[0].text = _marker("status-info", "In a cell")
+
+    assert apply_status_banners(doc) == 2
+
+    banner = doc.paragraphs[1]
+    assert banner.text == "Stop here"
+    assert _fill(banner) == BANNER_STYLES['high-risk']['bg']
+    assert banner._p.pPr.find(qn('w:pBdr')) is not None
+    assert all(run.bold for run in banner.runs)
+    cell_banner = table.cell(0, 0).paragraphs[0]
+    assert cell_banner.text == "In a cell"
+    assert _fill(cell_banner) == BANNER_STYLES['info']['bg']
+    assert doc.paragraphs[0].text == "Intro"
+
+
+def test_unknown_types_use_the_default_style():
+    doc = Document()
+    doc.add_paragraph(_marker("status-custom", "Note"))
+    apply_status_banners(doc)
+    assert _fill(doc.paragraphs[0]) == BANNER_STYLES['default']['bg']
+
+
+def test_incomplete_marker_is_left_alone():
+    doc = Document()
+    doc.add_paragraph("Text mentioning [[STATUS_BANNER: without closing it")
+    assert apply_status_banners(doc) == 0
+    assert doc.paragraphs[0].text == "Text mentioning [[STATUS_BANNER: without closing it"
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+from docx import Document
+from docx.shared import Pt
+
+from status_banners import banner_style_name
+from style_profiles import PROFILES, ReferenceDocCache, load_profiles
+from table_styling import HEADER_RUN_STYLE
+
+
+def _write_profiles(tmp_path, profiles):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps(profiles), encoding='utf-8')
+    return path
+
+
+def test_builtin_profiles_only():
+    assert load_profiles() == PROFILES
+
+
+def test_file_adds_and_overrides_profiles(tmp_path):
+    profiles = load_profiles(_write_profiles(tmp_path, {
+        "print": {"Normal": {"font": "Georgia", "size": 10.5, "alignment": "justify"}},
+        "classic": {},
+    }))
+    assert profiles["print"]["Normal"]["font"] == "Georgia"
+    assert profiles["classic"] == {}
+    assert "default" in profiles
+
+
+@pytest.mark.parametrize("profiles, message", [
+    ({"bad name": {}}, "Invalid style profile name"),
+    ({"print": {"Normal": {"colour": "FF0000"}}}, "unknown keys"),
+    ({"print": {"Normal": {"alignment": "middle"}}}, "bad alignment"),
+])
+def test_invalid_profiles_are_rejected(tmp_path, profiles, message):
+    with pytest.raises(ValueError, match=message):
+        load_profiles(_write_profiles(tmp_path, profiles))
+
+
+def _base_document(tmp_path):
+    path = tmp_path / "reference.docx"
+    Document().save(str(path))
+    return path
+
+
+def test_reference_doc_is_compiled_once(tmp_path):
+    base = _base_document(tmp_path)
+    cache = ReferenceDocCache(tmp_path / "references", {"print": {"Normal": {"font": "Georgia", "size": 10}}})
+
+    path = cache.get("print", base, "digest")
+    compiled_at = path.stat().st_mtime_ns
+    assert cache.get("print", base, "digest") == path
+    assert path.stat().st_mtime_ns == compiled_at
+
+    doc = Document(str(path))
+    assert doc.styles["Normal"].font.name == "Georgia"
+    assert doc.styles["Normal"].font.size == Pt(10)
+    # The styles the Lua filters rely on come with every profile
+    assert banner_style_name("high-risk") in doc.styles
+    assert HEADER_RUN_STYLE in doc.styles
+
+
+def test_changed_profile_replaces_the_stale_build(tmp_path):
+    base = _base_document(tmp_path)
+    root = tmp_path / "references"
+    old = ReferenceDocCache(root, {"print": {"Normal": {"size": 10}}}).get("print", base, "digest")
+    new = ReferenceDocCache(root, {"print": {"Normal": {"size": 12}}}).get("print", base, "digest")
+    assert new != old
+    assert not old.exists()
+    assert Document(str(new)).styles["Normal"].font.size == Pt(12)
+
+
+def test_digest_follows_the_base_document(tmp_path):
+    cache = ReferenceDocCache(tmp_path / "references", {"print": {}})
+    assert cache.digest("print", "one") != cache.digest("print", "two")
@@ -0,0 +1,70 @@
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+from table_styling import HEADER_FILL, style_tables
+
+
+def _doc_with_table(rows=3, cols=2):
+    doc = Document()
+    table = doc.add_table(rows=rows, cols=cols)
+    for row_index, row in enumerate(table.rows):
+        for col_index, cell in enumerate(row.cells):
+            cell.text = f"r{row_index}c{col_index}"
+    return doc, table
+
+
+def _cell_properties(table, tag):
+    return [tc.tcPr.find(qn(tag)) if tc.tcPr is not None else None for tc in table._tbl.iter(qn('w:tc'))]
+
+
+def test_borders_and_margins_go_on_the_table():
+    doc, table = _doc_with_table()
+    style_tables(doc)
+    tbl_pr = table._tbl.tblPr
+    borders = tbl_pr.find(qn('w:tblBorders'))
+    assert [child.tag for child in borders] == [
+        qn(f'w:{side}') for side in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV')
+    ]
+    assert tbl_pr.find(qn('w:tblCellMar')) is not None
+    assert all(borders is None for borders in _cell_properties(table, 'w:tcBorders'))
+
+
+def test_header_row_is_shaded_and_bold():
+    doc, table = _doc_with_table()
+    style_tables(doc)
+    for cell in table.rows[0].cells:
+        assert cell._tc.tcPr.find(qn('w:shd')).get(qn('w:fill')) == HEADER_FILL
+        assert all(run.bold for run in cell.paragraphs[0].runs)
+    assert not any(run.bold for run in table.rows[1].cells[0].paragraphs[0].runs)
+
+
+def test_cell_paragraphs_lose_space_after():
+    doc, table = _doc_with_table()
+    style_tables(doc)
+    for row in table.rows:
+        for cell in row.cells:
+            assert cell.paragraphs[0].paragraph_format.space_after == 0
+
+
+def test_cell_level_borders_when_asked():
+    doc, table = _doc_with_table()
+    style_tables(doc, table_level=False)
+    assert table._tbl.tblPr.find(qn('w:tblBorders')) is None
+    assert all(borders is not None for borders in _cell_properties(table, 'w:tcBorders'))
+
+
+def test_cell_level_borders_when_a_cell_has_its_own():
+    doc, table = _doc_with_table()
+    # A cell with borders of its own would draw differently under table-level borders
+    table.rows[1].cells[1]._tc.get_or_add_tcPr().append(OxmlElement('w:tcBorders'))
+    style_tables(doc)
+    assert table._tbl.tblPr.find(qn('w:tblBorders')) is None
+    assert all(borders is not None for borders in _cell_properties(table, 'w:tcBorders'))
+
+
+def test_document_without_tables():
+    doc = Document()
+    doc.add_paragraph("No tables here")
+    style_tables(doc)
+    assert doc.paragraphs[-1].text == "No tables here"